@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -145,6 +146,53 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Keyset pagination for per-product review listings
+REVIEWS_PAGE_SIZE = 20
+REVIEWS_MAX_PAGE_SIZE = 100
+
+# Review views are buffered in memory and flushed every N seconds
+# (0 = write on every view, None = only on explicit flush / shutdown)
+VIEW_COUNT_FLUSH_INTERVAL = 5
+
+# Read-through cache of product / review responses (products/cache.py).
+# Must be shared by every process (server workers and management commands), or
+# their invalidations never reach each other. With REDIS_URL set (needs the
+# `redis` package) Redis is used; otherwise a file cache, which is shared by the
+# processes of one host but lists its directory on every write to cull it, so
+# keep it for development and small deployments.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / '.cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+REVIEW_CACHE_TTL = 300  # seconds
+
+# Tests use their own in-memory cache (ProductReviewSystem/test_runner.py)
+TEST_RUNNER = 'ProductReviewSystem.test_runner.TestRunner'
+
+# Background export jobs (products/export_jobs.py)
+EXPORT_JOBS_DIR = BASE_DIR / 'exports'
+EXPORT_JOBS_MAX_WORKERS = 2
+EXPORT_JOBS_MAX_PER_USER = 2
+EXPORT_JOBS_TTL = 24 * 60 * 60  # seconds
+EXPORT_JOBS_STALE_AFTER = 10 * 60  # seconds without progress before a pending/running job is abandoned
+
+# Bulk review import (products/importer.py)
+REVIEW_IMPORT_BATCH_SIZE = 10000  # records per transaction
+REVIEW_IMPORT_MAX_RECORDS = 10000  # per POST /api/reviews/import/
+
+# Bulk moderation (products/bulk_moderation.py)
+REVIEW_BULK_MODERATION_MAX_ITEMS = 5000  # reviews per POST /api/admin/reviews/bulk/
 
 from datetime import timedelta
 
@@ -0,0 +1,29 @@
+"""
+Test runner of the project (settings.TEST_RUNNER).
+
+Tests use a private in-memory cache instead of CACHES: the default file cache
+is shared with the development server, so a test run would otherwise wipe the
+server's entries (`cache.clear()`) and read entries the server cached for the
+same primary keys. One test process is a single process, so the
+process-local cache warning (products.W001) is silenced.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'product-reviews-tests',
+    }
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = override_settings(CACHES=TEST_CACHES, SILENCED_SYSTEM_CHECKS=['products.W001'])
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,127 @@
+"""
+Shared bootstrap for the benchmark scripts.
+
+Every benchmark runs against a throwaway SQLite file (never db.sqlite3) and an
+in-memory cache of its own (never the server's), so the scripts can be run from
+a fresh checkout:
+
+    python benchmarks/bench_indexes.py --products 200 --reviews-per-product 500
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+WORDS = (
+    "great good bad quality price battery screen delivery fast slow camera sound "
+    "recommend broken excellent average cheap expensive design comfortable size "
+    "ممتاز جيد سيء الجودة السعر البطارية الشاشة التوصيل سريع بطيء"
+).split()
+
+
+def setup_django(db_path=None):
+    """Configure Django on a temporary database and return its path."""
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ProductReviewSystem.settings')
+    if db_path is None:
+        handle, db_path = tempfile.mkstemp(prefix='bench_', suffix='.sqlite3')
+        os.close(handle)
+
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    # كاش خاص بالعملية، لا يختلط بكاش الخادم أو بمقاييس أخرى تعمل معًا
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': db_path}}
+    settings.SILENCED_SYSTEM_CHECKS = [*settings.SILENCED_SYSTEM_CHECKS, 'products.W001']
+    settings.DEBUG = False
+    django.setup()
+    return db_path
+
+
+def migrate():
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+
+
+def random_text(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(products=100, reviews_per_product=200, users=50, notifications_per_user=20, seed_value=42):
+    """
+    Bulk-insert a synthetic catalog. Signals are bypassed, so derived columns
+    are not maintained; run the rebuild commands afterwards when they matter.
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from products.models import Notification, Product, Review
+
+    rng = random.Random(seed_value)
+    User.objects.bulk_create(User(username=f'bench_user_{i}') for i in range(users))
+    user_ids = list(User.objects.values_list('id', flat=True))
+    owner_id = user_ids[0]
+
+    Product.objects.bulk_create(
+        Product(name=f'Product {i}', description='Benchmark product', user_id=owner_id) for i in range(products)
+    )
+    product_ids = list(Product.objects.values_list('id', flat=True))
+
+    batch = []
+    for product_id in product_ids:
+        for _ in range(reviews_per_product):
+            batch.append(Review(
+                product_id=product_id,
+                user_id=rng.choice(user_ids),
+                rating=rng.randint(1, 5),
+                review_text=random_text(rng),
+                is_visible=rng.random() < 0.8,
+            ))
+            if len(batch) >= 5000:
+                Review.objects.bulk_create(batch)
+                batch = []
+    Review.objects.bulk_create(batch)
+
+    Notification.objects.bulk_create(
+        Notification(user_id=user_id, message='Benchmark notification', is_read=rng.random() < 0.7)
+        for user_id in user_ids for _ in range(notifications_per_user)
+    )
+
+    with connection.cursor() as cursor:
+        # توزيع تواريخ المراجعات على آخر سنة
+        cursor.execute(
+            "UPDATE products_review SET created_at = datetime('now', '-' || (abs(random()) % 365) || ' days', "
+            "'-' || (abs(random()) % 86400) || ' seconds')"
+        )
+    return product_ids, user_ids
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB."""
+    # VmHWM خاص بهذه العملية؛ ru_maxrss يرث قيمة العملية الأم عبر fork/exec على لينكس
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timeit(func, repeat=20):
+    """Median wall time of `func()` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
@@ -0,0 +1,115 @@
+"""
+Excel export: ExportReviewsToExcel (write-only workbook fed by batched
+per-product analytics) against the previous implementation (in-memory
+workbook, four analytics calls per product). Each variant runs in its own
+process so its peak RSS can be measured.
+
+    python benchmarks/bench_excel_export.py --products 10000 --reviews-per-product 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+
+from _setup import migrate, peak_rss_mb, seed, setup_django
+
+
+def old_export(path):
+    from openpyxl import Workbook
+    from products.analytics import (
+        get_low_rating_reviews,
+        get_most_common_words_in_reviews,
+        get_pending_reviews_count,
+        get_product_rating_trend,
+    )
+    from products.models import Product
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Products Analytics"
+    ws.append([
+        'Product ID', 'Product Name', 'Average Rating', 'Total Reviews',
+        'Most Common Words', 'Low Rating Reviews', 'Pending Reviews Count'
+    ])
+    for product in Product.objects.all():
+        rating_trend = get_product_rating_trend(product.id)
+        most_common_words = get_most_common_words_in_reviews(product.id, limit=5)
+        low_rating_reviews = get_low_rating_reviews(product.id, limit=5)
+        pending_reviews_count = get_pending_reviews_count()
+        ws.append([
+            product.id,
+            product.name,
+            rating_trend['average_rating'],
+            rating_trend['total_reviews'],
+            ', '.join([f"{word}({count})" for word, count in most_common_words]),
+            '; '.join([f"{review['review_text']}({review['rating']})" for review in low_rating_reviews]),
+            pending_reviews_count['pending_reviews'],
+        ])
+    wb.save(path)
+
+
+def new_export(path):
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from products.views import ExportReviewsToExcel
+
+    request = APIRequestFactory().get('/api/analytics/export-reviews-excel/')
+    force_authenticate(request, user=User.objects.first())
+    response = ExportReviewsToExcel.as_view()(request)
+    with open(path, 'wb') as output:
+        for chunk in response.streaming_content:
+            output.write(chunk)
+    response.close()
+
+
+def run_variant(mode, db_path):
+    setup_django(db_path)
+    import openpyxl  # noqa: F401
+    import products.views  # noqa: F401
+    from products.models import Product
+
+    Product.objects.exists()  # الاستيراد والاتصال بقاعدة البيانات قبل قياس الذاكرة الأساسية
+    baseline = peak_rss_mb()
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    start = time.perf_counter()
+    {'old': old_export, 'new': new_export}[mode](path)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path) / 1024 / 1024
+    os.remove(path)
+    print(f'{mode:<6} {elapsed:>9.2f} s   peak RSS {peak_rss_mb():>8.1f} MB '
+          f'(+{peak_rss_mb() - baseline:.1f} MB over startup)   file {size:.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--reviews-per-product', type=int, default=20)
+    parser.add_argument('--skip-old', action='store_true', help='only run the new export')
+    parser.add_argument('--mode', choices=['old', 'new'], help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_variant(args.mode, args.db)
+        return
+
+    db_path = setup_django()
+    try:
+        migrate()
+        seed(products=args.products, reviews_per_product=args.reviews_per_product, notifications_per_user=0)
+        from django.core.management import call_command
+
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        print(f'{args.products} products, {args.reviews_per_product} reviews each')
+        for mode in (['new'] if args.skip_old else ['old', 'new']):
+            subprocess.run([sys.executable, __file__, '--mode', mode, '--db', db_path], check=True)
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Bulk review import (products/importer.py): `manage.py import_reviews` on a
+generated JSON Lines feed, against saving the same reviews one by one through
+the ORM (the per-review path of ReviewListCreateView, signals included), and
+the INSERT of one batch by `insert_reviews` against `bulk_create`. The
+imported aggregates are then checked against a full rebuild.
+
+    python benchmarks/bench_import_reviews.py --reviews 200000 --products 500
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from _setup import migrate, random_text, seed, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reviews', type=int, default=200_000)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--one-by-one', type=int, default=2000, help="Reviews saved one by one for comparison.")
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    handle, feed_path = tempfile.mkstemp(prefix='bench_feed_', suffix='.jsonl')
+    os.close(handle)
+    try:
+        migrate()
+        product_ids, user_ids = seed(products=args.products, reviews_per_product=0, notifications_per_user=0)
+        from io import StringIO
+
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from products.models import Product, Review, ReviewDailyStats, ReviewTermCount
+
+        rng = random.Random(7)
+        usernames = list(User.objects.values_list('username', flat=True))
+        with open(feed_path, 'w', encoding='utf-8') as feed:
+            for _ in range(args.reviews):
+                feed.write(json.dumps({
+                    'product': rng.choice(product_ids), 'user': rng.choice(usernames), 'rating': rng.randint(1, 5),
+                    'review_text': random_text(rng), 'is_visible': rng.random() < 0.8,
+                }) + '\n')
+
+        started = time.perf_counter()
+        for _ in range(args.one_by_one):
+            Review.objects.create(
+                product_id=rng.choice(product_ids), user_id=rng.choice(user_ids), rating=rng.randint(1, 5),
+                review_text=random_text(rng), is_visible=rng.random() < 0.8,
+            )
+        one_by_one = args.one_by_one / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        call_command('import_reviews', feed_path, batch_size=args.batch_size, stdout=StringIO())
+        imported = args.reviews / (time.perf_counter() - started)
+
+        print(f'{args.reviews} reviews over {args.products} products, batches of {args.batch_size}')
+        print(f'  one by one (ORM save + signals) {one_by_one:>12,.0f} reviews/s')
+        print(f'  import_reviews                  {imported:>12,.0f} reviews/s')
+
+        # الإدخال وحده كما في الاستيراد: insert_reviews مقابل bulk_create لنفس الصفوف (يُلغى كلاهما)
+        from django.db import transaction
+        from django.utils import timezone
+        from products.importer import insert_reviews
+        from products.search import bulk_indexing
+
+        rows = [
+            {'product_id': rng.choice(product_ids), 'user_id': rng.choice(user_ids), 'rating': rng.randint(1, 5),
+             'review_text': random_text(rng), 'is_visible': True, 'flagged_terms': [], 'is_offensive': False}
+            for _ in range(args.batch_size)
+        ]
+
+        def insert_rate(insert):
+            with transaction.atomic():
+                started = time.perf_counter()
+                with bulk_indexing():
+                    insert()
+                elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            return len(rows) / elapsed
+
+        raw = insert_rate(lambda: insert_reviews(rows, timezone.now()))
+        orm = insert_rate(lambda: Review.objects.bulk_create([Review(**row) for row in rows]))
+        print(f'  INSERT only: insert_reviews   {raw:>12,.0f} reviews/s')
+        print(f'  INSERT only: bulk_create      {orm:>12,.0f} reviews/s')
+
+        def snapshot():
+            return (
+                list(Product.objects.order_by('pk').values_list('rating_count', 'rating_sum', 'rating_5_count')),
+                sorted(ReviewDailyStats.objects.values_list('product_id', 'day', 'review_count', 'visible_count')),
+                sorted(ReviewTermCount.objects.values_list('product_id', 'term', 'count', 'visible_count')),
+            )
+
+        incremental = snapshot()
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        print('  aggregates match a full rebuild:', incremental == snapshot())
+    finally:
+        os.remove(feed_path)
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Query plans and latencies of the hot Review / Notification query shapes,
+without and with the indexes declared in Review.Meta / Notification.Meta.
+
+    python benchmarks/bench_indexes.py --products 200 --reviews-per-product 500
+"""
+import argparse
+import os
+
+from _setup import migrate, seed, setup_django, timeit
+
+
+def query_shapes(product_id, user_id, owner_id):
+    from datetime import timedelta
+
+    from django.utils import timezone
+    from products.analytics import get_low_rating_reviews, get_pending_reviews_count
+    from products.bulk_moderation import filtered_reviews
+    from products.models import Notification, Review
+
+    now = timezone.now()
+
+    return {
+        'product visible reviews, newest page': lambda: list(
+            Review.objects.filter(product_id=product_id, is_visible=True).order_by('-created_at', '-id')[:20]
+        ),
+        'product visible count': lambda: Review.objects.filter(product_id=product_id, is_visible=True).count(),
+        'product visible since date': lambda: Review.objects.filter(
+            product_id=product_id, is_visible=True, created_at__gte=now - timedelta(days=180)
+        ).count(),
+        # استعلامات بلا منتج محدد، بلا فهارس مفردة على is_visible / rating / created_at / is_offensive
+        'pending reviews count': get_pending_reviews_count,
+        'low-rating reviews': lambda: list(get_low_rating_reviews()),
+        'owner reviews in the last 30 days': lambda: list(
+            Review.objects.filter(product__user_id=owner_id, created_at__gte=now - timedelta(days=30))
+            .order_by('-created_at', '-id')[:20]
+        ),
+        'owner offensive reviews, oldest first': lambda: list(
+            filtered_reviews(owner_id, {'is_offensive': True}).order_by('created_at', 'id')[:5000]
+        ),
+        'unread notifications': lambda: list(
+            Notification.objects.filter(user_id=user_id, is_read=False).order_by('-created_at')[:20]
+        ),
+    }
+
+
+def explain(func):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as captured:
+        func()
+    sql = captured.captured_queries[-1]['sql']
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return '; '.join(row[-1] for row in cursor.fetchall())
+
+
+def measure(label, shapes, repeat):
+    print(f'\n=== {label} ===')
+    results = {}
+    for name, func in shapes.items():
+        results[name] = timeit(func, repeat)
+        print(f'{name:<40} {results[name]:>9.3f} ms   {explain(func)}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--reviews-per-product', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    try:
+        from django.db import connection
+        from products.models import Notification, Review
+
+        migrate()
+        product_ids, user_ids = seed(args.products, args.reviews_per_product)
+        with connection.cursor() as cursor:
+            # نحو 1% من المراجعات مسيئة
+            cursor.execute('UPDATE products_review SET is_offensive = 1 WHERE abs(random()) % 100 = 0')
+        shapes = query_shapes(product_ids[len(product_ids) // 2], user_ids[1], user_ids[0])
+        indexed = [(model, index) for model in (Review, Notification) for index in model._meta.indexes]
+
+        with connection.schema_editor() as editor:
+            for model, index in indexed:
+                editor.remove_index(model, index)
+        connection.cursor().execute('ANALYZE')
+        before = measure('without indexes', shapes, args.repeat)
+
+        with connection.schema_editor() as editor:
+            for model, index in indexed:
+                editor.add_index(model, index)
+        connection.cursor().execute('ANALYZE')
+        after = measure('with indexes', shapes, args.repeat)
+
+        print('\n=== speedup ===')
+        for name in shapes:
+            print(f'{name:<40} {before[name] / max(after[name], 1e-6):>8.1f}x')
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Read endpoints with the versioned response cache (products/cache.py): a warm
+cache (hits) against DummyCache (every request goes to SQLite), and against
+LocMemCache after an invalidation (miss + store).
+
+    python benchmarks/bench_read_cache.py --products 200 --reviews-per-product 500
+"""
+import argparse
+import os
+
+from _setup import migrate, seed, setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--reviews-per-product', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    try:
+        migrate()
+        seed(products=args.products, reviews_per_product=args.reviews_per_product, notifications_per_user=0)
+        from io import StringIO
+
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from products.cache import review_cache
+        from products.models import Review
+        from products.view_counter import view_counts
+
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        settings.ALLOWED_HOSTS = ['testserver']
+        settings.VIEW_COUNT_FLUSH_INTERVAL = None  # لا كتابة للمشاهدات في قاعدة البيانات أثناء القياس
+        client = APIClient()
+        client.force_authenticate(user=User.objects.first())
+        review = Review.objects.filter(is_visible=True).order_by('id').first()
+        product_id = review.product_id
+        endpoints = [
+            ('product retrieve', f'/api/products/{product_id}/'),
+            ('rating info', f'/api/products/{product_id}/ratings/'),
+            ('top review', f'/api/products/{product_id}/top-review/'),
+            ('review list', f'/api/products/{product_id}/reviews/'),
+            ('review detail', f'/api/products/{product_id}/reviews/{review.id}/'),
+        ]
+        dummy = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        def miss(url):
+            review_cache.invalidate('product', product_id)
+            review_cache.invalidate('review', review.id)
+            client.get(url)
+
+        print(f'{args.products} products x {args.reviews_per_product} reviews, median of {args.repeat} requests (ms)')
+        print(f'{"endpoint":<18} {"no cache":>10} {"miss":>10} {"hit":>10}')
+        for label, url in endpoints:
+            with override_settings(CACHES=dummy):
+                uncached = timeit(lambda: client.get(url), repeat=args.repeat)
+            missed = timeit(lambda: miss(url), repeat=args.repeat)
+            client.get(url)
+            hit = timeit(lambda: client.get(url), repeat=args.repeat)
+            print(f'{label:<18} {uncached:>10.2f} {missed:>10.2f} {hit:>10.2f}')
+        print('stats:', review_cache.stats())
+        view_counts.flush()  # قبل حذف قاعدة البيانات المؤقتة
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
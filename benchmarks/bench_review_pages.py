@@ -0,0 +1,66 @@
+"""
+Keyset pagination of a product's reviews (ReviewKeysetPagination): the first
+page against a page 90% of the way in, for every ?ordering=, with the query
+plan of the deep page. Deep pages should cost the same as the first one.
+
+    python benchmarks/bench_review_pages.py --reviews 200000
+"""
+import argparse
+import os
+
+from _setup import migrate, seed, setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reviews', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    try:
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from products.models import Review
+        from products.pagination import ReviewKeysetPagination
+
+        migrate()
+        (product_id,), _ = seed(products=1, reviews_per_product=args.reviews, notifications_per_user=0)
+        with connection.cursor() as cursor:
+            # عدادات تفاعل متفاوتة مع كثير من التعادلات، كما في الواقع
+            cursor.execute(
+                "UPDATE products_review SET likes_count = abs(random()) % 20, helpful_count = abs(random()) % 5, "
+                "interactions_count = abs(random()) % 25"
+            )
+            cursor.execute('ANALYZE')
+        reviews = Review.objects.filter(product_id=product_id, is_visible=True)
+        depth = int(reviews.count() * 0.9)
+        factory = APIRequestFactory()
+
+        def page(ordering, cursor=None):
+            params = {'ordering': ordering, **({'cursor': cursor} if cursor else {})}
+            paginator = ReviewKeysetPagination()
+            return paginator, paginator.paginate_queryset(reviews, Request(factory.get('/', params)))
+
+        print(f'{args.reviews} reviews on one product, page {depth // 20} of the visible ones')
+        print(f"{'ordering':<16} {'first page':>11} {'deep page':>11}   deep page plan")
+        for ordering, fields in ReviewKeysetPagination.orderings.items():
+            paginator, _ = page(ordering)
+            paginator.ordering = ordering
+            cursor = paginator.encode_cursor(reviews.order_by(*fields)[depth])
+            first = timeit(lambda: page(ordering), args.repeat)
+            deep = timeit(lambda: page(ordering, cursor), args.repeat)
+            with CaptureQueriesContext(connection) as captured:
+                page(ordering, cursor)
+            with connection.cursor() as db_cursor:
+                db_cursor.execute('EXPLAIN QUERY PLAN ' + captured.captured_queries[-1]['sql'])
+                plan = '; '.join(row[-1] for row in db_cursor.fetchall())
+            print(f'{ordering:<16} {first:>8.3f} ms {deep:>8.3f} ms   {plan}')
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
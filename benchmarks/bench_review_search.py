@@ -0,0 +1,78 @@
+"""
+Review keyword search: KeywordSearchView on the FTS5 index (ranked, one page
+plus the total count) against the previous `review_text__icontains` view that
+returned every match, and against an icontains query paginated the same way.
+
+A rare word is appended to one review in --rare-every, so both a selective and
+a common keyword are measured.
+
+    python benchmarks/bench_review_search.py --products 1000 --reviews-per-product 1000
+"""
+import argparse
+import os
+
+from _setup import migrate, seed, setup_django, timeit
+
+RARE_WORD = 'waterproof'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--reviews-per-product', type=int, default=1000)
+    parser.add_argument('--rare-every', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    try:
+        migrate()
+        seed(products=args.products, reviews_per_product=args.reviews_per_product, notifications_per_user=0)
+
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from products.models import Review
+        from products.views import KeywordSearchView
+
+        with connection.cursor() as cursor:
+            # التحديث يمر عبر محفزات الفهرس النصي
+            cursor.execute(
+                f"UPDATE products_review SET review_text = review_text || ' {RARE_WORD}' WHERE id % %s = 0",
+                [args.rare_every],
+            )
+        settings.ALLOWED_HOSTS = ['testserver']  # روابط next/previous في الاستجابة
+        user = User.objects.first()
+        factory = APIRequestFactory()
+
+        def old_view(keyword):
+            reviews = Review.objects.filter(review_text__icontains=keyword).select_related('user')
+            return [
+                {"id": r.id, "user": r.user.username, "rating": r.rating, "review_text": r.review_text}
+                for r in reviews
+            ]
+
+        def like_page(keyword):
+            reviews = Review.objects.filter(review_text__icontains=keyword).select_related('user')
+            return reviews.count(), list(reviews.order_by('-created_at', '-id')[:20])
+
+        def new_view(keyword):
+            request = factory.get('/api/analytics/keyword-search/', {'keyword': keyword})
+            force_authenticate(request, user=user)
+            return KeywordSearchView.as_view()(request).data
+
+        total = Review.objects.count()
+        print(f'{total} reviews')
+        for keyword in (RARE_WORD, 'excellent'):
+            matches = new_view(keyword)['results_count']
+            print(f'keyword {keyword!r}: {matches} matches')
+            for label, func in (('old view (all rows)', old_view), ('LIKE, one page', like_page),
+                                ('FTS5 view, one page', new_view)):
+                print(f'  {label:<22} {timeit(lambda: func(keyword), repeat=args.repeat):>10.1f} ms')
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Global top words: exact Counter (wordfreq.count_words) against the
+fixed-memory Space-Saving summary (wordfreq.sketch_words) on a synthetic
+Zipf-distributed corpus. Each variant runs in its own process so its peak RSS
+can be measured; the corpus is generated on the fly and never held in memory.
+
+    python benchmarks/bench_word_sketch.py --reviews 5000000 --vocabulary 1000000 --capacity 10000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import accumulate
+
+from _setup import peak_rss_mb, setup_django
+
+
+def corpus(reviews, vocabulary, words_per_review, skew, seed_value=11):
+    rng = random.Random(seed_value)
+    terms = [f'term{i}' for i in range(vocabulary)]
+    cum_weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(vocabulary)))
+    for _ in range(reviews):
+        yield ' '.join(rng.choices(terms, cum_weights=cum_weights, k=words_per_review))
+
+
+def run_variant(args):
+    setup_django()
+    from products.wordfreq import count_words, sketch_words
+
+    texts = corpus(args.reviews, args.vocabulary, args.words_per_review, args.skew)
+    next(corpus(1, args.vocabulary, args.words_per_review, args.skew))  # بناء الأوزان قبل قياس الذاكرة الأساسية
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if args.mode == 'exact':
+        counts = count_words(texts)
+        result = {
+            'top': counts.most_common(args.top),
+            # الأعداد الحقيقية لكل كلمة قد تظهر في قائمة التقدير
+            'counts': dict(counts.most_common(args.top * 20)),
+            'distinct': len(counts),
+        }
+    else:
+        sketch = sketch_words(texts, capacity=args.capacity)
+        result = {'top': sketch.most_common(args.top), 'floor': sketch.floor, 'total': sketch.total}
+    result['seconds'] = time.perf_counter() - start
+    result['peak_mb'] = peak_rss_mb()
+    result['over_baseline_mb'] = peak_rss_mb() - baseline
+    with open(args.output, 'w') as output:
+        json.dump(result, output)
+
+
+def child(args, mode):
+    handle, path = tempfile.mkstemp(suffix='.json')
+    os.close(handle)
+    command = [
+        sys.executable, __file__, '--mode', mode, '--output', path,
+        '--reviews', str(args.reviews), '--vocabulary', str(args.vocabulary),
+        '--words-per-review', str(args.words_per_review), '--skew', str(args.skew),
+        '--capacity', str(args.capacity), '--top', str(args.top),
+    ]
+    subprocess.run(command, check=True)
+    with open(path) as result:
+        data = json.load(result)
+    os.remove(path)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reviews', type=int, default=5_000_000)
+    parser.add_argument('--vocabulary', type=int, default=1_000_000)
+    parser.add_argument('--words-per-review', type=int, default=12)
+    parser.add_argument('--skew', type=float, default=1.05, help='Zipf exponent of the word distribution')
+    parser.add_argument('--capacity', type=int, default=10_000, help='Space-Saving counters')
+    parser.add_argument('--top', type=int, default=100)
+    parser.add_argument('--mode', choices=['exact', 'sketch'], help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_variant(args)
+        return
+
+    print(f'{args.reviews} reviews x {args.words_per_review} words, vocabulary {args.vocabulary}, '
+          f'skew {args.skew}, sketch capacity {args.capacity}')
+    exact = child(args, 'exact')
+    sketch = child(args, 'sketch')
+    for label, data in (('exact Counter', exact), ('space-saving', sketch)):
+        print(f'{label:<16} {data["seconds"]:>8.1f} s   peak RSS {data["peak_mb"]:>8.1f} MB '
+              f'(+{data["over_baseline_mb"]:.1f} MB)')
+
+    true_top = [word for word, _ in exact['top']]
+    estimated = sketch['top']
+    recall = len(set(true_top) & {word for word, _, _ in estimated}) / len(true_top)
+    errors, violations = [], 0
+    for word, count, error in estimated:
+        true_count = exact['counts'].get(word)
+        if true_count is None:
+            continue
+        errors.append((count - true_count) / true_count)
+        violations += not (count - error <= true_count <= count)
+    print(f'distinct words: {exact["distinct"]}, top-{args.top} recall: {recall:.1%}, '
+          f'max relative overestimate: {max(errors):.3%}, bound violations: {violations}')
+    print(f'max reported error: {max(error for _, _, error in estimated)}, '
+          f'untracked bound (floor): {sketch["floor"]} = {sketch["floor"] / sketch["total"]:.5%} of {sketch["total"]} words')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,493 @@
+"""
+Stored aggregates derived from reviews and interactions.
+
+- `Product.rating_count`, `rating_sum` and `rating_<n>_count` describe the
+  visible reviews of a product.
+- `Review.likes_count`, `helpful_count` and `interactions_count` count the
+  interactions on a review; `votes_count` counts the users who interacted and
+  `rank_score` is the Wilson score of those votes (see `wilson_score`).
+- `ReviewDailyStats` rows summarize the reviews of a product created on one day
+  (all reviews, with the visible ones counted separately).
+- `ReviewTermCount` rows count each word of the reviews of a product (all
+  reviews, with the visible ones counted separately).
+
+They are kept up to date incrementally from the model signals (see signals.py),
+once per batch by bulk imports (importer.py), and can be rebuilt from scratch with `python manage.py rebuild_product_aggregates`.
+"""
+import math
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Sqrt, TruncDate
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import Product, Review, ReviewDailyStats, ReviewInteraction, ReviewTermCount
+from .wordfreq import tokenize
+
+REVIEW_STATE_FIELDS = ('product_id', 'rating', 'is_visible', 'created_at', 'review_text')
+INTERACTION_STATE_FIELDS = ('review_id', 'liked', 'is_helpful')
+INTERACTION_COUNTER_FIELDS = ('likes_count', 'helpful_count', 'interactions_count', 'votes_count', 'rank_score')
+WILSON_Z = 1.96  # ثقة 95%
+TERM_UPDATE_CHUNK = 5000
+RATING_COUNT_FIELDS = tuple(f'rating_{rating}_count' for rating in range(1, 6))
+PRODUCT_AGGREGATE_FIELDS = ('rating_count', 'rating_sum') + RATING_COUNT_FIELDS
+DAILY_STATS_FIELDS = ('review_count', 'rating_sum') + RATING_COUNT_FIELDS + ('visible_count', 'visible_rating_sum')
+
+
+def current_state(instance, fields):
+    """Snapshot of the given fields of an instance, as they are in memory."""
+    return {field: getattr(instance, field) for field in fields}
+
+
+def stored_state(instance, fields):
+    """
+    The given fields of an instance as they are stored in the database, or
+    None for an instance that has not been saved yet (or is already deleted).
+
+    Called inside the save / delete transaction: the row is read with
+    `select_for_update`, so concurrent writes of the same row (two stale
+    copies of a review both approving it, an approval racing a bulk
+    moderation) are applied one after the other, each against what the
+    other stored, instead of both against the values they were loaded with.
+    """
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance)._default_manager.select_for_update().filter(pk=instance.pk).values(*fields).first()
+
+
+# مراجعات المنتجات الجاري حذفها (Product.delete)
+_reviews_deleted_with_products = ContextVar('reviews_deleted_with_products', default=frozenset())
+
+
+@contextmanager
+def deleting_product(product):
+    """
+    Delete `product` inside this block. Its reviews, and their interactions
+    and reports, are deleted with it by cascade, and so is everything derived
+    from them (the product's rating counts, daily rollup and term counts, the
+    reviews' own counters): the signal handlers skip the per-review and
+    per-interaction maintenance of these reviews (`reviews_deleted_with_products`).
+    """
+    review_ids = frozenset(Review.objects.filter(product=product).values_list('pk', flat=True))
+    token = _reviews_deleted_with_products.set(_reviews_deleted_with_products.get() | review_ids)
+    try:
+        yield
+    finally:
+        _reviews_deleted_with_products.reset(token)
+
+
+def reviews_deleted_with_products():
+    """Ids of the reviews being deleted with their product (see `deleting_product`)."""
+    return _reviews_deleted_with_products.get()
+
+
+def _signed_states(changes):
+    """(state, -1) for each old state and (state, +1) for each new state of (old_state, new_state) pairs."""
+    for old_state, new_state in changes:
+        if old_state:
+            yield old_state, -1
+        if new_state:
+            yield new_state, 1
+
+
+def apply_review_change(old_state, new_state):
+    """
+    Move the contribution of a review from `old_state` to `new_state`.
+
+    Either state may be None (review created / deleted). Only visible reviews
+    count, so approving or rejecting a review is just a change of state.
+    """
+    apply_review_changes([(old_state, new_state)])
+
+
+def apply_review_changes(changes):
+    """
+    `apply_review_change` for many (old_state, new_state) pairs at once. The
+    products are updated by one statement executed for each of them.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in _signed_states(changes):
+        if not state['is_visible']:
+            continue
+        product_deltas = deltas[state['product_id']]
+        product_deltas['rating_count'] += sign
+        product_deltas['rating_sum'] += sign * state['rating']
+        product_deltas[f"rating_{state['rating']}_count"] += sign
+
+    deltas = {product_id: fields for product_id, fields in deltas.items() if any(fields.values())}
+    if len(deltas) > 1:
+        _bulk_add(Product, deltas, PRODUCT_AGGREGATE_FIELDS)
+        return
+    for product_id, fields in deltas.items():
+        updates = {name: F(name) + delta for name, delta in fields.items() if delta}
+        Product.objects.filter(pk=product_id).update(**updates, updated_at=timezone.now())
+
+
+def review_day(created_at):
+    """The `ReviewDailyStats.day` a review created at `created_at` belongs to."""
+    return timezone.localdate(created_at)
+
+
+def apply_daily_stats_change(old_state, new_state):
+    """
+    Move the contribution of a review from `old_state` to `new_state` in the
+    daily rollup: one `F()` UPDATE per (product, day), creating the row the
+    first time a review lands on that day.
+    """
+    apply_daily_stats_changes([(old_state, new_state)])
+
+
+def apply_daily_stats_changes(changes):
+    """`apply_daily_stats_change` for many (old_state, new_state) pairs at once."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    days = {}  # المراجعات المستوردة معًا تشترك في created_at
+    for state, sign in _signed_states(changes):
+        created_at = state['created_at']
+        if created_at is None:
+            continue
+        if created_at not in days:
+            days[created_at] = review_day(created_at)
+        day_deltas = deltas[(state['product_id'], days[created_at])]
+        day_deltas['review_count'] += sign
+        day_deltas['rating_sum'] += sign * state['rating']
+        day_deltas[f"rating_{state['rating']}_count"] += sign
+        if state['is_visible']:
+            day_deltas['visible_count'] += sign
+            day_deltas['visible_rating_sum'] += sign * state['rating']
+
+    # الإضافات فقط (إنشاء / استيراد مراجعات): upsert واحد لكل الأيام
+    additions = {
+        key: fields for key, fields in deltas.items()
+        if any(fields.values()) and min(fields.values()) >= 0
+    }
+    if len(additions) > 1 and _bulk_upsert_add(ReviewDailyStats, ('product', 'day'), DAILY_STATS_FIELDS, additions):
+        deltas = {key: fields for key, fields in deltas.items() if key not in additions}
+
+    for (product_id, day), fields in deltas.items():
+        fields = {name: delta for name, delta in fields.items() if delta}
+        if fields:
+            _upsert_daily_stats(product_id, day, fields)
+
+
+def _upsert_daily_stats(product_id, day, fields):
+    rows = ReviewDailyStats.objects.filter(product_id=product_id, day=day)
+    updates = {name: F(name) + delta for name, delta in fields.items()}
+    if rows.update(**updates) or not any(delta > 0 for delta in fields.values()):
+        return
+    try:
+        # savepoint: إذا أنشأ طلب آخر الصف في نفس اللحظة نعود إلى UPDATE
+        with transaction.atomic():
+            ReviewDailyStats.objects.create(
+                product_id=product_id, day=day,
+                **{name: max(delta, 0) for name, delta in fields.items()}
+            )
+    except IntegrityError:
+        rows.update(**updates)
+
+
+def review_terms(text):
+    """Word counts of a review text, as stored in `ReviewTermCount`."""
+    return Counter(term for term in tokenize(text or '') if len(term) <= ReviewTermCount.MAX_TERM_LENGTH)
+
+
+def apply_term_change(old_state, new_state):
+    """
+    Move the words of a review from `old_state` to `new_state` in the term
+    counts: words only added are upserted by one statement (SQLite and
+    PostgreSQL); for the others missing rows are inserted in one query, then
+    terms sharing the same change are updated together with `F()`.
+    """
+    apply_term_changes([(old_state, new_state)])
+
+
+def apply_term_changes(changes):
+    """`apply_term_change` for many (old_state, new_state) pairs at once."""
+    changes = [
+        (old_state, new_state) for old_state, new_state in changes
+        if not (old_state and new_state and all(
+            old_state[field] == new_state[field] for field in ('product_id', 'review_text', 'is_visible')
+        ))
+    ]
+    if not changes:
+        return
+
+    deltas = defaultdict(lambda: [0, 0])
+    for state, sign in _signed_states(changes):
+        for term, occurrences in review_terms(state['review_text']).items():
+            term_deltas = deltas[(state['product_id'], term)]
+            term_deltas[0] += sign * occurrences
+            if state['is_visible']:
+                term_deltas[1] += sign * occurrences
+
+    # الإضافات فقط (إنشاء / استيراد مراجعات): upsert واحد يجمع القيم بدل UPDATE لكل تغيير مختلف
+    additions = {
+        key: {'count': count, 'visible_count': visible}
+        for key, (count, visible) in deltas.items() if min(count, visible) >= 0 and (count or visible)
+    }
+    if additions and _bulk_upsert_add(ReviewTermCount, ('product', 'term'), ('count', 'visible_count'), additions):
+        deltas = {key: change for key, change in deltas.items() if key not in additions}
+
+    new_rows = [
+        ReviewTermCount(product_id=product_id, term=term)
+        for (product_id, term), (count, visible) in deltas.items() if count > 0 or visible > 0
+    ]
+    ReviewTermCount.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+    by_change = defaultdict(lambda: defaultdict(list))
+    for (product_id, term), (count, visible) in deltas.items():
+        if count or visible:
+            by_change[(count, visible)][product_id].append(term)
+    removed = False
+    for (count, visible), terms_by_product in by_change.items():
+        removed = removed or count < 0
+        for product_id, terms in terms_by_product.items():
+            # حد عدد المعاملات في الاستعلام الواحد (عند استيراد دفعات كبيرة)
+            for start in range(0, len(terms), TERM_UPDATE_CHUNK):
+                ReviewTermCount.objects.filter(
+                    product_id=product_id, term__in=terms[start:start + TERM_UPDATE_CHUNK]
+                ).update(count=F('count') + count, visible_count=F('visible_count') + visible)
+    if removed:
+        product_ids = {product_id for product_id, _ in deltas}
+        ReviewTermCount.objects.filter(product_id__in=product_ids, count=0).delete()
+
+
+def _bulk_add(model, deltas, fields):
+    """
+    Add {pk: {field: delta}} to rows of `model` with a single UPDATE statement
+    executed once per row (executemany), also setting `updated_at`.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    columns = [quote(model._meta.get_field(name).column) for name in fields]
+    assignments = ', '.join(f'{column} = {column} + %s' for column in columns)
+    now = model._meta.get_field('updated_at').get_db_prep_save(timezone.now(), connection)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(model._meta.db_table)} SET {assignments}, {quote('updated_at')} = %s "
+            f"WHERE {quote(model._meta.pk.column)} = %s",
+            [[row.get(name, 0) for name in fields] + [now, pk] for pk, row in deltas.items()],
+        )
+
+
+def _bulk_upsert_add(model, key_fields, fields, additions):
+    """
+    Add {key: {field: delta}} (key: values of the unique `key_fields`) to rows
+    of `model`, creating the missing ones, with one INSERT ... ON CONFLICT DO
+    UPDATE executed once per row (SQLite 3.24+ and PostgreSQL). Returns False,
+    doing nothing, on other databases.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return False
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    key_model_fields = [model._meta.get_field(name) for name in key_fields]
+    keys = [quote(field.column) for field in key_model_fields]
+    columns = [quote(model._meta.get_field(name).column) for name in fields]
+    updates = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in columns)
+    rows = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(key_model_fields, key)]
+        + [row.get(name, 0) for name in fields]
+        for key, row in additions.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(keys + columns)}) VALUES ({', '.join(['%s'] * len(keys + columns))}) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}",
+            rows,
+        )
+    return True
+
+
+def wilson_score(positive, total, z=WILSON_Z):
+    """
+    Lower bound of the Wilson score interval of `positive` successes out of
+    `total` trials: the proportion we are 95% sure the true one exceeds, so
+    3/3 ranks below 90/100. Each user interacting with a review casts two
+    yes/no votes (liked, helpful): positive = interactions_count, total =
+    2 * votes_count.
+    """
+    if total <= 0:
+        return 0.0
+    z2 = z * z
+    return (positive + z2 / 2 - z * math.sqrt(positive * (total - positive) / total + z2 / 4)) / (total + z2)
+
+
+def wilson_score_expression(positive, total, z=WILSON_Z):
+    """`wilson_score` as an SQL expression over integer expressions (for UPDATE ... SET rank_score)."""
+    positive = Cast(positive, FloatField())
+    total = Cast(total, FloatField())
+    z2 = z * z
+    score = (
+        (positive + Value(z2 / 2) - Value(z) * Sqrt(positive * (total - positive) / total + Value(z2 / 4)))
+        / (total + Value(z2))
+    )
+    return Case(When(GreaterThan(total, 0), then=score), default=Value(0.0), output_field=FloatField())
+
+
+def apply_interaction_change(old_state, new_state):
+    """
+    Move the contribution of an interaction from `old_state` to `new_state`
+    on the counters of its review, with one atomic `F()` UPDATE per review
+    (which also recomputes `rank_score` from the new counters).
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if not state:
+            continue
+        review_deltas = deltas[state['review_id']]
+        review_deltas['likes_count'] += sign * bool(state['liked'])
+        review_deltas['helpful_count'] += sign * bool(state['is_helpful'])
+        review_deltas['interactions_count'] += sign * (bool(state['liked']) + bool(state['is_helpful']))
+        review_deltas['votes_count'] += sign
+
+    for review_id, fields in deltas.items():
+        updates = {name: F(name) + delta for name, delta in fields.items() if delta}
+        if updates:
+            updates['rank_score'] = wilson_score_expression(
+                F('interactions_count') + fields['interactions_count'], (F('votes_count') + fields['votes_count']) * 2
+            )
+            Review.objects.filter(pk=review_id).update(**updates, updated_at=timezone.now())
+
+
+def rebuild_product_aggregates(product_ids=None, batch_size=1000):
+    """
+    Recompute the stored aggregates from the reviews table with one GROUP BY
+    over the visible reviews. Returns the number of products updated.
+    """
+    products = Product.objects.all()
+    reviews = Review.objects.filter(is_visible=True)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+        reviews = reviews.filter(product_id__in=product_ids)
+
+    # تصفير ثم استعلام GROUP BY واحد، بدل استعلامات فرعية مترابطة لكل منتج
+    updated = products.update(**{field: 0 for field in PRODUCT_AGGREGATE_FIELDS}, updated_at=timezone.now())
+    rows = (
+        reviews.values('product_id')
+        .annotate(
+            rating_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{rating}_count': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)}
+        )
+        .order_by()
+    )
+    batch = []
+    for row in rows.iterator():
+        batch.append(Product(pk=row.pop('product_id'), **row))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_update(batch, PRODUCT_AGGREGATE_FIELDS)
+            batch = []
+    Product.objects.bulk_update(batch, PRODUCT_AGGREGATE_FIELDS)
+    return updated
+
+
+def daily_stats_rows(reviews):
+    """`reviews` grouped by (product, day) into `ReviewDailyStats` field values."""
+    visible = Q(is_visible=True)
+    counts = {f'rating_{rating}_count': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)}
+    return (
+        reviews.annotate(day=TruncDate('created_at'))
+        .values('product_id', 'day')
+        .annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            visible_count=Count('id', filter=visible),
+            visible_rating_sum=Coalesce(Sum('rating', filter=visible), Value(0)),
+            **counts
+        )
+        .order_by()
+    )
+
+
+def rebuild_daily_stats(product_ids=None, batch_size=2000):
+    """
+    Recompute the daily rollup from the reviews table with one GROUP BY.
+    Returns the number of (product, day) rows written.
+    """
+    stats = ReviewDailyStats.objects.all()
+    reviews = Review.objects.all()
+    if product_ids is not None:
+        stats = stats.filter(product_id__in=product_ids)
+        reviews = reviews.filter(product_id__in=product_ids)
+
+    stats.delete()
+    rows = [ReviewDailyStats(**row) for row in daily_stats_rows(reviews).iterator()]
+    ReviewDailyStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_term_counts(product_ids=None, batch_size=2000):
+    """
+    Recount the words of every review, one product at a time (reviews are read
+    in product order, so only one product's counts are held in memory).
+    Returns the number of (product, term) rows written.
+    """
+    terms = ReviewTermCount.objects.all()
+    reviews = Review.objects.all()
+    if product_ids is not None:
+        terms = terms.filter(product_id__in=product_ids)
+        reviews = reviews.filter(product_id__in=product_ids)
+    terms.delete()
+
+    rows = reviews.order_by('product_id').values_list('product_id', 'review_text', 'is_visible')
+    written = 0
+    batch = []
+    current_product, counts, visible_counts = None, Counter(), Counter()
+
+    def flush_product():
+        for term, count in counts.items():
+            batch.append(ReviewTermCount(
+                product_id=current_product, term=term, count=count, visible_count=visible_counts[term]
+            ))
+
+    for product_id, review_text, is_visible in rows.iterator(chunk_size=batch_size):
+        if product_id != current_product:
+            flush_product()
+            current_product, counts, visible_counts = product_id, Counter(), Counter()
+            if len(batch) >= batch_size:
+                ReviewTermCount.objects.bulk_create(batch, batch_size=batch_size)
+                written += len(batch)
+                batch = []
+        terms = review_terms(review_text)
+        counts.update(terms)
+        if is_visible:
+            visible_counts.update(terms)
+    flush_product()
+    ReviewTermCount.objects.bulk_create(batch, batch_size=batch_size)
+    return written + len(batch)
+
+
+def _interactions_subquery(**filters):
+    interactions = (
+        ReviewInteraction.objects.filter(review=OuterRef('pk'), **filters)
+        .order_by()
+        .values('review')
+        .annotate(value=Count('id'))
+        .values('value')
+    )
+    return Coalesce(Subquery(interactions, output_field=IntegerField()), Value(0))
+
+
+def rebuild_review_counters(review_ids=None):
+    """
+    Recompute the stored interaction counters of reviews in a single UPDATE.
+    Returns the number of reviews updated.
+    """
+    reviews = Review.objects.all()
+    if review_ids is not None:
+        reviews = reviews.filter(pk__in=review_ids)
+    updated = reviews.update(
+        updated_at=timezone.now(),
+        likes_count=_interactions_subquery(liked=True),
+        helpful_count=_interactions_subquery(is_helpful=True),
+        interactions_count=_interactions_subquery(liked=True) + _interactions_subquery(is_helpful=True),
+        votes_count=_interactions_subquery(),
+    )
+    # من العدادات المحدثة للتو، بدل تكرار الاستعلامات الفرعية داخل المعادلة
+    reviews.update(rank_score=wilson_score_expression(F('interactions_count'), F('votes_count') * 2))
+    return updated
@@ -1,15 +1,32 @@
 from datetime import timedelta
-from django.db.models import Avg, Count, Q
-from collections import Counter
-import re
+from django.conf import settings
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Q, Sum
 from django.utils import timezone
-from products.models import Product, Review
+from products.models import Product, Review, ReviewDailyStats, ReviewTermCount
+from products.moderation import get_matcher
+from products.search import fts_available, fts_query, ranked_matches
+from products.exports import export_chunk_size
+from products.wordfreq import DEFAULT_SKETCH_SIZE, most_common_words, sketch_words
 
 # 1. تحليل متوسط تقييم المنتج أو جميع المنتجات خلال فترة زمنية
-def get_product_rating_trend(product_id=None, days=30):
+def get_product_rating_trend(product_id=None, days=30, use_rollup=False):
     """
     يحلل متوسط تقييم المنتج (أو جميع المنتجات إذا لم يتم تحديد المنتج) خلال فترة زمنية محددة.
+    use_rollup=True: يقرأ الملخص اليومي (ReviewDailyStats) بدل المراجعات، بدقة الأيام الكاملة.
     """
+    if use_rollup:
+        stats = _daily_stats_window(days)
+        if product_id:
+            stats = stats.filter(product_id=product_id)
+        totals = stats.aggregate(total=Sum('review_count'), rating_sum=Sum('rating_sum'))
+        total_reviews = totals['total'] or 0
+        avg_rating = totals['rating_sum'] / total_reviews if total_reviews else 0
+        return {
+            'average_rating': round(avg_rating, 2),
+            'total_reviews': total_reviews,
+            'trend_days': days,
+        }
+
     start_date = timezone.now() - timedelta(days=days)
     filters = { 'created_at__gte': start_date}
     if product_id:
@@ -23,19 +40,56 @@ def get_product_rating_trend(product_id=None, days=30):
         'trend_days': days,
     }
 
+def _daily_stats_window(days):
+    """
+    Rollup rows of the last `days` days: today and the `days - 1` before it,
+    like `created_at >= now - days` in whole days (the day `days` ago is out).
+    """
+    start_day = timezone.localdate() - timedelta(days=days)
+    return ReviewDailyStats.objects.filter(day__gt=start_day)
+
 # 2. الكلمات الأكثر شيوعًا في مراجعات منتج أو جميع المنتجات
-def get_most_common_words_in_reviews(product_id=None, limit=10):
+def get_most_common_words_in_reviews(product_id=None, limit=10, stop_words=None, normalize_arabic=False,
+                                     processes=None, use_index=True, approximate=False, sketch_size=None):
     """
     يحلل الكلمات الأكثر شيوعًا في مراجعات منتج معين أو جميع المنتجات.
+    يقرأ جدول عدد الكلمات (ReviewTermCount) المحدّث مع كل مراجعة؛ عند التساوي تُرتب الكلمات أبجديًا.
+    normalize_arabic أو use_index=False: تُقرأ النصوص على دفعات وتُعد (wordfreq.py)،
+    و processes > 1 يوزع العد على عدة عمليات.
+    approximate=True: عدّ تقريبي بذاكرة ثابتة (SpaceSaving بحجم sketch_size أو WORDFREQ_SKETCH_SIZE)،
+    ويعيد (الكلمة، العدد التقديري، أقصى خطأ): العدد الحقيقي بين count - error و count.
     """
+    if approximate:
+        capacity = sketch_size or getattr(settings, 'WORDFREQ_SKETCH_SIZE', DEFAULT_SKETCH_SIZE)
+        sketch = sketch_words(
+            _review_texts(product_id), capacity, stop_words=stop_words, normalize_arabic=normalize_arabic,
+            processes=processes, chunk_size=export_chunk_size(),
+        )
+        return sketch.most_common(limit)
+
+    if use_index and not normalize_arabic:
+        terms = ReviewTermCount.objects.filter(count__gt=0)
+        if stop_words:
+            terms = terms.exclude(term__in=[word.lower() for word in stop_words])
+        if product_id:
+            rows = terms.filter(product_id=product_id).order_by('-count', 'term').values_list('term', 'count')
+        else:
+            rows = terms.values('term').annotate(total=Sum('count')).order_by('-total', 'term').values_list('term', 'total')
+        return list(rows[:limit])
+
+    return most_common_words(
+        _review_texts(product_id), limit, stop_words=stop_words, normalize_arabic=normalize_arabic,
+        processes=processes, chunk_size=export_chunk_size(),
+    )
+
+
+def _review_texts(product_id=None):
+    """Review texts streamed from the database in chunks."""
     filters = {}
     if product_id:
         filters['product_id'] = product_id
-    reviews = Review.objects.filter(**filters)
-    all_text = ' '.join([r.review_text.lower() for r in reviews])
-    words = re.findall(r'\b\w{4,}\b', all_text)
-    common_words = Counter(words).most_common(limit)
-    return common_words
+    reviews = Review.objects.filter(**filters).values_list('review_text', flat=True)
+    return reviews.iterator(chunk_size=export_chunk_size())
 
 # 3. أكثر المستخدمين كتابةً للمراجعات
 def get_top_reviewers(limit=5):
@@ -48,38 +102,54 @@ def get_top_reviewers(limit=5):
     return [{'username': item['user__username'], 'review_count': item['count']} for item in top_users]
 
 # 4. البحث في المراجعات باستخدام كلمات مفتاحية
-def search_reviews_by_keyword(product_id=None, keyword=None):
+def search_reviews_by_keyword(product_id=None, keyword=None, use_index=True):
     """
     يبحث عن المراجعات باستخدام كلمة مفتاحية في منتج معين أو جميع المنتجات.
+
+    مع فهرس FTS5 (SQLite): كلمات كاملة، عبارات "..." وبادئات batt*، مرتبة حسب
+    الصلة مع search_snippet. بدونه: review_text__icontains كما كان.
     """
     if not keyword:
         return []
-    filters = { 'review_text__icontains': keyword}
+    reviews = Review.objects.select_related('user')
     if product_id:
-        filters['product_id'] = product_id
-    return Review.objects.filter(**filters).select_related('user')
+        reviews = reviews.filter(product_id=product_id)
+    query = fts_query(keyword)
+    if use_index and query is not None and fts_available(reviews.db):
+        return ranked_matches(reviews, query)
+    return reviews.filter(review_text__icontains=keyword).order_by('-created_at', '-id')
 
 # 5. تصدير المراجعات إلى CSV
-import csv
-from django.http import HttpResponse
+from products.exports import review_rows, streaming_csv_response
 
 def export_reviews_to_csv(reviews_queryset):
     """
-    يصدر المراجعات إلى ملف CSV.
+    يصدر المراجعات إلى ملف CSV (استجابة متدفقة، دون تحميل كل المراجعات في الذاكرة).
     """
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="reviews.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['ID', 'المستخدم', 'التقييم', 'نص المراجعة'])
-    for review in reviews_queryset:
-        writer.writerow([review.id, review.user.username, review.rating, review.review_text])
-    return response
+    return streaming_csv_response(
+        'reviews.csv', ['ID', 'المستخدم', 'التقييم', 'نص المراجعة'], review_rows(reviews_queryset)
+    )
 
 # 6. المنتجات الأعلى تقييمًا
-def get_top_rated_products(days=30, limit=5):
+def get_top_rated_products(days=30, limit=5, use_rollup=False):
     """
     يعرض المنتجات الأعلى تقييمًا خلال فترة زمنية محددة.
+    use_rollup=True: يقرأ الملخص اليومي (ReviewDailyStats) بدل المراجعات، بدقة الأيام الكاملة.
     """
+    if use_rollup:
+        rows = (
+            _daily_stats_window(days)
+            .values('product_id', 'product__name')
+            .annotate(total=Sum('review_count'), rating_sum=Sum('rating_sum'))
+            .filter(total__gt=0)
+            .annotate(avg_rating=ExpressionWrapper(F('rating_sum') * 1.0 / F('total'), output_field=FloatField()))
+            .order_by('-avg_rating', 'product_id')[:limit]
+        )
+        return [
+            {'product_id': row['product_id'], 'name': row['product__name'], 'avg_rating': round(row['avg_rating'], 2)}
+            for row in rows
+        ]
+
     start_date = timezone.now() - timedelta(days=days)
     products = Product.objects.filter(
         reviews__created_at__gte=start_date,
@@ -95,7 +165,7 @@ def get_low_rating_reviews(product_id=None, limit=10):
     filters = { 'rating__lte': 2}
     if product_id:
         filters['product_id'] = product_id
-    reviews = Review.objects.filter(**filters)[:limit]
+    reviews = Review.objects.filter(**filters).select_related('user')[:limit]
     return [{'review_id': review.id, 'user': review.user.username, 'rating': review.rating, 'review_text': review.review_text} for review in reviews]
 
 # 8. عدد المراجعات غير الموافق عليها
@@ -114,11 +184,103 @@ def filter_inappropriate_reviews(product_id=None, banned_words=[]):
     filters = {}
     if product_id:
         filters['product_id'] = product_id
-    reviews = Review.objects.filter(**filters)
+    matcher = get_matcher(banned_words)
+    reviews = Review.objects.filter(**filters).values_list('id', 'user__username', 'review_text')
     flagged_reviews = [
-        {'review_id': review.id, 'user': review.user.username, 'review_text': review.review_text}
-        for review in reviews
-        if any(banned_word in review.review_text.lower() for banned_word in banned_words)
+        {'review_id': review_id, 'user': username, 'review_text': review_text}
+        for review_id, username, review_text in reviews.iterator()
+        if matcher.search(review_text)
     ]
     return flagged_reviews
- 
\ No newline at end of file
+ 
+# 10. تحليلات عدة منتجات دفعة واحدة (للتصدير وللوحات التحليل)
+from itertools import groupby
+from operator import itemgetter
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+
+
+class _ProductGroups:
+    """Walks rows ordered by product id (product id first), one product at a time."""
+
+    def __init__(self, rows):
+        self._groups = groupby(rows, key=itemgetter(0))
+        self._current = next(self._groups, None)
+
+    def pop(self, product_id):
+        """Rows of `product_id` without the id; products must be asked for in increasing id order."""
+        while self._current is not None and self._current[0] < product_id:
+            self._current = next(self._groups, None)
+        if self._current is None or self._current[0] != product_id:
+            return []
+        rows = [row[1:] for row in self._current[1]]
+        self._current = next(self._groups, None)
+        return rows
+
+
+def iter_products_analytics(products, days=30, words_limit=10, low_rating_limit=10):
+    """
+    يعطي لكل منتج (بترتيب المعرّف) نفس نتائج get_product_rating_trend و
+    get_most_common_words_in_reviews و get_low_rating_reviews، من أربعة استعلامات
+    إجمالاً بدل أربعة لكل منتج، مع ذاكرة ثابتة (منتج واحد في كل مرة) ودون قراءة نصوص المراجعات.
+
+    Yields (product, analytics dict).
+    """
+    chunk_size = export_chunk_size()
+    products = products.order_by('id')
+    product_ids = products.values('id')
+
+    trends = _ProductGroups(
+        _daily_stats_window(days).filter(product_id__in=product_ids)
+        .values_list('product_id').annotate(total=Sum('review_count'), rating_sum=Sum('rating_sum'))
+        .order_by('product_id').iterator(chunk_size=chunk_size)
+    )
+    # أكثر الكلمات شيوعًا لكل منتج من جدول عدد الكلمات (ROW_NUMBER لكل منتج)
+    words = _ProductGroups(
+        ReviewTermCount.objects.filter(product_id__in=product_ids, count__gt=0)
+        .annotate(position=Window(
+            RowNumber(), partition_by=F('product_id'), order_by=[F('count').desc(), F('term').asc()]
+        ))
+        .filter(position__lte=words_limit)
+        .order_by('product_id', '-count', 'term')
+        .values_list('product_id', 'term', 'count')
+        .iterator(chunk_size=chunk_size)
+    )
+    # أول N مراجعات منخفضة التقييم لكل منتج في استعلام واحد (ROW_NUMBER لكل منتج)
+    low_ratings = _ProductGroups(
+        Review.objects.filter(product_id__in=product_ids, rating__lte=2)
+        .annotate(position=Window(RowNumber(), partition_by=F('product_id'), order_by=F('id').asc()))
+        .filter(position__lte=low_rating_limit)
+        .order_by('product_id', 'id')
+        .values_list('product_id', 'id', 'user__username', 'rating', 'review_text')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    for product in products.iterator(chunk_size=chunk_size):
+        trend = trends.pop(product.id)
+        total_reviews, rating_sum = trend[0] if trend else (0, 0)
+        yield product, {
+            'rating_trend': {
+                'average_rating': round(rating_sum / total_reviews, 2) if total_reviews else 0,
+                'total_reviews': total_reviews,
+                'trend_days': days,
+            },
+            'most_common_words': words.pop(product.id),
+            'low_rating_reviews': [
+                {'review_id': review_id, 'user': username, 'rating': rating, 'review_text': review_text}
+                for review_id, username, rating, review_text in low_ratings.pop(product.id)
+            ],
+        }
+
+
+def get_products_analytics(product_ids, days=30, words_limit=10, low_rating_limit=10):
+    """
+    تحليلات مجموعة منتجات دفعة واحدة: {product_id: {'rating_trend', 'most_common_words', 'low_rating_reviews'}}.
+    """
+    products = Product.objects.filter(pk__in=product_ids).only('id')
+    return {
+        product.id: data
+        for product, data in iter_products_analytics(
+            products, days=days, words_limit=words_limit, low_rating_limit=low_rating_limit
+        )
+    }
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_migrate
+
+
+def repair_search_index(sender, using, **kwargs):
+    from .search import repair_review_fts
+
+    repair_review_fts(using)
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .cache import check_review_cache
+
+        # ETag و 304 تعتمد على نسخ في الكاش، فيجب أن يكون مشتركًا بين العمليات
+        checks.register(check_review_cache, checks.Tags.caches)
+
+        # إعادة بناء جدول المراجعات في SQLite تحذف محفزات فهرس البحث
+        post_migrate.connect(repair_search_index, sender=self)
@@ -0,0 +1,154 @@
+"""
+Bulk moderation: `POST /api/admin/reviews/bulk/` approves, rejects or flags
+many reviews at once, like `admin/reviews/<id>/<action>/` does for one.
+
+The reviews are given by id (`review_ids`) or by a filter over the
+requesting user's products (`filter`, e.g. the pending reviews rated 1-2 of
+one product). Either way:
+
+1. the reviews and the owners of their products are read with one query,
+   and every id gets its own result (not_found / forbidden / ...);
+2. visibility is changed with one `QuerySet.update`; since no signals are
+   sent, the product aggregates, the daily rollup and the word counts are
+   updated once for the whole change (see aggregates.py);
+3. the `AdminReport` and `Notification` rows are created with one
+   `bulk_create` each,
+
+all in one transaction. The cached responses of the touched reviews and
+products are invalidated.
+
+Settings:
+    REVIEW_BULK_MODERATION_MAX_ITEMS    reviews handled by one request (default 5000)
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .aggregates import REVIEW_STATE_FIELDS, apply_daily_stats_changes, apply_review_changes, apply_term_changes
+from .cache import review_cache
+from .models import AdminReport, Notification, Review
+
+ACTIONS = ('approve', 'reject', 'flag')
+# نتيجة كل مراجعة
+APPROVED, REJECTED, FLAGGED = 'approved', 'rejected', 'flagged'
+UNCHANGED, NOT_FOUND, FORBIDDEN = 'unchanged', 'not_found', 'forbidden'
+
+NOTIFICATION_MESSAGES = {
+    'approve': "Your review for '{product}' has been approved and is now visible.",
+    'reject': "Your review for '{product}' has been rejected.",
+}
+
+
+def max_items():
+    return getattr(settings, 'REVIEW_BULK_MODERATION_MAX_ITEMS', 5000)
+
+
+def filtered_reviews(user, filters):
+    """The reviews of `user`'s products matching `filters` (validated BulkModerationSerializer filter)."""
+    reviews = Review.objects.filter(product__user=user)
+    if 'product' in filters:
+        reviews = reviews.filter(product_id=filters['product'])
+    if filters.get('status') == 'pending':
+        reviews = reviews.filter(is_visible=False)
+    elif filters.get('status') == 'visible':
+        reviews = reviews.filter(is_visible=True)
+    if 'min_rating' in filters:
+        reviews = reviews.filter(rating__gte=filters['min_rating'])
+    if 'max_rating' in filters:
+        reviews = reviews.filter(rating__lte=filters['max_rating'])
+    if 'is_offensive' in filters:
+        reviews = reviews.filter(is_offensive=filters['is_offensive'])
+    return reviews
+
+
+def moderate_reviews(user, action, review_ids=None, filters=None):
+    """
+    Apply `action` to the reviews given by `review_ids`, or matching `filters`
+    (at most `max_items()` of them, oldest first). Returns the summary:
+    {'action', 'counts': {result: n}, 'results': [{'id', 'result'}], 'has_more'}.
+    """
+    limit = max_items()
+    if review_ids is not None:
+        review_ids = list(dict.fromkeys(review_ids))
+        reviews = Review.objects.filter(pk__in=review_ids)
+    else:
+        reviews = filtered_reviews(user, filters).order_by('pk')[:limit + 1]
+
+    with transaction.atomic():
+        # المراجعات ومالكو منتجاتها باستعلام واحد، مقفلة حتى نهاية المعاملة
+        rows = list(
+            reviews.select_for_update(of=('self',))
+            .values('pk', 'user_id', 'product__user_id', 'product__name', *REVIEW_STATE_FIELDS)
+        )
+        has_more = review_ids is None and len(rows) > limit
+        rows = rows[:limit]
+        if review_ids is None:
+            review_ids = [row['pk'] for row in rows]
+
+        by_id = {row['pk']: row for row in rows}
+        owned = [by_id[pk] for pk in review_ids if pk in by_id and by_id[pk]['product__user_id'] == user.pk]
+        results = {pk: (FORBIDDEN if pk in by_id else NOT_FOUND) for pk in review_ids}
+        results.update(_apply(user, action, owned))
+
+    counts = {}
+    for result in results.values():
+        counts[result] = counts.get(result, 0) + 1
+    return {
+        'action': action,
+        'counts': counts,
+        'results': [{'id': pk, 'result': results[pk]} for pk in review_ids],
+        'has_more': has_more,
+    }
+
+
+def _apply(user, action, rows):
+    """Moderate the (owned) review rows; returns {review id: result}."""
+    if not rows:
+        return {}
+    now = timezone.now()
+    if action == 'flag':
+        changed, result = [], FLAGGED
+    else:
+        visible = action == 'approve'
+        changed = [row for row in rows if row['is_visible'] != visible]
+        result = APPROVED if visible else REJECTED
+    # الموافقة على مراجعة ظاهرة لا تغيّر شيئًا؛ الرفض والإشارة يُسجَّلان دائمًا كتقرير
+    handled = changed if action == 'approve' else rows
+    if not handled:
+        return {row['pk']: UNCHANGED for row in rows}
+
+    handled_ids = [row['pk'] for row in handled]
+    if changed:
+        Review.objects.filter(pk__in=handled_ids).update(is_visible=visible, updated_at=now)
+        changes = [(_state(row), {**_state(row), 'is_visible': visible}) for row in changed]
+        apply_review_changes(changes)
+        apply_daily_stats_changes(changes)
+        apply_term_changes(changes)
+    else:
+        # التقارير جزء من تمثيل المراجعة (reported)، فتتغير ETag / Last-Modified
+        Review.objects.filter(pk__in=handled_ids).update(updated_at=now)
+
+    if action in ('reject', 'flag'):
+        status = 'rejected' if action == 'reject' else 'pending'
+        AdminReport.objects.bulk_create([
+            AdminReport(review_id=row['pk'], user=user, status=status) for row in handled
+        ])
+    if action in NOTIFICATION_MESSAGES:
+        message = NOTIFICATION_MESSAGES[action]
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=row['user_id'], related_review_id=row['pk'],
+                message=message.format(product=row['product__name']),
+            )
+            for row in handled
+        ])
+
+    review_cache.invalidate('review', *handled_ids)
+    review_cache.invalidate('product', *{row['product_id'] for row in handled})
+    results = {row['pk']: UNCHANGED for row in rows}
+    results.update({pk: result for pk in handled_ids})
+    return results
+
+
+def _state(row):
+    return {field: row[field] for field in REVIEW_STATE_FIELDS}
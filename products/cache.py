@@ -0,0 +1,228 @@
+"""
+Read-through cache for the product and review read endpoints.
+
+Cached entries are keyed by the versions of what they depend on: every
+product and every review has a version number stored in the cache, and an
+entry built from product 5 is stored under a key containing product 5's
+current version. Invalidating is a single write of a new version (O(1), no
+matter how many entries exist); entries under older versions are never read
+again and simply expire. Versions are the current time in nanoseconds, so a
+version evicted by the backend, or set by two processes at once, never comes
+back at a value an old entry was stored under.
+
+Versions are bumped by the `post_save`/`post_delete` signals of `Product`,
+`Review`, `ReviewInteraction` and `AdminReport` (products/signals.py) and by
+`rebuild_product_aggregates` (everything). Flushing buffered review views
+bumps nothing: the flushed counts are stored under their own keys and laid
+over cached reviews when they are read (`with_view_counts`). Inside a
+transaction they are bumped again on commit, so a read racing the write
+cannot store the pre-commit state under the new version.
+
+The backend must be shared by every process writing or serving reviews
+(web workers, `import_reviews`, `rebuild_product_aggregates`, ...):
+invalidations only reach the processes using the same cache. The default
+settings use FileBasedCache, shared by the processes of one host; use Redis
+or Memcached across hosts. A process-local backend (LocMemCache) is only
+correct with a single process and is reported by `manage.py check`
+(products.W001). Per-request data (the requesting user's liked/reported
+flags) is never cached; views add it after the lookup.
+
+Settings:
+    REVIEW_CACHE_ALIAS   which entry of CACHES to use (default 'default')
+    REVIEW_CACHE_TTL     seconds an entry is kept (default 300)
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import CharField, Value
+
+from .models import AdminReport, ReviewInteraction
+
+DEFAULT_TTL = 300
+_MISS = object()
+
+
+class ReviewCache:
+    """Versioned read-through cache with per-endpoint hit/miss counters (per process)."""
+
+    def __init__(self, prefix='products'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, 'REVIEW_CACHE_ALIAS', 'default')]
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'REVIEW_CACHE_TTL', DEFAULT_TTL)
+
+    # =============================
+    #  Versions
+    # =============================
+    def _version_key(self, kind, obj_id):
+        return f'{self.prefix}:v:{kind}:{obj_id}'
+
+    def _versions(self, deps):
+        keys = [self._version_key(kind, int(obj_id)) for kind, obj_id in deps]
+        versions = self.backend.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in versions}
+        if missing:
+            # add() لا يستبدل نسخة كتبها طلب آخر في نفس اللحظة
+            for key, version in missing.items():
+                if not self.backend.add(key, version, timeout=None):
+                    version = self.backend.get(key, version)
+                versions[key] = version
+        return [versions[key] for key in keys]
+
+    def _bump(self, kind, ids):
+        # set() وليس incr(): incr في FileBasedCache / DatabaseCache قراءة ثم كتابة، فقد تضيع زيادة بين عمليتين
+        self.backend.set_many(
+            {self._version_key(kind, int(obj_id)): time.time_ns() for obj_id in ids}, timeout=None
+        )
+
+    def invalidate(self, kind, *ids):
+        """Drop every entry that depends on the given products / reviews (kind 'product' or 'review')."""
+        ids = [obj_id for obj_id in ids if obj_id is not None]
+        if not ids:
+            return
+        self._bump(kind, ids)
+        connection = transaction.get_connection()
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._bump(kind, ids))
+
+    def invalidate_all(self):
+        self.invalidate('global', 0)
+
+    # =============================
+    #  View counts
+    # =============================
+    def _views_key(self, review_id):
+        return f'{self.prefix}:views:{review_id}'
+
+    def set_view_counts(self, counts):
+        """Store the flushed `views_count` of reviews ({id: count}), read back by `with_view_counts`."""
+        # نفس مدة المدخلات: أي مدخل أقدم من هذه القيمة ينتهي قبلها
+        self.backend.set_many({self._views_key(pk): count for pk, count in counts.items()}, self.ttl)
+
+    def view_counts(self, review_ids):
+        keys = {self._views_key(pk): pk for pk in review_ids}
+        return {keys[key]: count for key, count in self.backend.get_many(keys).items()}
+
+    # =============================
+    #  Entries
+    # =============================
+    def key(self, name, deps, params=None):
+        """Key of the entry `name` built from `deps` ((kind, id) pairs) and request `params`."""
+        deps = [('global', 0), *deps]
+        versions = self._versions(deps)
+        parts = [f'{kind}{int(obj_id)}.{version}' for (kind, obj_id), version in zip(deps, versions)]
+        key = f'{self.prefix}:{name}:' + ':'.join(parts)
+        if params:
+            key += ':' + hashlib.md5(repr(params).encode()).hexdigest()
+        return key
+
+    def get(self, name, key):
+        """The cached value or None, counted as a hit or a miss of `name`."""
+        value = self.backend.get(key, _MISS)
+        with self._lock:
+            self._stats[name]['hits' if value is not _MISS else 'misses'] += 1
+        return None if value is _MISS else value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def get_or_set(self, name, deps, build, params=None):
+        """
+        Cached value of `build()`. None is not cached, and exceptions raised by
+        `build` propagate (nothing is stored), so 404s are never cached.
+        """
+        return self.fetch(name, self.key(name, deps, params), build)
+
+    def fetch(self, name, key, build):
+        """Like `get_or_set`, for a key already built with `key()` (e.g. to derive an ETag from it)."""
+        value = self.get(name, key)
+        if value is None:
+            value = build()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    # =============================
+    #  Stats
+    # =============================
+    def stats(self):
+        with self._lock:
+            stats = {name: dict(counts) for name, counts in self._stats.items()}
+        for counts in stats.values():
+            total = counts['hits'] + counts['misses']
+            counts['hit_ratio'] = round(counts['hits'] / total, 3) if total else None
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+review_cache = ReviewCache()
+
+
+def check_review_cache(app_configs=None, **kwargs):
+    """
+    System check: the review cache backend must be shared across processes,
+    since both the cached responses and the ETags (conditional.py) depend on
+    versions bumped by whichever process wrote the change.
+    """
+    alias = getattr(settings, 'REVIEW_CACHE_ALIAS', 'default')
+    if not isinstance(caches[alias], LocMemCache):
+        return []
+    return [checks.Warning(
+        f"The review cache (CACHES['{alias}']) is LocMemCache, which each process keeps for itself.",
+        hint="Changes made by another server worker or a management command are not seen: stale reviews "
+             "and wrong 304 Not Modified responses. Use a shared backend (FileBasedCache, Redis, Memcached) "
+             "unless a single process serves and writes everything.",
+        id='products.W001',
+    )]
+
+
+def with_view_counts(reviews):
+    """
+    Set `views_count` of serialized reviews to the last flushed count when it
+    is newer than the cached one, so counted views change neither the cached
+    entries nor their ETags.
+    """
+    counts = review_cache.view_counts([review['id'] for review in reviews])
+    for review in reviews:
+        review['views_count'] = max(review['views_count'], counts.get(review['id'], 0))
+    return reviews
+
+
+def with_user_flags(reviews, user):
+    """
+    Set `user_liked` / `reported` of serialized reviews for `user` (one query),
+    since cached review data is shared by every user.
+    """
+    for review in reviews:
+        review['user_liked'] = review['reported'] = False
+    if not reviews or user is None or not user.is_authenticated:
+        return reviews
+    ids = [review['id'] for review in reviews]
+    liked = ReviewInteraction.objects.filter(user=user, liked=True, review_id__in=ids).annotate(
+        flag=Value('user_liked', output_field=CharField())
+    )
+    reported = AdminReport.objects.filter(user=user, review_id__in=ids).annotate(
+        flag=Value('reported', output_field=CharField())
+    )
+    flags = set(liked.values_list('review_id', 'flag').union(reported.values_list('review_id', 'flag')))
+    for review in reviews:
+        review['user_liked'] = (review['id'], 'user_liked') in flags
+        review['reported'] = (review['id'], 'reported') in flags
+    return reviews
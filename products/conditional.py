@@ -0,0 +1,63 @@
+"""
+Conditional GET (ETag / Last-Modified) for the cached read endpoints.
+
+The ETag of a response is derived from its cache key (products/cache.py),
+which embeds the versions of the products / reviews it was built from, plus
+the requesting user for per-user payloads. So `If-None-Match` is answered with
+a 304 before reading the cache entry, the database or serializing anything.
+Last-Modified is the `updated_at` of the resource (stored with the cache
+entry). ETags are weak: `views_count` is not part of them, since every view
+changes it. Flushing counted views bumps no version (the flushed counts are
+laid over cached reviews, see `cache.with_view_counts`), so views alone never
+turn a 304 into a 200.
+
+Versions live in the cache, so the cache must be shared by every process
+that writes reviews: with a process-local backend (LocMemCache) a change made
+by another worker or a management command never reaches this process's
+versions, and it keeps answering 304 for the old ETag. `manage.py check`
+(and so `runserver` / `migrate`) warns about it (products.W001). With
+DummyCache the ETag changes on every request (never a wrong 304, just no 304
+from If-None-Match).
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(key, user=None):
+    """Weak ETag of the cache entry `key`, for `user` when the payload depends on who asks."""
+    user_part = f':u{user.pk}' if user is not None and user.is_authenticated else ''
+    return 'W/"{}"'.format(hashlib.md5(f'{key}{user_part}'.encode()).hexdigest())
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def precondition_response(request, etag):
+    """The 304 (or 412) for `etag` if the request has If-None-Match / If-Match, else None."""
+    if 'HTTP_IF_NONE_MATCH' not in request.META and 'HTTP_IF_MATCH' not in request.META:
+        return None
+    response = get_conditional_response(request, etag=etag)
+    return _with_validators(response, etag) if response is not None else None
+
+
+def conditional_response(request, response, etag, last_modified=None):
+    """`response` with its validators, or a 304 if the request's validators still match."""
+    not_modified = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+    if response.status_code == 200:
+        return _with_validators(response, etag, last_modified)
+    return response
+
+
+def _with_validators(response, etag, last_modified=None):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(_timestamp(last_modified))
+    # الاستجابة تختلف حسب المستخدم (user_liked / reported)
+    patch_vary_headers(response, ('Authorization',))
+    return response
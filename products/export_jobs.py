@@ -0,0 +1,257 @@
+"""
+Background export jobs.
+
+`POST /api/exports/` stores an `ExportJob` and, once the transaction commits,
+hands it to a local thread pool (no broker needed). The worker writes the
+file under `EXPORT_JOBS_DIR`, reporting progress on the job row as it goes,
+and the finished file is streamed back by `/api/exports/<id>/download/`.
+Finished jobs and their files are removed after `EXPORT_JOBS_TTL`.
+
+The queue lives in the process, so a restart loses it. The first job
+submitted by a process requeues the pending jobs left in the database and
+fails the running ones that stopped reporting progress (`updated_at` older
+than `EXPORT_JOBS_STALE_AFTER`); `cleanup_export_jobs` fails those too.
+Stale jobs never count against `EXPORT_JOBS_MAX_PER_USER`, which is checked
+with the user's row locked, so concurrent requests cannot both pass it. A job
+deleted, or failed as abandoned, while its worker is still writing keeps that
+state, and the worker removes the file it wrote.
+
+Settings:
+    EXPORT_JOBS_DIR             where the files are written (default: <tmp>/product_review_exports)
+    EXPORT_JOBS_MAX_WORKERS     jobs generated at the same time (default 2)
+    EXPORT_JOBS_MAX_PER_USER    pending/running jobs allowed per user (default 2)
+    EXPORT_JOBS_TTL             seconds a job and its file are kept (default 24h)
+    EXPORT_JOBS_STALE_AFTER     seconds without progress after which a pending/running job
+                                is considered abandoned (default 10 minutes)
+"""
+import csv
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .exports import (
+    PRODUCT_ANALYTICS_HEADER,
+    PRODUCT_RATINGS_HEADER,
+    XLSX_CONTENT_TYPE,
+    product_analytics_rows,
+    product_rating_rows,
+    write_xlsx,
+)
+from .models import ExportJob, Product
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 500  # تحديث التقدم في قاعدة البيانات كل N صف
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def export_dir():
+    return _setting('EXPORT_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'product_review_exports'))
+
+
+def max_jobs_per_user():
+    return _setting('EXPORT_JOBS_MAX_PER_USER', 2)
+
+
+def job_ttl():
+    return timedelta(seconds=_setting('EXPORT_JOBS_TTL', 24 * 60 * 60))
+
+
+def stale_after():
+    return timedelta(seconds=_setting('EXPORT_JOBS_STALE_AFTER', 10 * 60))
+
+
+# =============================
+#  Export formats
+# =============================
+def _write_products_csv(fileobj, rows):
+    writer = csv.writer(fileobj)
+    writer.writerow(PRODUCT_RATINGS_HEADER)
+    writer.writerows(rows)
+
+
+def _write_products_xlsx(fileobj, rows):
+    write_xlsx(fileobj, 'Products Analytics', PRODUCT_ANALYTICS_HEADER, rows)
+
+
+# kind -> (download filename, content type, rows(products), writer(fileobj, rows), open mode)
+EXPORT_FORMATS = {
+    'products_csv': ('all_reviews_analytics.csv', 'text/csv', product_rating_rows, _write_products_csv, 'w'),
+    'products_xlsx': ('products_analytics.xlsx', XLSX_CONTENT_TYPE, product_analytics_rows, _write_products_xlsx, 'wb'),
+}
+
+
+def download_name(job):
+    return EXPORT_FORMATS[job.kind][0]
+
+
+def content_type(job):
+    return EXPORT_FORMATS[job.kind][1]
+
+
+# =============================
+#  Running jobs
+# =============================
+def _with_progress(job_id, rows):
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % PROGRESS_EVERY == 0:
+            # updated_at نبض العامل: مهمة بلا تقدم لفترة طويلة تعتبر متروكة
+            ExportJob.objects.filter(pk=job_id).update(progress=count, updated_at=timezone.now())
+    ExportJob.objects.filter(pk=job_id).update(progress=count, updated_at=timezone.now())
+
+
+def run_export_job(job_id):
+    """
+    Generate the file of a pending job. Safe to call more than once: only the
+    call that moves the job from pending to running does the work.
+    """
+    now = timezone.now()
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=now, updated_at=now
+    )
+    if not claimed:
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    _, _, rows, write, mode = EXPORT_FORMATS[job.kind]
+    products = Product.objects.all()
+
+    os.makedirs(export_dir(), exist_ok=True)
+    extension = os.path.splitext(download_name(job))[1]
+    path = os.path.join(export_dir(), f'export_{job.pk}{extension}')
+    partial = path + '.part'
+    # الحالة النهائية فقط إذا بقيت المهمة جارية: ربما حُذفت أو اعتُبرت متروكة (recover_export_jobs) أثناء العمل
+    running = ExportJob.objects.filter(pk=job.pk, status='running')
+    try:
+        ExportJob.objects.filter(pk=job.pk).update(total=products.count())
+        open_kwargs = {'newline': '', 'encoding': 'utf-8'} if mode == 'w' else {}
+        with open(partial, mode, **open_kwargs) as fileobj:
+            write(fileobj, _with_progress(job.pk, rows(products)))
+        os.replace(partial, path)
+    except Exception as exc:
+        logger.exception("Export job %s failed", job.pk)
+        if os.path.exists(partial):
+            os.remove(partial)
+        now = timezone.now()
+        running.update(status='failed', error=str(exc), finished_at=now, updated_at=now)
+        return
+    now = timezone.now()
+    if not running.update(status='done', file_path=path, finished_at=now, updated_at=now):
+        # لا أحد سيحمّل الملف أو يحذفه
+        os.remove(path)
+
+
+class ExportWorker:
+    """Thread pool generating export files; at most EXPORT_JOBS_MAX_WORKERS at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, job_id):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=_setting('EXPORT_JOBS_MAX_WORKERS', 2), thread_name_prefix='export-job'
+                )
+                # أول مهمة في هذه العملية: ما تركته العملية السابقة في الطابور
+                self._requeue_abandoned(exclude=job_id)
+            return self._executor.submit(self._run, job_id)
+
+    def _requeue_abandoned(self, exclude):
+        try:
+            pending_ids, _ = recover_export_jobs()
+        except Exception:
+            logger.exception("Could not recover abandoned export jobs")
+            return
+        for pending_id in pending_ids:
+            if pending_id != exclude:
+                self._executor.submit(self._run, pending_id)
+
+    def _run(self, job_id):
+        close_old_connections()
+        try:
+            run_export_job(job_id)
+        finally:
+            close_old_connections()
+
+
+export_worker = ExportWorker()
+
+
+def create_export_job(user, kind):
+    """
+    Store a new job and queue it once the surrounding transaction commits.
+    Returns None, storing nothing, when `user` already has
+    EXPORT_JOBS_MAX_PER_USER active jobs.
+    """
+    cleanup_export_jobs()
+    with transaction.atomic():
+        # قفل صف المستخدم حتى الإضافة: طلبان متزامنان لا يتجاوزان الحد معًا
+        User.objects.select_for_update().filter(pk=user.pk).first()
+        if active_jobs_count(user) >= max_jobs_per_user():
+            return None
+        job = ExportJob.objects.create(user=user, kind=kind)
+    transaction.on_commit(lambda: export_worker.submit(job.pk))
+    return job
+
+
+def active_jobs_count(user):
+    """Pending/running jobs of `user`, leaving out the abandoned ones (see `recover_export_jobs`)."""
+    cutoff = timezone.now() - stale_after()
+    return ExportJob.objects.filter(user=user, status__in=ACTIVE_STATUSES, updated_at__gte=cutoff).count()
+
+
+def recover_export_jobs():
+    """
+    Jobs left behind by a stopped process: running jobs without progress for
+    EXPORT_JOBS_STALE_AFTER are marked failed. Returns (ids of the pending
+    jobs, to queue again, number of jobs failed). Queuing a job twice is
+    harmless: `run_export_job` claims it once.
+    """
+    now = timezone.now()
+    failed = ExportJob.objects.filter(status='running', updated_at__lt=now - stale_after()).update(
+        status='failed', error='Interrupted: the export worker stopped.', finished_at=now, updated_at=now
+    )
+    pending_ids = list(ExportJob.objects.filter(status='pending').order_by('created_at', 'id').values_list('pk', flat=True))
+    return pending_ids, failed
+
+
+# =============================
+#  Cleanup
+# =============================
+def delete_export_file(job):
+    if job.file_path and os.path.exists(job.file_path):
+        os.remove(job.file_path)
+
+
+def cleanup_export_jobs(ttl=None):
+    """
+    Delete jobs (and their files) created more than `ttl` ago, including jobs
+    left pending/running by a worker that died, and fail the running jobs
+    that stopped reporting progress. Returns the number of jobs deleted.
+    """
+    recover_export_jobs()
+    cutoff = timezone.now() - (ttl if ttl is not None else job_ttl())
+    expired = list(ExportJob.objects.filter(created_at__lt=cutoff))
+    for job in expired:
+        try:
+            delete_export_file(job)
+        except OSError:
+            logger.exception("Could not delete the file of export job %s", job.pk)
+    ExportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
@@ -0,0 +1,110 @@
+"""
+Streaming exports.
+
+Rows are produced by a generator over `.iterator(chunk_size=...)` and written
+to the response one line at a time, so memory use does not grow with the
+number of rows and the first bytes reach the client immediately. Excel files
+are written by a write-only workbook (rows go straight to disk) into a
+temporary file that is then streamed back.
+
+EXPORT_CHUNK_SIZE: rows fetched from the database per round trip (default 2000).
+"""
+import csv
+import tempfile
+
+from django.conf import settings
+from django.db.models import Avg, Count
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+DEFAULT_CHUNK_SIZE = 2000
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def export_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Encoded CSV lines: the header, then one line per row."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def streaming_csv_response(filename, header, rows):
+    response = StreamingHttpResponse(iter_csv(header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_xlsx(fileobj, title, header, rows):
+    """Write one sheet to `fileobj` with a write-only workbook (constant memory)."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fileobj)
+
+
+def xlsx_file_response(filename, title, header, rows):
+    output = tempfile.TemporaryFile()
+    try:
+        write_xlsx(output, title, header, rows)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    # FileResponse يرسل الملف على دفعات ثم يغلقه (ويُحذف الملف المؤقت تلقائيًا)
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def product_rating_rows(products):
+    """(id, name, average rating, total reviews) per product, from one GROUP BY query."""
+    rows = (
+        products.annotate(total_reviews=Count('reviews'), avg_rating=Avg('reviews__rating'))
+        .order_by('id')
+        .values_list('id', 'name', 'avg_rating', 'total_reviews')
+    )
+    for product_id, name, avg_rating, total_reviews in rows.iterator(chunk_size=export_chunk_size()):
+        yield product_id, name, round(avg_rating, 1) if avg_rating else 0, total_reviews
+
+
+PRODUCT_RATINGS_HEADER = ['Product ID', 'Product Name', 'Average Rating', 'Total Reviews']
+PRODUCT_ANALYTICS_HEADER = [
+    'Product ID', 'Product Name', 'Average Rating', 'Total Reviews',
+    'Most Common Words', 'Low Rating Reviews', 'Pending Reviews Count'
+]
+
+
+def product_analytics_rows(products):
+    """Rows of the products analytics workbook (see analytics.iter_products_analytics)."""
+    from .analytics import get_pending_reviews_count, iter_products_analytics
+
+    # عدد المراجعات غير الموافق عليها إجمالي، يُحسب مرة واحدة لكل الملف
+    pending_reviews_count = get_pending_reviews_count()['pending_reviews']
+    for product, data in iter_products_analytics(products, words_limit=5, low_rating_limit=5):
+        yield [
+            product.id,
+            product.name,
+            data['rating_trend']['average_rating'],
+            data['rating_trend']['total_reviews'],
+            ', '.join([f"{word}({count})" for word, count in data['most_common_words']]),
+            '; '.join([f"{review['review_text']}({review['rating']})" for review in data['low_rating_reviews']]),
+            pending_reviews_count,
+        ]
+
+
+def review_rows(reviews):
+    """(id, username, rating, text) per review, without loading model instances."""
+    rows = reviews.values_list('id', 'user__username', 'rating', 'review_text')
+    return rows.iterator(chunk_size=export_chunk_size())
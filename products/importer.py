@@ -0,0 +1,273 @@
+"""
+Bulk review import: `python manage.py import_reviews` (CSV or JSON Lines
+files) and `POST /api/reviews/import/` (a JSON list, staff only).
+
+Records are processed in batches of `batch_size`. For each batch:
+
+1. every record is validated; the products and authors of the whole batch
+   are looked up with one query each;
+2. the banned-word check runs over the batch with one shared matcher;
+3. the valid reviews are inserted with one `executemany` (`insert_reviews`),
+   and the product aggregates, the daily rollup and the word counts are
+   updated once for the batch (no signals are sent; see aggregates.py);
+4. the checkpoint (`ReviewImport.position`) is saved,
+
+all in one transaction, so an interrupted import resumes right after the
+last committed batch (`import_reviews --resume`). The batch is added to the
+search index in one statement (`search.bulk_indexing`), and the cached
+responses of the touched products are invalidated.
+
+Record fields:
+    product       product id (required)
+    rating        1 to 5 (required)
+    review_text   (required)
+    user          username of the author (default: the importing user)
+    is_visible    true / false (default false: waiting for approval, like reviews posted to the API)
+
+Settings:
+    REVIEW_IMPORT_BATCH_SIZE    records per batch / transaction (default 10000)
+    REVIEW_IMPORT_MAX_RECORDS   records accepted by one API request (default 10000)
+"""
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .aggregates import apply_daily_stats_changes, apply_review_changes, apply_term_changes
+from .cache import review_cache
+from .models import Product, Review
+from .moderation import get_matcher
+from .search import bulk_indexing
+
+FORMATS = ('csv', 'jsonl')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 't')
+FALSE_VALUES = ('', '0', 'false', 'no', 'n', 'f')
+MAX_REPORTED_ERRORS = 100  # الأخطاء المحفوظة بالتفصيل؛ العدد الكلي يُحسب دائمًا
+_INVALID = '__invalid__'
+
+
+def default_batch_size():
+    return getattr(settings, 'REVIEW_IMPORT_BATCH_SIZE', 10_000)
+
+
+def max_api_records():
+    return getattr(settings, 'REVIEW_IMPORT_MAX_RECORDS', 10_000)
+
+
+# =============================
+#  Reading
+# =============================
+def read_records(stream, fmt):
+    """
+    Records (dicts) of a CSV file with a header row, or of a JSON Lines file
+    (blank lines skipped). Unparsable lines are yielded as invalid records,
+    so they are reported without stopping the import.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            record = {_INVALID: f'Invalid JSON: {exc}'}
+        yield as_record(record)
+
+
+def as_record(value):
+    """`value` if it is a record (dict), else an invalid record reported as such."""
+    return value if isinstance(value, dict) else {_INVALID: 'Expected a JSON object.'}
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _boolean(value):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    return None
+
+
+def parse_record(record):
+    """(values, errors) of one record: the Review field values, or the errors by field."""
+    if _INVALID in record:
+        return None, {'non_field_errors': [record[_INVALID]]}
+    errors = {}
+    product_id = _integer(record.get('product'))
+    if product_id is None:
+        errors['product'] = ['A valid product id is required.']
+    rating = _integer(record.get('rating'))
+    if rating is None or not 1 <= rating <= 5:
+        errors['rating'] = ['Rating must be between 1 and 5.']
+    review_text = record.get('review_text')
+    if not isinstance(review_text, str) or not review_text.strip():
+        errors['review_text'] = ['This field may not be blank.']
+    is_visible = _boolean(record.get('is_visible'))
+    if is_visible is None:
+        errors['is_visible'] = ['Must be a valid boolean.']
+    username = record.get('user') or None
+    if errors:
+        return None, errors
+    return {
+        'product_id': product_id, 'username': username, 'rating': rating,
+        'review_text': review_text, 'is_visible': is_visible,
+    }, None
+
+
+# =============================
+#  Importing
+# =============================
+class ReviewImporter:
+    """
+    Imports review records in batches (see the module docstring). With a
+    `checkpoint` (ReviewImport), records before its position are skipped and
+    the position is saved with every batch.
+    """
+
+    def __init__(self, default_user=None, batch_size=None, checkpoint=None, max_errors=MAX_REPORTED_ERRORS):
+        self.default_user = default_user
+        self.batch_size = batch_size or default_batch_size()
+        self.checkpoint = checkpoint
+        self.max_errors = max_errors
+        self.matcher = get_matcher()
+        self.position = checkpoint.position if checkpoint else 0
+        self.created = checkpoint.created_count if checkpoint else 0
+        self.error_count = checkpoint.error_count if checkpoint else 0
+        self.errors = []  # [{'index': رقم السجل من 0, 'errors': {...}}]
+
+    def run(self, records, progress=None):
+        """Import `records`, calling `progress(importer)` after every committed batch."""
+        records = islice(iter(records), self.position, None)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+            if progress is not None:
+                progress(self)
+        return self
+
+    def import_batch(self, records):
+        """Import one batch in one transaction. Returns the number of reviews created."""
+        rows, errors = self._build(records)
+        now = timezone.now()
+        with transaction.atomic():
+            with bulk_indexing():
+                insert_reviews(rows, now)
+            changes = [(None, {**row, 'created_at': now}) for row in rows]
+            apply_review_changes(changes)
+            apply_daily_stats_changes(changes)
+            apply_term_changes(changes)
+            review_cache.invalidate('product', *{row['product_id'] for row in rows})
+            if self.checkpoint is not None:
+                self.checkpoint.position = self.position + len(records)
+                self.checkpoint.created_count = self.created + len(rows)
+                self.checkpoint.error_count = self.error_count + len(errors)
+                self.checkpoint.save(update_fields=['position', 'created_count', 'error_count', 'updated_at'])
+        self.position += len(records)
+        self.created += len(rows)
+        self.error_count += len(errors)
+        self.errors.extend(errors[:max(self.max_errors - len(self.errors), 0)])
+        return len(rows)
+
+    def _build(self, records):
+        """Field values (by attname) of the valid records of a batch, and the errors of the others."""
+        parsed, errors = [], []
+        for index, record in enumerate(records, self.position):
+            values, record_errors = parse_record(record)
+            if record_errors:
+                errors.append({'index': index, 'errors': record_errors})
+            else:
+                parsed.append((index, values))
+
+        # المنتجات والمستخدمون للدفعة كاملة باستعلام واحد لكل منهما
+        product_ids = set(
+            Product.objects.filter(pk__in={values['product_id'] for _, values in parsed}).values_list('pk', flat=True)
+        )
+        user_ids = dict(
+            User.objects.filter(username__in={values['username'] for _, values in parsed if values['username']})
+            .values_list('username', 'pk')
+        )
+        default_user_id = self.default_user.pk if self.default_user is not None else None
+
+        rows = []
+        for index, values in parsed:
+            record_errors = {}
+            if values['product_id'] not in product_ids:
+                record_errors['product'] = [f"Product {values['product_id']} does not exist."]
+            username = values.pop('username')
+            values['user_id'] = user_ids.get(username) if username else default_user_id
+            if values['user_id'] is None:
+                record_errors['user'] = [f"User {username!r} does not exist." if username else 'This field is required.']
+            if record_errors:
+                errors.append({'index': index, 'errors': record_errors})
+                continue
+            # فحص الكلمات المحظورة بنفس المطابق المترجم لكل الدفعة
+            values['flagged_terms'] = self.matcher.find_all(values['review_text'])
+            values['is_offensive'] = bool(values['flagged_terms'])
+            rows.append(values)
+        errors.sort(key=lambda error: error['index'])
+        return rows, errors
+
+
+def insert_reviews(rows, now):
+    """
+    Insert reviews given as field values (by attname) with one INSERT run by
+    executemany, every other column taking its default and both dates `now`.
+
+    Same rows as `Review.objects.bulk_create`, measured by
+    benchmarks/bench_import_reviews.py at about 16k against 4.6k reviews/s
+    for a 10,000 row batch under bulk_indexing(): bulk_create prepares every
+    value of every row through its field in Python and, on SQLite, splits the
+    batch into INSERTs of 999 parameters; here only `flagged_terms` is
+    prepared per row and the constant columns once per batch. Sends no
+    signals, like bulk_create.
+
+    Only `created_at` / `updated_at` get a value of their own (`now`), every
+    other missing column its default: a new Review field needing its own
+    pre_save has to be handled here (ReviewImportTests pins the field list).
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(Review)]
+    fields = [field for field in Review._meta.concrete_fields if not field.primary_key]
+    constants = {
+        field.attname: field.get_db_prep_save(
+            now if field.attname in ('created_at', 'updated_at') else field.get_default(), connection
+        )
+        for field in fields if field.attname not in rows[0]
+    }
+    terms_field = Review._meta.get_field('flagged_terms')
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    params = []
+    for row in rows:
+        values = {**constants, **row, 'flagged_terms': terms_field.get_db_prep_save(row['flagged_terms'], connection)}
+        params.append([values[field.attname] for field in fields])
+    with connection.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {quote(Review._meta.db_table)} ({columns}) VALUES ({placeholders})", params)
+
+
+def finish_import(checkpoint, error=''):
+    checkpoint.status = 'failed' if error else 'done'
+    checkpoint.error = error
+    checkpoint.finished_at = timezone.now()
+    checkpoint.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from products.export_jobs import cleanup_export_jobs
+
+
+class Command(BaseCommand):
+    help = "Delete export jobs (and their files) older than EXPORT_JOBS_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, dest='seconds',
+            help="Override EXPORT_JOBS_TTL (seconds).",
+        )
+
+    def handle(self, *args, **options):
+        ttl = timedelta(seconds=options['seconds']) if options['seconds'] is not None else None
+        deleted = cleanup_export_jobs(ttl)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired export job(s)."))
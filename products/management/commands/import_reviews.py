@@ -0,0 +1,86 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import FORMATS, ReviewImporter, finish_import, read_records
+from products.models import ReviewImport
+
+SHOWN_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Import reviews from a CSV (with a header row) or JSON Lines file, in batches. "
+        "Progress is checkpointed with every batch; --resume continues an interrupted import of the same file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File with one review per row / line.")
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, help="Records per batch / transaction (default: REVIEW_IMPORT_BATCH_SIZE).")
+        parser.add_argument('--user', help="Username of the author of records without a `user` field.")
+        parser.add_argument(
+            '--resume', action='store_true',
+            help="Continue the last unfinished import of this file instead of starting over.",
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        fmt = options['format'] or self._format(path)
+        default_user = None
+        if options['user']:
+            default_user = User.objects.filter(username=options['user']).first()
+            if default_user is None:
+                raise CommandError(f"User {options['user']!r} does not exist.")
+
+        checkpoint = None
+        if options['resume']:
+            checkpoint = (
+                ReviewImport.objects.filter(source=path).exclude(status='done').order_by('-created_at', '-id').first()
+            )
+            if checkpoint is None:
+                raise CommandError(f"No unfinished import of {path} to resume.")
+            checkpoint.status = 'running'
+            checkpoint.save(update_fields=['status', 'updated_at'])
+            self.stdout.write(f"Resuming after record {checkpoint.position}.")
+        else:
+            checkpoint = ReviewImport.objects.create(source=path)
+
+        importer = ReviewImporter(default_user=default_user, batch_size=options['batch_size'], checkpoint=checkpoint)
+        started, first_position = time.perf_counter(), importer.position
+
+        def progress(importer):
+            rate = (importer.position - first_position) / max(time.perf_counter() - started, 1e-9)
+            self.stdout.write(
+                f"  {importer.position} record(s): {importer.created} imported, "
+                f"{importer.error_count} rejected ({rate:,.0f} records/s)"
+            )
+
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                importer.run(read_records(stream, fmt), progress=progress)
+        except BaseException as exc:
+            # ما التُزم من دفعات محفوظ؛ --resume يكمل من آخر دفعة
+            finish_import(checkpoint, error=repr(exc))
+            raise
+        finish_import(checkpoint)
+
+        for error in importer.errors[:SHOWN_ERRORS]:
+            self.stderr.write(f"Record {error['index']}: {error['errors']}")
+        if importer.error_count > SHOWN_ERRORS:
+            self.stderr.write(f"... and {importer.error_count - SHOWN_ERRORS} more rejected record(s).")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.created} review(s) from {importer.position} record(s), "
+            f"{importer.error_count} rejected (import {checkpoint.pk})."
+        ))
+
+    @staticmethod
+    def _format(path):
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        if extension in ('jsonl', 'ndjson'):
+            return 'jsonl'
+        if extension == 'csv':
+            return 'csv'
+        raise CommandError("Cannot tell the format from the file name; pass --format csv or --format jsonl.")
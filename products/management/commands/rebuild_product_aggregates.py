@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.aggregates import (
+    rebuild_daily_stats,
+    rebuild_product_aggregates,
+    rebuild_review_counters,
+    rebuild_term_counts,
+)
+from products.cache import review_cache
+from products.models import Review
+from products.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the stored rating aggregates of products from their visible reviews, "
+        "the interaction counters of their reviews, their daily review rollup and their word counts. "
+        "Without --product the review search index is rebuilt too."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product', type=int, action='append', dest='product_ids',
+            help="Only rebuild the given product id (can be repeated).",
+        )
+
+    def handle(self, *args, **options):
+        product_ids = options['product_ids']
+        review_ids = None
+        if product_ids is not None:
+            review_ids = Review.objects.filter(product_id__in=product_ids).values('pk')
+
+        with transaction.atomic():
+            products = rebuild_product_aggregates(product_ids)
+            reviews = rebuild_review_counters(review_ids)
+            days = rebuild_daily_stats(product_ids)
+            terms = rebuild_term_counts(product_ids)
+            # الفهرس النصي يُبنى كاملًا فقط (لا يمكن إعادة بناء جزء منه)
+            search = product_ids is None and rebuild_search_index()
+        # القيم المخزنة تغيرت دون إشارات: كل الردود المخزنة في الكاش لم تعد صالحة
+        review_cache.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating aggregates for {products} product(s), counters for {reviews} review(s), "
+            f"{days} daily rollup row(s) and {terms} word count row(s)"
+            + (" and the review search index." if search else ".")
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Review
+from products.moderation import get_matcher
+
+
+class Command(BaseCommand):
+    help = "Re-run the banned-word check over every review (after the banned list changed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        matcher = get_matcher()
+        reviews = Review.objects.only('id', 'review_text', 'is_offensive', 'flagged_terms').order_by('pk')
+
+        checked = changed = 0
+        batch = []
+        for review in reviews.iterator(chunk_size=batch_size):
+            checked += 1
+            if review.apply_moderation(matcher):
+                batch.append(review)
+            if len(batch) >= batch_size:
+                changed += self._save(batch)
+                batch = []
+        changed += self._save(batch)
+
+        offensive = Review.objects.filter(is_offensive=True).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} review(s): {changed} updated, {offensive} flagged as offensive."
+        ))
+
+    def _save(self, batch):
+        if batch:
+            with transaction.atomic():
+                Review.objects.bulk_update(batch, ['is_offensive', 'flagged_terms'])
+        return len(batch)
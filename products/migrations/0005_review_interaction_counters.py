@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-18 10:09
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_interaction_counters(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    ReviewInteraction = apps.get_model('products', 'ReviewInteraction')
+
+    def interactions(**filters):
+        rows = (
+            ReviewInteraction.objects.filter(review=OuterRef('pk'), **filters)
+            .order_by().values('review').annotate(value=Count('id')).values('value')
+        )
+        return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+    Review.objects.update(
+        likes_count=interactions(liked=True),
+        helpful_count=interactions(is_helpful=True),
+        interactions_count=interactions(liked=True) + interactions(is_helpful=True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_review_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='helpful_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='interactions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_interaction_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-likes_count', '-id'], name='review_visible_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-helpful_count', '-id'], name='review_visible_helpful_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-interactions_count', '-id'], name='review_visible_interact_idx'),
+        ),
+    ]
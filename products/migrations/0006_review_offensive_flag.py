@@ -0,0 +1,69 @@
+# Generated by Django 4.2.23 on 2026-10-18 10:17
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# نسخة مجمدة من products.moderation و models.BAD_WORDS: الترحيل لا يتبع تغييرات كود التطبيق
+BAD_WORDS = ["badword1", "badword2", "offensive"]
+ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06dc\u06df-\u06e8\u06ea-\u06ed\u0640]')
+ALEF_VARIANTS = ('\u0623', '\u0625', '\u0622', '\u0671')
+
+
+def normalize_text(text):
+    folded = text.casefold()
+    if folded.isascii():
+        return folded
+    folded = ARABIC_MARKS.sub('', folded)
+    for alef in ALEF_VARIANTS:
+        folded = folded.replace(alef, '\u0627')
+    return folded
+
+
+def banned_words_regex():
+    words = getattr(settings, 'BANNED_WORDS', BAD_WORDS)
+    # الأطول أولًا: أطول كلمة تفوز عند نفس الموضع، كما في تعبير الشجرة في moderation
+    terms = sorted({normalize_text(w).strip() for w in words if w and w.strip()}, key=len, reverse=True)
+    if not terms:
+        return None
+    pattern = '|'.join(re.escape(term) for term in terms)
+    if getattr(settings, 'BANNED_WORDS_WHOLE_WORD', False):
+        pattern = rf'(?<!\w)(?:{pattern})(?!\w)'
+    return re.compile(pattern)
+
+
+def flag_existing_reviews(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    regex = banned_words_regex()
+    if regex is None:
+        return
+    batch = []
+    for review in Review.objects.only('id', 'review_text').iterator(chunk_size=2000):
+        terms = sorted(set(regex.findall(normalize_text(review.review_text)))) if review.review_text else []
+        if terms:
+            review.flagged_terms = terms
+            review.is_offensive = True
+            batch.append(review)
+    Review.objects.bulk_update(batch, ['is_offensive', 'flagged_terms'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_review_interaction_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='flagged_terms',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='is_offensive',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(flag_existing_reviews, migrations.RunPython.noop),
+    ]
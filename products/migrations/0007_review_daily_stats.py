@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-18 10:23
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+import django.db.models.deletion
+
+
+def backfill_daily_stats(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    ReviewDailyStats = apps.get_model('products', 'ReviewDailyStats')
+
+    visible = Q(is_visible=True)
+    counts = {f'rating_{rating}_count': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)}
+    rows = (
+        Review.objects.annotate(day=TruncDate('created_at'))
+        .values('product_id', 'day')
+        .annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            visible_count=Count('id', filter=visible),
+            visible_rating_sum=Coalesce(Sum('rating', filter=visible), Value(0)),
+            **counts
+        )
+        .order_by()
+    )
+    ReviewDailyStats.objects.bulk_create(
+        (ReviewDailyStats(**row) for row in rows.iterator()), batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_review_offensive_flag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1_count', models.PositiveIntegerField(default=0)),
+                ('rating_2_count', models.PositiveIntegerField(default=0)),
+                ('rating_3_count', models.PositiveIntegerField(default=0)),
+                ('rating_4_count', models.PositiveIntegerField(default=0)),
+                ('rating_5_count', models.PositiveIntegerField(default=0)),
+                ('visible_count', models.PositiveIntegerField(default=0)),
+                ('visible_rating_sum', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='daily_stats_day_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:12
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# نسخة مجمدة من products.wordfreq.tokenize (بلا كلمات مستبعدة ولا توحيد عربي)
+WORD_PATTERN = re.compile(r'\b\w{4,}\b')
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def backfill_term_counts(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    ReviewTermCount = apps.get_model('products', 'ReviewTermCount')
+
+    def product_rows(product_id, counts, visible_counts):
+        return [
+            ReviewTermCount(product_id=product_id, term=term, count=count, visible_count=visible_counts[term])
+            for term, count in counts.items()
+        ]
+
+    rows = Review.objects.order_by('product_id').values_list('product_id', 'review_text', 'is_visible')
+    current, counts, visible_counts = None, Counter(), Counter()
+    for product_id, review_text, is_visible in rows.iterator(chunk_size=2000):
+        if product_id != current:
+            ReviewTermCount.objects.bulk_create(product_rows(current, counts, visible_counts), batch_size=2000)
+            current, counts, visible_counts = product_id, Counter(), Counter()
+        terms = Counter(term for term in tokenize(review_text or '') if len(term) <= 100)
+        counts.update(terms)
+        if is_visible:
+            visible_counts.update(terms)
+    ReviewTermCount.objects.bulk_create(product_rows(current, counts, visible_counts), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewTermCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('visible_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_counts', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-count', 'term'], name='term_count_top_idx')],
+                'unique_together': {('product', 'term')},
+            },
+        ),
+        migrations.RunPython(backfill_term_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:40
+
+from django.db import OperationalError, migrations
+
+# نسخة مجمدة من products.search (install_review_fts / uninstall_review_fts)
+FTS_TABLE = 'products_review_fts'
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF review_text ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "review_text, content='products_review', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite بلا FTS5: البحث يستخدم LIKE
+            return
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_review_term_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
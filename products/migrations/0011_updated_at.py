@@ -0,0 +1,67 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+# نسخة مجمدة من محفزات products.search (repair_review_fts)
+FTS_TABLE = 'products_review_fts'
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF review_text ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+}
+
+
+def backfill_updated_at(apps, schema_editor):
+    # لم يتغير شيء منذ الإنشاء على حد علمنا
+    for model_name in ('Product', 'Review'):
+        apps.get_model('products', model_name).objects.update(updated_at=models.F('created_at'))
+
+
+def repair_search_index(apps, schema_editor):
+    # إضافة العمود تعيد بناء جدول المراجعات في SQLite فتُحذف محفزات الفهرس النصي
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if not cursor.fetchall():
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        missing = set(TRIGGERS) - {name for name, in cursor.fetchall()}
+        if not missing:
+            return
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_review_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(repair_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:03
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Sqrt
+from django.db.models.lookups import GreaterThan
+
+# نسخة مجمدة من محفزات products.search (repair_review_fts)
+FTS_TABLE = 'products_review_fts'
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF review_text ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+}
+
+
+def wilson_score_expression(positive, total, z=1.96):
+    # نسخة مجمدة من products.aggregates.wilson_score_expression
+    positive = Cast(positive, FloatField())
+    total = Cast(total, FloatField())
+    z2 = z * z
+    score = (
+        (positive + Value(z2 / 2) - Value(z) * Sqrt(positive * (total - positive) / total + Value(z2 / 4)))
+        / (total + Value(z2))
+    )
+    return Case(When(GreaterThan(total, 0), then=score), default=Value(0.0), output_field=FloatField())
+
+
+def backfill_rank_score(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    ReviewInteraction = apps.get_model('products', 'ReviewInteraction')
+    votes = (
+        ReviewInteraction.objects.filter(review=OuterRef('pk'))
+        .order_by().values('review').annotate(value=Count('id')).values('value')
+    )
+    Review.objects.update(votes_count=Coalesce(Subquery(votes, output_field=IntegerField()), Value(0)))
+    Review.objects.filter(votes_count__gt=0).update(
+        rank_score=wilson_score_expression(F('interactions_count'), F('votes_count') * 2)
+    )
+
+
+def repair_search_index(apps, schema_editor):
+    # إضافة الأعمدة تعيد بناء جدول المراجعات في SQLite فتُحذف محفزات الفهرس النصي
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if not cursor.fetchall():
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        missing = set(TRIGGERS) - {name for name, in cursor.fetchall()}
+        if not missing:
+            return
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='rank_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='votes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rank_score, migrations.RunPython.noop),
+        migrations.RunPython(repair_search_index, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-rank_score', '-id'], name='review_visible_rank_idx'),
+        ),
+    ]
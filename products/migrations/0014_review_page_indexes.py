@@ -0,0 +1,41 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_review_import'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_visible_likes_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_visible_helpful_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_visible_interact_idx',
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-rating', '-created_at', '-id'], name='review_visible_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-likes_count', '-created_at', '-id'], name='review_visible_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-helpful_count', '-created_at', '-id'], name='review_visible_helpful_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-interactions_count', '-created_at', '-id'], name='review_visible_interact_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_review_page_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
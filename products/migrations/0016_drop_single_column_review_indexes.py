@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_export_job_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_is_visible_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_rating_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_created_at_idx',
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='is_offensive',
+            field=models.BooleanField(default=False),
+        ),
+    ]
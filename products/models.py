@@ -1,21 +1,122 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
+from .moderation import get_matcher
+
 # ✅ قائمة الكلمات المحظورة
 BAD_WORDS = ["badword1", "badword2", "offensive"]
 
-class Product(models.Model):
+class StoredCountersModel(models.Model):
+    """
+    Base for models with counter columns that are only written by atomic
+    UPDATEs (`F()` increments in aggregates.py): saving an instance that is
+    already stored writes every other field but not `stored_fields`, so a
+    copy loaded before an increment cannot write the old count back.
+    """
+    stored_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            if not self._state.adding and self.pk is not None:
+                kwargs['update_fields'] = self.saved_fields()
+        super().save(*args, **kwargs)
+
+    def saved_fields(self):
+        """Fields written by a save of a stored instance (the loaded ones, without `stored_fields`)."""
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.stored_fields and field.attname not in deferred
+        ]
+
+
+class TrackedStateModel(StoredCountersModel):
+    """
+    Base for models whose writes feed stored counters (see aggregates.py):
+    runs the save and the signal handlers applying the difference in one
+    transaction, so the handlers can lock the stored row and read it
+    (aggregates.stored_state) before it is overwritten.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class Product(StoredCountersModel):
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # يتغير أيضًا مع الإحصائيات المخزنة (aggregates.py)؛ يُستخدم كـ Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    # ✅ إحصائيات التقييم المخزنة (للمراجعات الظاهرة فقط) - يتم تحديثها في signals.py
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    # لا يكتبها حفظ المنتج (تعديل PUT / PATCH)، بل UPDATE ذري فقط من إشارات المراجعات
+    stored_fields = ('rating_count', 'rating_sum') + tuple(f'rating_{rating}_count' for rating in range(1, 6))
+
+    @property
+    def average_rating(self):
+        """Average rating of visible reviews, read from the stored aggregates."""
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @property
+    def rating_distribution(self):
+        """Number of visible reviews per star."""
+        return {f'{rating}_stars': getattr(self, f'rating_{rating}_count') for rating in range(1, 6)}
+
+    def delete(self, *args, **kwargs):
+        # المراجعات تُحذف مع المنتج، وكذلك كل ما يُشتق منها: لا تحديث للإحصائيات لكل مراجعة
+        from .aggregates import deleting_product
+
+        with transaction.atomic(), deleting_product(self):
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
-class Review(models.Model):
+class ReviewQuerySet(models.QuerySet):
+    def for_listing(self, user=None):
+        """
+        Select the author and annotate the requesting user's liked/reported
+        flags (the interaction counts are columns) so ReviewSerializer
+        serializes a list of reviews in a constant number of queries.
+        """
+        queryset = self.select_related('user')
+        if user is not None and user.is_authenticated:
+            return queryset.annotate(
+                annotated_user_liked=models.Exists(
+                    ReviewInteraction.objects.filter(review=models.OuterRef('pk'), user=user, liked=True)
+                ),
+                annotated_reported=models.Exists(
+                    AdminReport.objects.filter(review=models.OuterRef('pk'), user=user)
+                ),
+            )
+        return queryset.annotate(
+            annotated_user_liked=models.Value(False),
+            annotated_reported=models.Value(False),
+        )
+
+
+class Review(TrackedStateModel):
     STAR_CHOICES = [
         (1, '⭐'),
         (2, '⭐⭐'),
@@ -29,20 +130,138 @@ class Review(models.Model):
     review_text = models.TextField()
     is_visible = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # يتغير أيضًا مع عدادات التفاعل والبلاغات (وليس مع views_count)؛ يُستخدم كـ Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
     views_count = models.PositiveIntegerField(default=0)  # Number of times this review has been viewed
 
+    # ✅ عدادات التفاعل المخزنة - يتم تحديثها ذريًا (F) عند كل تفاعل في signals.py
+    likes_count = models.PositiveIntegerField(default=0)
+    helpful_count = models.PositiveIntegerField(default=0)
+    interactions_count = models.PositiveIntegerField(default=0)  # likes_count + helpful_count
+    votes_count = models.PositiveIntegerField(default=0)  # عدد المستخدمين المتفاعلين
+    # ✅ الحد الأدنى لفاصل Wilson (aggregates.wilson_score)؛ ترتيب أفضل المراجعات
+    rank_score = models.FloatField(default=0)
+
+    # ✅ نتيجة فحص الكلمات المحظورة، تُحسب عند إنشاء/تعديل المراجعة (reflag_reviews لإعادة الفحص)
+    is_offensive = models.BooleanField(default=False)
+    flagged_terms = models.JSONField(default=list, blank=True)
+
+    objects = ReviewQuerySet.as_manager()
+
+    # لا يكتبها حفظ مراجعة موجودة، بل UPDATE ذري فقط (signals.py و view_counter.py)
+    stored_fields = ('views_count', 'likes_count', 'helpful_count', 'interactions_count', 'votes_count', 'rank_score')
+
+    class Meta:
+        indexes = [
+            # (product, is_visible) و (product, is_visible, created_at): قوائم المراجعات لكل منتج
+            models.Index(fields=['product', 'is_visible', 'created_at'], name='review_prod_vis_created_idx'),
+            # فهرس جزئي للمراجعات الظاهرة فقط (الصفحات بترتيب الأحدث)
+            models.Index(
+                fields=['product', '-created_at', '-id'], condition=models.Q(is_visible=True),
+                name='review_visible_recent_idx',
+            ),
+            # ترتيب حسب التقييم (الأعلى أو الأقل أولًا، بقراءة الفهرس بالعكس)
+            models.Index(
+                fields=['product', '-rating', '-created_at', '-id'], condition=models.Q(is_visible=True),
+                name='review_visible_rating_idx',
+            ),
+            # فهارس جزئية للترتيب حسب التفاعل داخل المراجعات الظاهرة لمنتج
+            models.Index(
+                fields=['product', '-likes_count', '-created_at', '-id'], condition=models.Q(is_visible=True),
+                name='review_visible_likes_idx',
+            ),
+            models.Index(
+                fields=['product', '-helpful_count', '-created_at', '-id'], condition=models.Q(is_visible=True),
+                name='review_visible_helpful_idx',
+            ),
+            models.Index(
+                fields=['product', '-interactions_count', '-created_at', '-id'], condition=models.Q(is_visible=True),
+                name='review_visible_interact_idx',
+            ),
+            # أفضل المراجعات الظاهرة لمنتج (ProductTopReviewView)
+            models.Index(
+                fields=['product', '-rank_score', '-id'], condition=models.Q(is_visible=True),
+                name='review_visible_rank_idx',
+            ),
+            # لا فهارس مفردة على is_visible / rating / created_at / is_offensive: قليلة الانتقائية،
+            # والفهارس أعلاه تغطي استعلاماتها (benchmarks/bench_indexes.py)
+        ]
 
     def contains_bad_words(self):
         """Check if review contains any bad words."""
-        text_lower = self.review_text.lower()
-        return any(bad_word in text_lower for bad_word in BAD_WORDS)
+        return get_matcher().search(self.review_text)
+
+    def apply_moderation(self, matcher=None):
+        """Store the banned words found in the text. Returns True if the flag or the terms changed."""
+        terms = (matcher or get_matcher()).find_all(self.review_text)
+        changed = terms != self.flagged_terms or bool(terms) != self.is_offensive
+        self.flagged_terms = terms
+        self.is_offensive = bool(terms)
+        return changed
 
     def __str__(self):
         return f"{self.product.name} - {self.rating} Stars by {self.user.username}"
 
 
+# ✅ ملخص يومي للمراجعات لكل منتج - يتم تحديثه في signals.py (rebuild_product_aggregates لإعادة البناء)
+class ReviewDailyStats(models.Model):
+    """
+    Reviews of a product created on one day (in the current time zone), so
+    time-windowed analytics read one row per day instead of every review.
+    """
+    product = models.ForeignKey(Product, related_name='daily_stats', on_delete=models.CASCADE)
+    day = models.DateField()
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    visible_count = models.PositiveIntegerField(default=0)
+    visible_rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'day')
+        indexes = [
+            models.Index(fields=['day'], name='daily_stats_day_idx'),
+        ]
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return 0
+        return round(self.rating_sum / self.review_count, 2)
+
+    def __str__(self):
+        return f"{self.product_id} - {self.day}: {self.review_count} reviews"
+
+
+# ✅ عدد مرات ظهور كل كلمة في مراجعات المنتج - يتم تحديثه في signals.py (rebuild_product_aggregates لإعادة البناء)
+class ReviewTermCount(models.Model):
+    """
+    Occurrences of a word (see wordfreq.tokenize) in the reviews of a product,
+    so the most common words are an indexed top-N query instead of a text scan.
+    """
+    MAX_TERM_LENGTH = 100  # الكلمات الأطول لا تُفهرس
+
+    product = models.ForeignKey(Product, related_name='term_counts', on_delete=models.CASCADE)
+    term = models.CharField(max_length=MAX_TERM_LENGTH)
+    count = models.PositiveIntegerField(default=0)
+    visible_count = models.PositiveIntegerField(default=0)  # في المراجعات الظاهرة فقط
+
+    class Meta:
+        unique_together = ('product', 'term')
+        indexes = [
+            models.Index(fields=['product', '-count', 'term'], name='term_count_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.term}: {self.count}"
+
+
 # ✅ الجدول الجديد (التفاعل على المراجعات): like/helpful
-class ReviewInteraction(models.Model):
+class ReviewInteraction(TrackedStateModel):
     review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name="interactions")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="review_interactions")
     is_helpful = models.BooleanField(default=False)  # True يعني "مفيد"
@@ -60,11 +279,22 @@ class Notification(models.Model):
     related_review = models.ForeignKey('Review', on_delete=models.CASCADE, null=True, blank=True, related_name="notifications")  # حقل اختياري
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_read'], name='notification_user_read_idx'),
+            # فهرس جزئي للإشعارات غير المقروءة فقط
+            models.Index(
+                fields=['user', '-created_at'], condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+        ]
     
     
 # ✅ الجدول الجديد (تقارير المشرف): مراجعات مرفوضة، تحتوي كلمات محظورة، تقييم منخفض
 class AdminReport(models.Model):
     review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name="reports")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="admin_reports")  # من قام بالإبلاغ
     status = models.CharField(max_length=20, choices=[
         ("pending", "Pending"),
         ("rejected", "Rejected")
@@ -73,3 +303,64 @@ class AdminReport(models.Model):
 
     def __str__(self):
         return f"Report for review {self.review.id} - Status: {self.status}"
+
+
+# ✅ الجدول الجديد (مهام التصدير): تُنفَّذ في الخلفية (export_jobs.py) ثم يُحمَّل الملف الناتج
+class ExportJob(models.Model):
+    KIND_CHOICES = [
+        ("products_csv", "Products ratings (CSV)"),
+        ("products_xlsx", "Products analytics (Excel)"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="export_jobs")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    progress = models.PositiveIntegerField(default=0)  # عدد الصفوف المكتوبة حتى الآن
+    total = models.PositiveIntegerField(null=True, blank=True)  # العدد المتوقع للصفوف
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # آخر تقدم سجله العامل؛ مهمة معلقة/جارية لم تتغير منذ EXPORT_JOBS_STALE_AFTER تعتبر متروكة
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status'], name='export_job_user_status_idx'),
+            models.Index(fields=['created_at'], name='export_job_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Export {self.id} ({self.kind}) - Status: {self.status}"
+
+
+# ✅ استيراد المراجعات دفعة واحدة (importer.py): نقطة الاستئناف تُحفظ مع كل دفعة في نفس المعاملة
+class ReviewImport(models.Model):
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    source = models.CharField(max_length=500)  # مسار الملف المستورد
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="running")
+    position = models.PositiveIntegerField(default=0)  # عدد السجلات المعالجة حتى الآن (صحيحة أو مرفوضة)
+    created_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['source', 'status'], name='review_import_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"Import {self.id} ({self.source}) - Status: {self.status}"
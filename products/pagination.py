@@ -0,0 +1,180 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db import models
+from django.db.models import F, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ProductPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SearchResultsPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class RowValue(Func):
+    """`(a, b, ..)`: an SQL row value, compared with another column by column."""
+    template = '(%(expressions)s)'
+
+
+class ReviewKeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination for review listings.
+
+    Each page is fetched with a row-value condition `WHERE (k1, k2, ..) <
+    (v1, v2, ..)` on the ordering columns (always ending with `id` so the key
+    is unique). Every ordering runs in one direction and has a matching index
+    (read forwards or backwards), so the database seeks straight to the first
+    row of the page: a deep page costs the same as the first one. SQLite
+    cannot seek on `id` (the rowid) within the row value, hence `created_at`
+    before it to break ties of the counters. The cursor
+    is an opaque base64url-encoded JSON object
+    `{"o": <ordering>, "v": [<last row's keys>]}`.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    default_ordering = '-created_at'
+
+    # ?ordering=<name> -> ordering columns, all in the same direction (see the Review indexes)
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+        'created_at': ('created_at', 'id'),
+        '-rating': ('-rating', '-created_at', '-id'),
+        'rating': ('rating', 'created_at', 'id'),
+        '-likes_count': ('-likes_count', '-created_at', '-id'),
+        'likes_count': ('likes_count', 'created_at', 'id'),
+        '-helpful_count': ('-helpful_count', '-created_at', '-id'),
+        'helpful_count': ('helpful_count', 'created_at', 'id'),
+        'most_interactions': ('-interactions_count', '-created_at', '-id'),
+    }
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'REVIEWS_PAGE_SIZE', 20)
+        max_page_size = getattr(settings, 'REVIEWS_MAX_PAGE_SIZE', 100)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+            if requested > 0:
+                page_size = requested
+        except (KeyError, ValueError):
+            pass
+        return min(page_size, max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if ordering not in self.orderings:
+            ordering = self.default_ordering  # تجاهل القيم غير الصحيحة
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        fields = self.orderings[self.ordering]
+
+        queryset = queryset.order_by(*fields)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            values = self.decode_cursor(encoded, queryset.model)
+            queryset = queryset.filter(self._seek_condition(queryset.model, fields, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def _seek_condition(self, model, fields, values):
+        """(f1, f2, ..) strictly after (v1, v2, ..) in the given ordering, as one row-value comparison."""
+        names = [field.lstrip('-') for field in fields]
+        output_field = model._meta.get_field(names[0])
+        columns = RowValue(*(F(name) for name in names), output_field=output_field)
+        keys = RowValue(
+            *(Value(value, output_field=model._meta.get_field(name)) for name, value in zip(names, values)),
+            output_field=output_field,
+        )
+        lookup = LessThan if fields[0].startswith('-') else GreaterThan
+        return lookup(columns, keys)
+
+    def encode_cursor(self, obj):
+        values = []
+        for field in self.orderings[self.ordering]:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        payload = json.dumps({'o': self.ordering, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, encoded, model):
+        """The keys of a cursor, each parsed for its column; NotFound if anything is off."""
+        fields = self.orderings[self.ordering]
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = payload['v']
+            if payload['o'] != self.ordering or not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError('cursor does not match the ordering')
+            return [
+                self._parse_cursor_value(model._meta.get_field(field.lstrip('-')), value)
+                for field, value in zip(fields, values)
+            ]
+        except (binascii.Error, ValueError, KeyError, TypeError, OverflowError):
+            raise NotFound('Invalid cursor.')
+
+    @staticmethod
+    def _parse_cursor_value(field, value):
+        if isinstance(field, models.DateTimeField):
+            parsed = parse_datetime(value) if isinstance(value, str) else None
+            if parsed is None or (settings.USE_TZ and timezone.is_naive(parsed)):
+                raise ValueError(f'invalid datetime: {value!r}')
+            return parsed
+        # باقي أعمدة الترتيب أعداد صحيحة (id والتقييم والعدادات)
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise TypeError(f'invalid integer: {value!r}')
+        value = int(value)
+        if not -2 ** 63 <= value < 2 ** 63:
+            raise OverflowError(value)
+        return value
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'page_size': self.page_size,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,295 @@
+"""
+Full-text search over review text.
+
+On SQLite the reviews are indexed by an FTS5 table (`products_review_fts`,
+external content: it stores only the index, the text stays in
+`products_review`). Triggers on `products_review` keep it in sync with every
+insert, update and delete, including bulk `QuerySet.update()` and raw SQL.
+
+Queries are whole words, ANDed together:
+
+    battery life        reviews containing both words
+    "battery life"      the exact phrase
+    batt*               words starting with "batt"
+
+Results are ranked by bm25 and come with a highlighted snippet: HTML-escaped
+review text with the matches in `<mark>` tags, safe to render as HTML. Ranking
+scores every match, so a query matching more than SEARCH_RANK_LIMIT reviews
+(default 10000) is ordered newest first instead and only the returned page is
+scored. On other backends (or an SQLite build without FTS5) search falls back
+to the previous `review_text__icontains` filter.
+
+Rebuilding a table on SQLite (some `AlterField` migrations) drops its
+triggers; `repair_review_fts` runs after `migrate` and recreates them. Bulk
+imports index their reviews in one statement instead (`bulk_indexing`).
+"""
+import logging
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from rest_framework.filters import SearchFilter
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'products_review_fts'
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+# علامات snippet() في FTS5: محارف تحكم لا يغيّرها escape()، تُستبدل بـ <mark> بعد تهريب النص
+_FTS_SNIPPET_START = '\x02'
+_FTS_SNIPPET_END = '\x03'
+SNIPPET_ELLIPSIS = '…'
+SNIPPET_TOKENS = 16
+SNIPPET_FALLBACK_CHARS = 60
+DEFAULT_RANK_LIMIT = 10_000
+
+# منسوخة في الترحيلات 0010-0012: تغييرها يحتاج ترحيلًا جديدًا يعيد إنشاءها
+_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF review_text ON products_review BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, review_text) VALUES ('delete', old.id, old.review_text);
+            INSERT INTO {FTS_TABLE}(rowid, review_text) VALUES (new.id, new.review_text);
+        END""",
+}
+
+# (alias, اسم قاعدة البيانات) -> هل جدول الفهرس موجود (fts_available)
+_fts_tables = {}
+
+_QUERY_PART = re.compile(r'"([^"]*)"(\*?)|([^\s"]+)')
+_WORD = re.compile(r'\w+')
+
+
+# =============================
+#  Index maintenance
+# =============================
+def _existing(cursor, kind, names):
+    placeholders = ', '.join(['%s'] * len(names))
+    cursor.execute(
+        f"SELECT name FROM sqlite_master WHERE type = %s AND name IN ({placeholders})", [kind, *names]
+    )
+    return {name for name, in cursor.fetchall()}
+
+
+def fts_available(using=DEFAULT_DB_ALIAS):
+    """
+    True when the database has the review full-text index. Looked up in
+    sqlite_master once per database, not on every search: the index only
+    appears or goes away through migrate, which forgets the answer
+    (`forget_fts_available`, also run by install/uninstall).
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    key = (using, connection.settings_dict['NAME'])
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[key] = bool(_existing(cursor, 'table', [FTS_TABLE]))
+    return _fts_tables[key]
+
+
+def forget_fts_available(using=DEFAULT_DB_ALIAS):
+    _fts_tables.pop((using, connections[using].settings_dict['NAME']), None)
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """Re-index every review from products_review. Returns False when there is no index."""
+    if not fts_available(using):
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def install_review_fts(connection):
+    """Create the index and its triggers and index the existing reviews (SQLite with FTS5 only)."""
+    if connection.vendor != 'sqlite':
+        return False
+    forget_fts_available(connection.alias)
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "review_text, content='products_review', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            logger.warning("SQLite was built without FTS5; review search uses LIKE instead.")
+            return False
+        for sql in _TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall_review_fts(connection):
+    if connection.vendor != 'sqlite':
+        return
+    forget_fts_available(connection.alias)
+    with connection.cursor() as cursor:
+        for name in _TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def repair_review_fts(using=DEFAULT_DB_ALIAS):
+    """
+    Recreate triggers dropped by a table rebuild and re-index, since reviews
+    may have changed while they were missing. Returns True if anything was repaired.
+    """
+    forget_fts_available(using)
+    if not fts_available(using):
+        return False
+    with connections[using].cursor() as cursor:
+        missing = set(_TRIGGERS) - _existing(cursor, 'trigger', list(_TRIGGERS))
+        if not missing:
+            return False
+        for name in missing:
+            cursor.execute(_TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    logger.info("Recreated review search triggers %s and rebuilt the index.", sorted(missing))
+    return True
+
+
+@contextmanager
+def bulk_indexing(using=DEFAULT_DB_ALIAS):
+    """
+    Index the reviews inserted inside the block with one INSERT ... SELECT at
+    the end, instead of the insert trigger row by row (about twice as fast for
+    bulk imports). The trigger is dropped and recreated inside the block's own
+    transaction: SQLite has a single writer, so no other insert can run while
+    it is missing, and a rollback brings it back.
+    """
+    if not fts_available(using):
+        yield
+        return
+    name = f'{FTS_TABLE}_ai'
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM products_review")
+        last_id = cursor.fetchone()[0]
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        try:
+            yield
+            # ids تتزايد دائمًا (AUTOINCREMENT)، فالمراجعات الجديدة هي ما بعد last_id
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, review_text) SELECT id, review_text FROM products_review WHERE id > %s",
+                [last_id],
+            )
+        finally:
+            cursor.execute(_TRIGGERS[name])
+
+
+# =============================
+#  Queries
+# =============================
+def fts_query(keyword):
+    """
+    FTS5 query for the user's search text, or None when it has no words.
+
+    Every word is quoted, so FTS5 operators typed by the user (AND, NEAR, ^,
+    column filters, ...) are searched as plain text instead of raising errors.
+    """
+    parts = []
+    for match in _QUERY_PART.finditer(keyword or ''):
+        phrase, phrase_prefix, bare = match.groups()
+        text = phrase if bare is None else bare
+        words = _WORD.findall(text)
+        if not words:
+            continue
+        prefix = phrase_prefix if bare is None else ('*' if bare.endswith('*') else '')
+        parts.append('"{}"{}'.format(' '.join(words), ' *' if prefix else ''))
+    return ' '.join(parts) or None
+
+
+def rank_limit():
+    return getattr(settings, 'SEARCH_RANK_LIMIT', DEFAULT_RANK_LIMIT)
+
+
+def count_matches(query, using=DEFAULT_DB_ALIAS):
+    """Number of reviews (of all products) matching an FTS5 query, read from the index only."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+        return cursor.fetchone()[0]
+
+
+def match_ids(query):
+    """Subquery of the ids of the reviews matching an FTS5 query (for `id__in=`)."""
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+
+
+def ranked_matches(queryset, query, rank=None):
+    """
+    `queryset` restricted to the reviews matching `query`, annotated with
+    `search_rank` (bm25, lower is better) and `search_snippet`. Best match
+    first, or newest first when `rank` is False (by default: when the query
+    matches more than SEARCH_RANK_LIMIT reviews).
+    """
+    if rank is None:
+        rank = count_matches(query, queryset.db) <= rank_limit()
+    matches = queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = products_review.id', f'{FTS_TABLE} MATCH %s'],
+        params=[query],
+        select={
+            'search_rank': f'bm25({FTS_TABLE})',
+            'search_snippet': f'snippet({FTS_TABLE}, 0, %s, %s, %s, %s)',
+        },
+        select_params=[_FTS_SNIPPET_START, _FTS_SNIPPET_END, SNIPPET_ELLIPSIS, SNIPPET_TOKENS],
+    )
+    if rank:
+        return matches.order_by('search_rank', 'id')
+    # ترتيب rowid في جدول FTS يقرأ النتائج بالترتيب مباشرة من الفهرس، فيُحسب المقتطف للصفحة فقط
+    return matches.order_by().extra(order_by=[f'-{FTS_TABLE}.rowid'])
+
+
+def highlight(text, keyword):
+    """
+    HTML snippet of `text` around the first occurrence of `keyword` (for the
+    LIKE fallback): the text is escaped, only the `<mark>` tags are markup.
+    """
+    text = text or ''
+    position = text.lower().find(keyword.lower()) if keyword else -1
+    if position < 0:
+        return escape(text[:SNIPPET_FALLBACK_CHARS * 2])
+    start = max(position - SNIPPET_FALLBACK_CHARS, 0)
+    end = position + len(keyword)
+    stop = min(end + SNIPPET_FALLBACK_CHARS, len(text))
+    return ''.join([
+        SNIPPET_ELLIPSIS if start else '',
+        escape(text[start:position]), SNIPPET_START, escape(text[position:end]), SNIPPET_END,
+        escape(text[end:stop]),
+        SNIPPET_ELLIPSIS if stop < len(text) else '',
+    ])
+
+
+def fts_snippet_html(snippet):
+    """An FTS5 `snippet()` (raw review text with control-character markers) as escaped HTML with `<mark>` tags."""
+    return escape(snippet).replace(_FTS_SNIPPET_START, SNIPPET_START).replace(_FTS_SNIPPET_END, SNIPPET_END)
+
+
+def review_snippet(review, keyword):
+    snippet = getattr(review, 'search_snippet', None)
+    return fts_snippet_html(snippet) if snippet is not None else highlight(review.review_text, keyword)
+
+
+# =============================
+#  DRF filter backend
+# =============================
+class ReviewSearchFilter(SearchFilter):
+    """`?search=` on review lists through the full-text index, keeping the view's ordering."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = fts_query(request.query_params.get(self.search_param, ''))
+        if query is None or queryset.model._meta.db_table != 'products_review' or not fts_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        return queryset.filter(id__in=match_ids(query))
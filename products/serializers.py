@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
-from .models import Product, Review, ReviewInteraction, Notification, AdminReport
+from django.urls import reverse
+from .models import Product, Review, ReviewInteraction, Notification, AdminReport, ExportJob
 
 
 
@@ -18,8 +19,9 @@ class UserSerializer(serializers.ModelSerializer):
 
 # ✅ Product Serializer
 class ProductSerializer(serializers.ModelSerializer):
-    average_rating = serializers.SerializerMethodField(read_only=True)
-    review_count = serializers.SerializerMethodField(read_only=True)
+    # القيم مخزنة على المنتج نفسه (انظر aggregates.py) فلا حاجة لأي استعلام إضافي
+    average_rating = serializers.FloatField(read_only=True)
+    review_count = serializers.IntegerField(source="rating_count", read_only=True)
 
     class Meta:
         model = Product
@@ -34,21 +36,12 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at", "user"]
 
-    def get_average_rating(self, obj):
-        visible_reviews = obj.reviews.filter(is_visible=True)
-        if visible_reviews.exists():
-            return round(sum(review.rating for review in visible_reviews) / visible_reviews.count(), 1)
-        return 0
-
-    def get_review_count(self, obj):
-        return obj.reviews.filter(is_visible=True).count()
-
 
 # ✅ Review Serializer
 class ReviewSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    helpful_count = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
+    helpful_count = serializers.IntegerField(read_only=True)
     views_count = serializers.IntegerField(read_only=True)
 
     # إضافات جديدة:
@@ -69,39 +62,33 @@ class ReviewSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Rating must be between 1 and 5.")
         return value
 
-    def get_likes_count(self, obj):
-        return obj.interactions.filter(liked=True).count()
-
-    def get_helpful_count(self, obj):
-        return obj.interactions.filter(is_helpful=True).count()
-
+    # القيم annotated_* تأتي من Review.objects.for_listing() وإلا نرجع للاستعلام المباشر
     def get_user_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'annotated_user_liked'):
+                return obj.annotated_user_liked
             return obj.interactions.filter(user=request.user, liked=True).exists()
         return False
 
     def get_reported(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'annotated_reported'):
+                return obj.annotated_reported
             return AdminReport.objects.filter(review=obj, user=request.user).exists()
         return False
 # ✅ ReviewInteraction Serializer by rahaf
 class ReviewInteractionSerializer(serializers.ModelSerializer):
-    likes_count = serializers.SerializerMethodField()
-    helpful_count = serializers.SerializerMethodField()
+    # العدادات مخزنة على المراجعة نفسها
+    likes_count = serializers.IntegerField(source='review.likes_count', read_only=True)
+    helpful_count = serializers.IntegerField(source='review.helpful_count', read_only=True)
 
     class Meta:
         model = ReviewInteraction
         fields = ['id', 'review', 'is_helpful', 'liked', 'created_at', 'likes_count', 'helpful_count']
         read_only_fields = ['created_at', 'likes_count', 'helpful_count']
 
-    def get_likes_count(self, obj):
-        return ReviewInteraction.objects.filter(review=obj.review, liked=True).count()
-
-    def get_helpful_count(self, obj):
-        return ReviewInteraction.objects.filter(review=obj.review, is_helpful=True).count()
-
     def validate(self, data):
         user = self.context["request"].user
         review = data.get("review", None) or getattr(self.instance, "review", None)
@@ -135,3 +122,54 @@ class AdminReportSerializer(serializers.ModelSerializer):
         model = AdminReport
         fields = ["id", "review", "status", "created_at"]
         read_only_fields = ["id", "review", "created_at"]
+
+
+# ✅ ExportJob Serializer
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            "id", "kind", "status", "progress", "total", "error",
+            "created_at", "started_at", "finished_at", "download_url"
+        ]
+        read_only_fields = [
+            "id", "status", "progress", "total", "error",
+            "created_at", "started_at", "finished_at"
+        ]
+
+    def get_download_url(self, obj):
+        if obj.status != "done":
+            return None
+        url = reverse("exportjob-download", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+
+# ✅ Bulk moderation request (bulk_moderation.py)
+from .bulk_moderation import ACTIONS, max_items
+
+
+class BulkModerationFilterSerializer(serializers.Serializer):
+    product = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=['pending', 'visible'], required=False)
+    min_rating = serializers.IntegerField(min_value=1, max_value=5, required=False)
+    max_rating = serializers.IntegerField(min_value=1, max_value=5, required=False)
+    is_offensive = serializers.BooleanField(required=False)
+
+
+class BulkModerationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=ACTIONS)
+    review_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = BulkModerationFilterSerializer(required=False)
+
+    def validate_review_ids(self, value):
+        if len(set(value)) > max_items():
+            raise serializers.ValidationError(f"At most {max_items()} reviews per request.")
+        return value
+
+    def validate(self, data):
+        if ('review_ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Give either review_ids or filter.")
+        return data
@@ -0,0 +1,151 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .aggregates import (
+    INTERACTION_COUNTER_FIELDS,
+    INTERACTION_STATE_FIELDS,
+    REVIEW_STATE_FIELDS,
+    apply_daily_stats_change,
+    apply_interaction_change,
+    apply_review_change,
+    apply_term_change,
+    current_state,
+    reviews_deleted_with_products,
+    stored_state,
+)
+from .cache import review_cache
+from .models import AdminReport, Product, Review, ReviewInteraction
+
+
+# =============================
+#  Review moderation (banned words)
+# =============================
+@receiver(pre_save, sender=Review)
+def moderate_review_text(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'review_text' not in update_fields):
+        return
+    instance.apply_moderation()
+
+
+# =============================
+#  Review -> Product aggregates, daily rollup and term counts
+# =============================
+@receiver(pre_save, sender=Review)
+@receiver(pre_delete, sender=Review)
+def remember_stored_review_state(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.pk in reviews_deleted_with_products():
+        instance._stored_state = None  # تُحذف إحصائياتها مع المنتج (aggregates.deleting_product)
+        return
+    # الصف المخزن مقفلًا داخل معاملة الحفظ / الحذف، وليس القيم المحمّلة في الذاكرة
+    instance._stored_state = stored_state(instance, REVIEW_STATE_FIELDS)
+
+
+@receiver(post_save, sender=Review)
+def update_aggregates_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = getattr(instance, '_stored_state', None)
+    new_state = current_state(instance, REVIEW_STATE_FIELDS)
+    apply_review_change(old_state, new_state)
+    apply_daily_stats_change(old_state, new_state)
+    apply_term_change(old_state, new_state)
+    _invalidate_review(instance, old_state)
+
+
+@receiver(post_delete, sender=Review)
+def update_aggregates_on_review_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, '_stored_state', None)
+    if old_state is None:
+        return  # حذفها طلب آخر قبلنا وطرح مساهمتها
+    apply_review_change(old_state, None)
+    apply_daily_stats_change(old_state, None)
+    apply_term_change(old_state, None)
+    _invalidate_review(instance, old_state)
+
+
+def _invalidate_review(review, old_state):
+    # المنتج القديم أيضًا إذا نُقلت المراجعة إلى منتج آخر
+    old_product_id = old_state['product_id'] if old_state else None
+    review_cache.invalidate('product', *{review.product_id, old_product_id})
+    review_cache.invalidate('review', review.pk)
+
+
+# =============================
+#  ReviewInteraction -> Review counters
+# =============================
+def _invalidate_interaction_review(interaction):
+    if ReviewInteraction.review.is_cached(interaction):
+        product_id = interaction.review.product_id
+    else:
+        product_id = Review.objects.filter(pk=interaction.review_id).values_list('product_id', flat=True).first()
+    review_cache.invalidate('review', interaction.review_id)
+    review_cache.invalidate('product', product_id)
+
+
+def _refresh_review_counters(interaction):
+    # المراجعة المحمّلة في الذاكرة (إن وجدت) تأخذ القيم الجديدة للعدادات
+    if ReviewInteraction.review.is_cached(interaction):
+        interaction.review.refresh_from_db(fields=INTERACTION_COUNTER_FIELDS)
+
+
+@receiver(pre_save, sender=ReviewInteraction)
+@receiver(pre_delete, sender=ReviewInteraction)
+def remember_stored_interaction_state(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.review_id in reviews_deleted_with_products():
+        instance._stored_state = None  # المراجعة نفسها تُحذف مع منتجها
+        return
+    instance._stored_state = stored_state(instance, INTERACTION_STATE_FIELDS)
+
+
+@receiver(post_save, sender=ReviewInteraction)
+def update_counters_on_interaction_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new_state = current_state(instance, INTERACTION_STATE_FIELDS)
+    apply_interaction_change(getattr(instance, '_stored_state', None), new_state)
+    _refresh_review_counters(instance)
+    _invalidate_interaction_review(instance)
+
+
+@receiver(post_delete, sender=ReviewInteraction)
+def update_counters_on_interaction_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, '_stored_state', None)
+    if old_state is None:
+        return
+    apply_interaction_change(old_state, None)
+    _refresh_review_counters(instance)
+    _invalidate_interaction_review(instance)
+
+
+# =============================
+#  Product -> cached responses
+# =============================
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    review_cache.invalidate('product', instance.pk)
+    if kwargs['signal'] is post_delete:
+        # مراجعاته المحذوفة معه لم يُلغَ كاشها واحدة واحدة
+        review_cache.invalidate('review', *reviews_deleted_with_products())
+
+
+# =============================
+#  AdminReport -> review `reported` flag
+# =============================
+@receiver(post_save, sender=AdminReport)
+@receiver(post_delete, sender=AdminReport)
+def touch_reported_review(sender, instance, raw=False, **kwargs):
+    if raw or instance.review_id in reviews_deleted_with_products():
+        return
+    # reported جزء من تمثيل المراجعة، فتتغير ETag / Last-Modified
+    product_id = Review.objects.filter(pk=instance.review_id).values_list('product_id', flat=True).first()
+    Review.objects.filter(pk=instance.review_id).update(updated_at=timezone.now())
+    review_cache.invalidate('review', instance.review_id)
+    review_cache.invalidate('product', product_id)
@@ -1,9 +1,56 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core import checks
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.utils import timezone
+from datetime import timedelta
+from io import BytesIO, StringIO
+import base64
+import csv
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+from collections import Counter
+from unittest import skipUnless
+from openpyxl import load_workbook
 
-from .models import Product, Review, ReviewInteraction, Notification, AdminReport
+from .models import (
+    Product, Review, ReviewInteraction, ReviewDailyStats, ReviewTermCount, Notification, AdminReport, ExportJob,
+    ReviewImport,
+)
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.test import TestCase
 from rest_framework.test import APIClient
 from .views import AdminReportView, AdminReviewActionView, AdminDashboardView
+from .serializers import ProductSerializer
+from .aggregates import RATING_COUNT_FIELDS, rebuild_review_counters, wilson_score
+from .importer import ReviewImporter, finish_import, insert_reviews, read_records
+from .pagination import ReviewKeysetPagination
+from .view_counter import view_counts
+from .export_jobs import recover_export_jobs, run_export_job
+from .wordfreq import SpaceSaving, count_words, most_common_words, sketch_words
+from .moderation import BannedWordMatcher, get_matcher
+from .search import FTS_TABLE, fts_available, fts_query, highlight, repair_review_fts, review_snippet
+from .cache import check_review_cache, review_cache
+from django.core.cache import cache
+from .analytics import (
+    export_reviews_to_csv,
+    get_low_rating_reviews,
+    get_most_common_words_in_reviews,
+    get_product_rating_trend,
+    get_top_rated_products,
+    iter_products_analytics,
+    search_reviews_by_keyword,
+)
 
 class ProductReviewAPITest(APITestCase):
 
@@ -548,3 +595,1754 @@ class AdminInsightsIntegrationTest(TestCase):
         )
         self.assertEqual(admin_report.status, 'rejected')
 
+
+class ProductRatingAggregatesTests(TestCase):
+    """Stored rating aggregates on Product follow every review write"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.reviewer = User.objects.create_user(username='reviewer', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+
+    def assertAggregates(self, count, total, distribution):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, count)
+        self.assertEqual(self.product.rating_sum, total)
+        self.assertEqual(
+            [getattr(self.product, f'rating_{r}_count') for r in range(1, 6)], distribution
+        )
+
+    def test_aggregates_follow_review_lifecycle(self):
+        review = Review.objects.create(product=self.product, user=self.reviewer, rating=4, review_text='Good')
+        self.assertAggregates(0, 0, [0, 0, 0, 0, 0])  # hidden until approved
+
+        review.is_visible = True
+        review.save()
+        self.assertAggregates(1, 4, [0, 0, 0, 1, 0])
+
+        Review.objects.create(product=self.product, user=self.owner, rating=1, review_text='Bad', is_visible=True)
+        self.assertAggregates(2, 5, [1, 0, 0, 1, 0])
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 5
+        review.save()
+        self.assertAggregates(2, 6, [1, 0, 0, 0, 1])
+        self.assertEqual(self.product.average_rating, 3.0)
+
+        review.is_visible = False
+        review.save()
+        self.assertAggregates(1, 1, [1, 0, 0, 0, 0])
+
+        Review.objects.filter(rating=1).get().delete()
+        self.assertAggregates(0, 0, [0, 0, 0, 0, 0])
+        self.assertEqual(self.product.average_rating, 0)
+
+    def test_stale_copies_apply_each_change_once(self):
+        review = Review.objects.create(product=self.product, user=self.reviewer, rating=4, review_text='Good')
+        # نسختان محمّلتان قبل أي موافقة (طلبان متزامنان)
+        first, second = Review.objects.get(pk=review.pk), Review.objects.get(pk=review.pk)
+        first.is_visible = second.is_visible = True
+        first.save()
+        second.save()
+        self.assertAggregates(1, 4, [0, 0, 0, 1, 0])
+
+        first.delete()
+        second.delete()
+        self.assertAggregates(0, 0, [0, 0, 0, 0, 0])
+        self.assertEqual(ReviewDailyStats.objects.get(product=self.product).review_count, 0)
+
+    def test_product_saves_keep_concurrent_aggregates(self):
+        # تعديل المنتج من نسخة حُمّلت قبل إضافة مراجعات
+        stale = Product.objects.get(pk=self.product.pk)
+        Review.objects.create(product=self.product, user=self.reviewer, rating=4, review_text='Good', is_visible=True)
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertAggregates(1, 4, [0, 0, 0, 1, 0])
+        self.assertEqual(self.product.name, 'Renamed')
+
+    def test_product_delete_costs_the_same_for_any_review_count(self):
+        kept = Review.objects.create(product=self.product, user=self.reviewer, rating=2, review_text='Meh', is_visible=True)
+
+        def delete_product_with_reviews(count):
+            product = Product.objects.create(name='Tablet', description='Desc', user=self.owner)
+            for i in range(count):
+                review = Review.objects.create(
+                    product=product, user=self.reviewer, rating=4, review_text=f'Good tablet {i}', is_visible=True
+                )
+                ReviewInteraction.objects.create(review=review, user=self.owner, liked=True)
+                AdminReport.objects.create(review=review, user=self.owner)
+            with CaptureQueriesContext(connection) as queries:
+                product.delete()
+            self.assertFalse(Review.objects.filter(product_id=product.id).exists())
+            self.assertFalse(ReviewDailyStats.objects.filter(product_id=product.id).exists())
+            return len(queries)
+
+        self.assertEqual(delete_product_with_reviews(2), delete_product_with_reviews(10))
+        # مراجعات المنتجات الأخرى لا تتأثر، وحذف مراجعة وحدها يحدّث الإحصائيات كالمعتاد
+        self.assertAggregates(1, 2, [0, 1, 0, 0, 0])
+        kept.delete()
+        self.assertAggregates(0, 0, [0, 0, 0, 0, 0])
+
+    def test_rebuild_command(self):
+        Review.objects.create(product=self.product, user=self.reviewer, rating=3, review_text='Ok', is_visible=True)
+        Review.objects.create(product=self.product, user=self.owner, rating=5, review_text='Great', is_visible=True)
+        Product.objects.update(rating_count=0, rating_sum=0, rating_3_count=0, rating_5_count=0)
+
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertAggregates(2, 8, [0, 0, 1, 0, 1])
+
+    def test_product_serializer_uses_stored_values(self):
+        Review.objects.create(product=self.product, user=self.reviewer, rating=4, review_text='Good', is_visible=True)
+        self.product.refresh_from_db()
+        with self.assertNumQueries(0):
+            data = ProductSerializer(self.product).data
+        self.assertEqual(data['average_rating'], 4.0)
+        self.assertEqual(data['review_count'], 1)
+
+
+class CatalogTestCase(APITestCase):
+    """Products of `owner` reviewed by `reviewer`, and the number of queries a request costs"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.reviewer = User.objects.create_user(username='reviewer', password='pass123')
+        self.client.force_authenticate(user=self.owner)
+
+    def catalog_reviews(self, i, **options):
+        """The reviews of the i-th product, as Review field values (by `reviewer` unless they give `user`)."""
+        return []
+
+    def create_catalog(self, products, **options):
+        for i in range(products):
+            product = Product.objects.create(name=f'Product {i}', description='Desc', user=self.owner)
+            for fields in self.catalog_reviews(i, **options):
+                Review.objects.create(product=product, **{'user': self.reviewer, **fields})
+
+    def get_counted(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+
+class ProductListQueryCountTests(CatalogTestCase):
+    """The product list costs the same number of queries for any catalog size"""
+
+    def catalog_reviews(self, i):
+        return [
+            {'rating': 4, 'review_text': 'Good', 'is_visible': True},
+            {'user': self.owner, 'rating': 2, 'review_text': 'Meh', 'is_visible': True},
+        ]
+
+    def test_list_query_count_is_constant(self):
+        self.create_catalog(3)
+        response, queries = self.get_counted('/api/products/')
+        self.assertEqual(queries, 2)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['average_rating'], 3.0)
+        self.assertEqual(response.data['results'][0]['review_count'], 2)
+
+        self.create_catalog(30)
+        response, queries = self.get_counted('/api/products/?page_size=50')
+        self.assertEqual(queries, 2)
+        self.assertEqual(len(response.data['results']), 33)
+
+    def test_list_is_paginated(self):
+        self.create_catalog(25)
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+
+class ReviewListQueryCountTests(CatalogTestCase):
+    """Review lists serialize in a constant number of queries"""
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.client.force_authenticate(user=self.reviewer)
+
+    def create_reviews(self, count):
+        reviews = []
+        for i in range(count):
+            author = User.objects.create_user(username=f'author{User.objects.count()}', password='pass123')
+            reviews.append(Review.objects.create(
+                product=self.product, user=author, rating=5, review_text=f'Review {i}', is_visible=True
+            ))
+        return reviews
+
+    def test_list_query_count_is_constant(self):
+        reviews = self.create_reviews(2)
+        ReviewInteraction.objects.create(review=reviews[0], user=self.reviewer, liked=True, is_helpful=True)
+        AdminReport.objects.create(review=reviews[0], user=self.reviewer)
+
+        response, queries = self.get_counted(f'/api/products/{self.product.id}/reviews/')
+        self.assertEqual(queries, 1)
+        first = next(r for r in response.data['results'] if r['id'] == reviews[0].id)
+        self.assertEqual(first['likes_count'], 1)
+        self.assertEqual(first['helpful_count'], 1)
+        self.assertTrue(first['user_liked'])
+        self.assertTrue(first['reported'])
+        self.assertEqual(first['user'], reviews[0].user.username)
+
+        self.create_reviews(20)
+        response, queries = self.get_counted(f'/api/products/{self.product.id}/reviews/?page_size=50')
+        self.assertEqual(queries, 1)
+        self.assertEqual(len(response.data['results']), 22)
+
+
+class ReviewKeysetPaginationTests(APITestCase):
+    """Cursor pagination over the per-product review list"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.client.force_authenticate(user=self.owner)
+        for i in range(7):
+            Review.objects.create(
+                product=self.product, user=self.owner, rating=(i % 3) + 1,
+                review_text=f'Review {i}', is_visible=True
+            )
+        self.url = f'/api/products/{self.product.id}/reviews/'
+
+    def collect(self, query):
+        ids, url = [], self.url + query
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(r['id'] for r in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_walks_every_page_in_order(self):
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.collect('?page_size=3'), expected)
+
+    def test_rating_ordering_with_ties(self):
+        # rating هو عكس -rating تمامًا (نفس الفهرس مقروءًا بالعكس)
+        expected = list(Review.objects.order_by('rating', 'created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(self.collect('?ordering=rating&page_size=2'), expected)
+
+    def test_every_ordering_with_equal_keys(self):
+        # مراجعات مستوردة معًا تشترك في created_at؛ id يفصل بينها
+        Review.objects.filter(id__gt=Review.objects.order_by('id')[2].id).update(created_at=timezone.now())
+        for ordering, fields in ReviewKeysetPagination.orderings.items():
+            expected = list(Review.objects.order_by(*fields).values_list('id', flat=True))
+            self.assertEqual(self.collect(f'?ordering={ordering}&page_size=2'), expected, ordering)
+
+    def test_page_size_is_capped(self):
+        with self.settings(REVIEWS_MAX_PAGE_SIZE=4):
+            response = self.client.get(self.url + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_cursor_values(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+        for payload in (
+            {'o': '-created_at', 'v': ['garbage', 1]},
+            {'o': '-created_at', 'v': ['2024-01-01T10:00:00', 1]},  # بلا منطقة زمنية
+            {'o': '-created_at', 'v': [{'a': 1}, 1]},
+            {'o': '-created_at', 'v': ['2024-01-01T10:00:00+00:00', {'a': 1}]},
+            {'o': '-created_at', 'v': ['2024-01-01T10:00:00+00:00', 2 ** 70]},
+            {'o': '-rating', 'v': ['x', '2024-01-01T10:00:00+00:00', 1]},
+            {'o': '-rating', 'v': [True, '2024-01-01T10:00:00+00:00', 1]},
+            {'o': '-created_at', 'v': {'0': 1, '1': 2}},
+            ['not', 'an', 'object'],
+        ):
+            ordering = payload['o'] if isinstance(payload, dict) else '-created_at'
+            response = self.client.get(self.url, {'ordering': ordering, 'cursor': encode(payload)})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, payload)
+        response = self.client.get('/api/admin/reports/', {'cursor': encode({'o': '-created_at', 'v': ['x', 1]})})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_deep_pages_seek_through_an_index(self):
+        # الصفحات العميقة تبدأ مباشرة من موضع المؤشر في الفهرس، بلا فرز ولا مسح من البداية
+        for ordering, fields in ReviewKeysetPagination.orderings.items():
+            response = self.client.get(self.url, {'ordering': ordering, 'page_size': 2})
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(response.data['next'])
+            sql = next(q['sql'] for q in captured.captured_queries if 'ORDER BY' in q['sql'])
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn('USING INDEX review_visible_', plan, ordering)
+            self.assertRegex(plan, rf"\(?{fields[0].lstrip('-')}(,\w+)*\)?[<>]", ordering)
+            self.assertNotIn('TEMP B-TREE', plan, ordering)
+
+
+class ReviewInteractionCounterTests(APITestCase):
+    """Stored like/helpful counters on Review follow interaction writes"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.reader = User.objects.create_user(username='reader', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.author)
+        self.review = Review.objects.create(
+            product=self.product, user=self.author, rating=5, review_text='Great', is_visible=True
+        )
+
+    def assertCounters(self, likes, helpful):
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes_count, likes)
+        self.assertEqual(self.review.helpful_count, helpful)
+        self.assertEqual(self.review.interactions_count, likes + helpful)
+
+    def test_counters_follow_interaction_lifecycle(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.post('/api/review-interactions/', {
+            'review': self.review.id, 'liked': True, 'is_helpful': True
+        }, format='json')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(response.data['helpful_count'], 1)
+        self.assertCounters(1, 1)
+
+        interaction_id = response.data['id']
+        response = self.client.patch(f'/api/review-interactions/{interaction_id}/', {'liked': False}, format='json')
+        self.assertEqual(response.data['likes_count'], 0)
+        self.assertCounters(0, 1)
+
+        self.client.delete(f'/api/review-interactions/{interaction_id}/')
+        self.assertCounters(0, 0)
+
+    def test_stale_copies_apply_each_change_once(self):
+        interaction = ReviewInteraction.objects.create(review=self.review, user=self.reader)
+        first = ReviewInteraction.objects.get(pk=interaction.pk)
+        second = ReviewInteraction.objects.get(pk=interaction.pk)
+        first.liked = second.liked = True
+        first.save()
+        second.save()
+        self.assertCounters(1, 0)
+
+        first.delete()
+        second.delete()
+        self.assertCounters(0, 0)
+
+    def test_review_saves_keep_concurrent_counter_updates(self):
+        # تفاعل يصل بين تحميل المراجعة وحفظها في التعديل / الرفض
+        readers = [self.reader, User.objects.create_user(username='second', password='pass123')]
+
+        def interleave(execute, sql, params, many, context):
+            if sql.startswith('UPDATE "products_review" SET "product_id"') and readers:
+                ReviewInteraction.objects.create(review_id=self.review.id, user=readers.pop(), liked=True)
+            return execute(sql, params, many, context)
+
+        self.client.force_authenticate(user=self.author)
+        with connection.execute_wrapper(interleave):
+            response = self.client.patch(
+                f'/api/products/{self.product.id}/reviews/{self.review.id}/', {'rating': 4}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertCounters(1, 0)
+            self.client.post(f'/api/admin/reviews/{self.review.id}/reject/')
+        self.assertCounters(2, 0)
+        self.assertEqual(self.review.votes_count, 2)
+        self.assertGreater(self.review.rank_score, 0)
+        self.assertEqual((self.review.rating, self.review.is_visible), (4, False))
+
+    def test_rebuild_command_restores_counters(self):
+        ReviewInteraction.objects.create(review=self.review, user=self.reader, liked=True)
+        Review.objects.update(likes_count=0, interactions_count=0)
+
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertCounters(1, 0)
+
+    def test_order_by_most_interactions(self):
+        other = Review.objects.create(
+            product=self.product, user=self.reader, rating=3, review_text='Ok', is_visible=True
+        )
+        ReviewInteraction.objects.create(review=other, user=self.author, liked=True, is_helpful=True)
+        self.client.force_authenticate(user=self.reader)
+
+        response = self.client.get(f'/api/products/{self.product.id}/reviews/?ordering=most_interactions')
+        self.assertEqual([r['id'] for r in response.data['results']], [other.id, self.review.id])
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=None)
+class ReviewViewCountBufferTests(APITestCase):
+    """Review views are buffered and written in batches"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.author)
+        self.review = Review.objects.create(
+            product=self.product, user=self.author, rating=5, review_text='Great', is_visible=True
+        )
+        self.url = f'/api/products/{self.product.id}/reviews/{self.review.id}/'
+        view_counts.flush()
+        cache.clear()  # أعداد المشاهدات المكتوبة في الكاش لنفس المعرّفات من اختبارات سابقة
+
+    def test_views_are_buffered_then_flushed(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['views_count'], 2)
+        self.assertEqual(view_counts.pending_count, 2)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views_count, 0)
+
+        self.assertEqual(view_counts.flush(), 2)
+        self.assertEqual(view_counts.pending_count, 0)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views_count, 2)
+
+    def test_flushing_views_stay_pending_until_committed(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        seen = []
+
+        def during_update(execute, sql, params, many, context):
+            # القراءة بين تبديل المخزن والتزام UPDATE: لا تنقص المشاهدات
+            if sql.startswith('UPDATE'):
+                seen.append(view_counts.pending_for(self.review.id))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(during_update):
+            view_counts.flush()
+        self.assertEqual(seen, [3])
+        self.assertEqual(view_counts.pending_for(self.review.id), 0)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views_count, 3)
+
+    def test_review_saves_keep_flushed_views(self):
+        # تعديل / رفض من نسخة حُمّلت قبل كتابة المشاهدات
+        stale = Review.objects.get(pk=self.review.pk)
+        view_counts.increment(self.review.id, 3)
+        view_counts.flush()
+        stale.is_visible = False
+        stale.save()
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views_count, 3)
+
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+    def test_write_through_mode(self):
+        self.client.get(self.url)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views_count, 1)
+        self.assertEqual(view_counts.pending_count, 0)
+
+
+class BannedWordMatcherTests(TestCase):
+    """Shared compiled matcher for banned words"""
+
+    def test_substring_matching_is_case_folded(self):
+        matcher = BannedWordMatcher(['badword1', 'offensive'])
+        self.assertTrue(matcher.search('This is OFFENSIVE'))
+        self.assertTrue(matcher.search('inoffensively'))
+        self.assertFalse(matcher.search('All good'))
+
+    def test_whole_word_matching(self):
+        matcher = BannedWordMatcher(['bad', 'badword1'], whole_word=True)
+        self.assertEqual(matcher.find_all('bad, badword1 and badly'), ['bad', 'badword1'])
+        self.assertFalse(matcher.search('badly'))
+
+    def test_arabic_text_is_normalized(self):
+        matcher = BannedWordMatcher(['مسيء', 'أحمق'], whole_word=True)
+        self.assertEqual(matcher.find_all('منتج مُسِيء والبائع احمق'), ['احمق', 'مسيء'])
+
+    def test_matcher_is_rebuilt_only_when_the_list_changes(self):
+        matcher = get_matcher()
+        self.assertIs(get_matcher(), matcher)
+        with self.settings(BANNED_WORDS=['terrible']):
+            self.assertIsNot(get_matcher(), matcher)
+            review = Review(review_text='Terrible service')
+            self.assertTrue(review.contains_bad_words())
+        self.assertIs(get_matcher(), matcher)
+
+
+class OffensiveFlagTests(APITestCase):
+    """The offensive flag is computed at write time and queried in SQL"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+
+    def test_flag_follows_review_text(self):
+        review = Review.objects.create(
+            product=self.product, user=self.owner, rating=1, review_text='badword1 and Offensive'
+        )
+        self.assertTrue(review.is_offensive)
+        self.assertEqual(review.flagged_terms, ['badword1', 'offensive'])
+
+        review.review_text = 'Fine after all'
+        review.save()
+        review.refresh_from_db()
+        self.assertFalse(review.is_offensive)
+        self.assertEqual(review.flagged_terms, [])
+
+    def test_reflag_command_applies_new_list(self):
+        review = Review.objects.create(product=self.product, user=self.owner, rating=2, review_text='Terrible')
+        self.assertFalse(review.is_offensive)
+
+        with self.settings(BANNED_WORDS=['terrible']):
+            call_command('reflag_reviews', stdout=StringIO())
+        review.refresh_from_db()
+        self.assertTrue(review.is_offensive)
+        self.assertEqual(review.flagged_terms, ['terrible'])
+
+    def test_admin_report_offensive_filter(self):
+        Review.objects.create(product=self.product, user=self.owner, rating=2, review_text='So offensive')
+        Review.objects.create(product=self.product, user=self.owner, rating=5, review_text='Lovely')
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.get('/api/admin/reports/?filter=offensive')
+        self.assertEqual(response.data['summary']['offensive_reviews'], 1)
+        self.assertEqual(len(response.data['filtered_reviews']), 1)
+
+
+class AdminDashboardQueryTests(CatalogTestCase):
+    """The dashboard is built from a fixed number of aggregate queries"""
+
+    def catalog_reviews(self, i):
+        return [
+            {'rating': 5, 'review_text': 'Great', 'is_visible': True},
+            {'rating': 1, 'review_text': 'offensive', 'is_visible': False},
+        ]
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        self.create_catalog(2)
+        response, small = self.get_counted('/api/admin/dashboard/')
+        self.assertLessEqual(small, 5)
+        self.assertEqual(response.data['overview']['total_reviews'], 4)
+        self.assertEqual(response.data['overview']['overall_avg_rating'], 5.0)
+        self.assertEqual(response.data['alerts']['offensive_count'], 2)
+        self.assertEqual(response.data['rating_distribution']['1_stars'], 2)
+        current_month = response.data['monthly_stats'][0]
+        self.assertEqual(current_month['month'], timezone.now().strftime('%Y-%m'))
+        self.assertEqual(current_month['total_reviews'], 4)
+        self.assertEqual(current_month['approved_reviews'], 2)
+        self.assertEqual(len(response.data['monthly_stats']), 6)
+
+        self.create_catalog(10)
+        response, large = self.get_counted('/api/admin/dashboard/')
+        self.assertEqual(large, small)
+        self.assertEqual(response.data['overview']['total_products'], 12)
+        self.assertEqual(len(response.data['top_products']), 5)
+
+
+class AdminReportQueryTests(CatalogTestCase):
+    """The admin report runs a fixed number of queries and pages its reviews"""
+
+    def catalog_reviews(self, i, reviews_per_product=3):
+        return [
+            {'rating': j % 5 + 1, 'review_text': 'Fine', 'is_visible': j % 2 == 0}
+            for j in range(reviews_per_product)
+        ]
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        self.create_catalog(2)
+        response, small = self.get_counted('/api/admin/reports/')
+        self.assertEqual(response.data['summary']['total_reviews'], 6)
+        self.assertEqual(response.data['summary']['approved_reviews'], 4)
+        self.assertEqual(response.data['products'][0]['review_count'], 3)
+
+        self.create_catalog(10)
+        response, large = self.get_counted('/api/admin/reports/')
+        self.assertEqual(large, small)
+        self.assertEqual(len(response.data['products']), 12)
+
+    def test_filtered_reviews_are_paginated(self):
+        self.create_catalog(2, reviews_per_product=5)
+        seen, url = [], '/api/admin/reports/?filter=unapproved&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen.extend(r['id'] for r in response.data['filtered_reviews'])
+            self.assertLessEqual(len(response.data['filtered_reviews']), 2)
+            url = response.data['next']
+        expected = Review.objects.filter(is_visible=False).order_by('-created_at', '-id')
+        self.assertEqual(seen, list(expected.values_list('id', flat=True)))
+
+
+class ReviewDailyStatsTests(TestCase):
+    """The daily review rollup follows review writes and answers the analytics windows"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.reviewer = User.objects.create_user(username='reviewer', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.other = Product.objects.create(name='Laptop', description='Desc', user=self.owner)
+
+    def add_review(self, product, rating, days_ago=0, is_visible=True):
+        review = Review.objects.create(
+            product=product, user=self.reviewer, rating=rating, review_text='Fine', is_visible=is_visible
+        )
+        if days_ago:
+            # created_at تلقائي، لذلك ننقل المراجعة إلى يوم سابق عبر save() لتحديث الملخص
+            review.created_at = timezone.now() - timedelta(days=days_ago)
+            review.save()
+        return review
+
+    def rollup(self):
+        fields = ['product_id', 'day', 'review_count', 'rating_sum', 'visible_count', 'visible_rating_sum'] + [
+            f'rating_{rating}_count' for rating in range(1, 6)
+        ]
+        return sorted(
+            (row for row in ReviewDailyStats.objects.values(*fields) if row['review_count']),
+            key=lambda row: (row['product_id'], row['day'])
+        )
+
+    def test_rollup_follows_review_lifecycle(self):
+        review = self.add_review(self.product, 4, is_visible=False)
+        self.add_review(self.product, 2, days_ago=3)
+        today = ReviewDailyStats.objects.get(product=self.product, day=timezone.localdate())
+        self.assertEqual((today.review_count, today.rating_sum, today.visible_count), (1, 4, 0))
+
+        review.is_visible = True
+        review.rating = 5
+        review.save()
+        today.refresh_from_db()
+        self.assertEqual((today.rating_sum, today.rating_4_count, today.rating_5_count), (5, 0, 1))
+        self.assertEqual((today.visible_count, today.visible_rating_sum), (1, 5))
+
+        review.delete()
+        today.refresh_from_db()
+        self.assertEqual((today.review_count, today.rating_sum, today.visible_count), (0, 0, 0))
+
+        incremental = self.rollup()
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_rollup_answers_match_raw_reviews(self):
+        for rating, days_ago in [(5, 0), (4, 2), (1, 10), (3, 40)]:
+            self.add_review(self.product, rating, days_ago=days_ago)
+        for rating, days_ago in [(2, 1), (3, 5)]:
+            self.add_review(self.other, rating, days_ago=days_ago)
+
+        for product_id in (None, self.product.id):
+            self.assertEqual(
+                get_product_rating_trend(product_id, days=30, use_rollup=True),
+                get_product_rating_trend(product_id, days=30),
+            )
+        self.assertEqual(
+            get_top_rated_products(days=30, use_rollup=True),
+            get_top_rated_products(days=30),
+        )
+        with self.assertNumQueries(1):
+            get_product_rating_trend(self.product.id, days=30, use_rollup=True)
+
+    def test_rollup_window_boundary(self):
+        # days=7: المراجعة قبل 6 أيام داخل النافذة، وقبل 7 أيام خارجها كما في الاستعلام الأصلي
+        for rating, days_ago in [(5, 6), (1, 7), (2, 8)]:
+            self.add_review(self.product, rating, days_ago=days_ago)
+        self.add_review(self.other, 4, days_ago=7)
+
+        trend = get_product_rating_trend(self.product.id, days=7, use_rollup=True)
+        self.assertEqual((trend['total_reviews'], trend['average_rating']), (1, 5))
+        self.assertEqual(trend, get_product_rating_trend(self.product.id, days=7))
+        self.assertEqual(
+            get_top_rated_products(days=7, use_rollup=True),
+            [{'product_id': self.product.id, 'name': 'Phone', 'avg_rating': 5}],
+        )
+
+
+class StreamingCSVExportTests(APITestCase):
+    """CSV exports stream rows from a single query instead of building the file in memory"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.reviewer = User.objects.create_user(username='reviewer', password='pass123')
+        self.client.force_authenticate(user=self.owner)
+
+    def test_products_csv_streams_from_one_query(self):
+        for i in range(5):
+            product = Product.objects.create(name=f'Product {i}', description='Desc', user=self.owner)
+            for rating in range(1, i + 1):
+                Review.objects.create(product=product, user=self.reviewer, rating=rating, review_text='Fine')
+
+        response = self.client.get('/api/analytics/export-reviews/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(lines[0], 'Product ID,Product Name,Average Rating,Total Reviews')
+        self.assertEqual(len(lines), 6)
+        first, last = Product.objects.order_by('id').first(), Product.objects.order_by('id').last()
+        self.assertEqual(lines[1], f'{first.id},Product 0,0,0')
+        self.assertEqual(lines[5], f'{last.id},Product 4,2.5,4')
+
+    def test_export_reviews_to_csv_streams(self):
+        product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        review = Review.objects.create(product=product, user=self.reviewer, rating=4, review_text='Good, really')
+
+        response = export_reviews_to_csv(Review.objects.all())
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="reviews.csv"')
+        self.assertEqual(lines[1], f'{review.id},reviewer,4,"Good, really"')
+
+
+class ProductsAnalyticsBatchTests(CatalogTestCase):
+    """Per-product analytics computed for all products at once match the per-product functions"""
+
+    TEXTS = ['great battery life', 'battery died quickly, great screen', 'screen broke after a week']
+
+    def catalog_reviews(self, i):
+        return [
+            {'rating': (i + j) % 5 + 1, 'review_text': self.TEXTS[(i + j) % 3], 'is_visible': j % 2 == 0}
+            for j in range(i % 4 + 3)
+        ]
+
+    def create_catalog(self, products):
+        super().create_catalog(products)
+        Product.objects.create(name='No reviews', description='Desc', user=self.owner)
+
+    def test_batch_matches_per_product_functions(self):
+        self.create_catalog(6)
+        by_id = lambda review: review['review_id']
+        # الدوال الفردية لا تحدد ترتيب المراجعات، لذلك نقارن النتائج كاملة دون الترتيب
+        for product, data in iter_products_analytics(Product.objects.all(), words_limit=50, low_rating_limit=50):
+            self.assertEqual(data['rating_trend'], get_product_rating_trend(product.id, use_rollup=True))
+            self.assertEqual(
+                sorted(data['most_common_words']), sorted(get_most_common_words_in_reviews(product.id, limit=50))
+            )
+            self.assertEqual(
+                sorted(data['low_rating_reviews'], key=by_id),
+                sorted(get_low_rating_reviews(product.id, limit=50), key=by_id),
+            )
+
+        _, data = next(iter_products_analytics(Product.objects.all(), low_rating_limit=1))
+        self.assertEqual(len(data['low_rating_reviews']), 1)
+
+    def export_excel(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/analytics/export-reviews-excel/')
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return load_workbook(BytesIO(content)).active, len(queries)
+
+    def test_excel_export_query_count_does_not_grow(self):
+        self.create_catalog(2)
+        sheet, small = self.export_excel()
+        self.assertEqual(sheet.max_row, 4)
+
+        self.create_catalog(8)
+        sheet, large = self.export_excel()
+        self.assertEqual(large, small)
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][-1], 'Pending Reviews Count')
+        self.assertEqual({row[-1] for row in rows[1:]}, {Review.objects.filter(is_visible=False).count()})
+
+
+class ExportJobTests(APITestCase):
+    """Exports run as background jobs that can be polled and downloaded"""
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_dir, ignore_errors=True)
+        settings_override = override_settings(EXPORT_JOBS_DIR=self.export_dir, EXPORT_JOBS_MAX_PER_USER=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.other = User.objects.create_user(username='other', password='pass123')
+        self.client.force_authenticate(user=self.owner)
+        product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        Review.objects.create(product=product, user=self.other, rating=4, review_text='Good battery')
+
+    def start_job(self, kind):
+        # المهمة تُرسل إلى العامل بعد الـ commit؛ في الاختبار ننفذها مباشرة
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post('/api/exports/', {'kind': kind}, format='json')
+        if response.status_code == status.HTTP_202_ACCEPTED:
+            self.assertEqual(len(callbacks), 1)
+        return response
+
+    def test_job_lifecycle_csv(self):
+        response = self.start_job('products_csv')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        job_id = response.data['id']
+
+        response = self.client.get(f'/api/exports/{job_id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        run_export_job(job_id)
+        run_export_job(job_id)  # تشغيل مكرر لا يعيد العمل
+        response = self.client.get(f'/api/exports/{job_id}/')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual((response.data['progress'], response.data['total']), (1, 1))
+        self.assertTrue(response.data['download_url'].endswith(f'/api/exports/{job_id}/download/'))
+
+        response = self.client.get(f'/api/exports/{job_id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Product ID,Product Name,Average Rating,Total Reviews')
+        self.assertTrue(lines[1].endswith(',Phone,4.0,1'))
+
+    def test_excel_job_and_ownership(self):
+        job_id = self.start_job('products_xlsx').data['id']
+        run_export_job(job_id)
+        response = self.client.get(f'/api/exports/{job_id}/download/')
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.cell(row=2, column=2).value, 'Phone')
+
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get(f'/api/exports/{job_id}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/exports/').data, [])
+
+    def test_active_jobs_are_limited_per_user(self):
+        self.start_job('products_csv')
+        self.start_job('products_csv')
+        self.assertEqual(self.start_job('products_csv').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.start_job('unknown').status_code, status.HTTP_400_BAD_REQUEST)
+
+        run_export_job(ExportJob.objects.filter(user=self.owner).first().pk)
+        self.assertEqual(self.start_job('products_csv').status_code, status.HTTP_202_ACCEPTED)
+
+    def test_abandoned_jobs_are_recovered(self):
+        # عملية توقفت: مهمة جارية بلا تقدم ومهمة معلقة لم تُنفذ
+        running_id = self.start_job('products_csv').data['id']
+        pending_id = self.start_job('products_csv').data['id']
+        stale = timezone.now() - timedelta(minutes=11)
+        ExportJob.objects.filter(pk=running_id).update(status='running', updated_at=stale)
+        ExportJob.objects.filter(pk=pending_id).update(updated_at=stale)
+        self.assertEqual(recover_export_jobs(), ([pending_id], 1))
+        self.assertEqual(ExportJob.objects.get(pk=running_id).status, 'failed')
+        # المهام المتروكة لا تمنع المستخدم من تصدير جديد
+        self.assertEqual(self.start_job('products_csv').status_code, status.HTTP_202_ACCEPTED)
+        run_export_job(pending_id)
+        self.assertEqual(ExportJob.objects.get(pk=pending_id).status, 'done')
+
+    def test_jobs_removed_while_running_leave_no_file(self):
+        # أثناء كتابة الملف: المستخدم يحذف المهمة، أو تعتبرها عملية أخرى متروكة
+        for interrupt, statuses in (
+            (lambda jobs: jobs.delete(), []),
+            (lambda jobs: jobs.update(status='failed'), ['failed']),
+        ):
+            jobs = ExportJob.objects.filter(pk=self.start_job('products_csv').data['id'])
+            interrupted = []
+
+            def during_progress(execute, sql, params, many, context):
+                if 'SET "progress"' in sql and not interrupted:
+                    interrupted.append(interrupt(jobs))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(during_progress):
+                run_export_job(jobs.get().pk)
+            self.assertEqual(list(jobs.values_list('status', flat=True)), statuses)
+            self.assertEqual(os.listdir(self.export_dir), [])
+
+    def test_expired_jobs_are_cleaned_up(self):
+        job_id = self.start_job('products_csv').data['id']
+        run_export_job(job_id)
+        path = ExportJob.objects.get(pk=job_id).file_path
+        self.assertTrue(os.path.exists(path))
+
+        ExportJob.objects.filter(pk=job_id).update(created_at=timezone.now() - timedelta(days=2))
+        call_command('cleanup_export_jobs', stdout=StringIO())
+        self.assertFalse(ExportJob.objects.filter(pk=job_id).exists())
+        self.assertFalse(os.path.exists(path))
+
+
+class AllProductsAnalyticsViewTests(CatalogTestCase):
+    """All-products analytics are paginated and computed in a fixed number of queries"""
+
+    def catalog_reviews(self, i):
+        return [
+            {'rating': 1, 'review_text': 'Broken screen'}, {'rating': 5, 'review_text': 'Great screen'},
+            *[{'rating': 4, 'review_text': 'Good battery'}] * (i % 3),
+        ]
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.create_catalog(12)
+        small_page, small = self.get_counted('/api/analytics/all/?page_size=2')
+        large_page, large = self.get_counted('/api/analytics/all/?page_size=10')
+        self.assertEqual(large, small)
+        self.assertEqual(len(large_page.data['products_analytics']), 10)
+
+        first = small_page.data['products_analytics'][0]
+        self.assertEqual(first['most_common_words'], [('screen', 2), ('broken', 1), ('great', 1)])
+        self.assertEqual(first['low_rating_reviews'][0]['user'], 'reviewer')
+        self.assertEqual(first['rating_trend']['total_reviews'], 2)
+
+    def test_pages_cover_the_catalog(self):
+        self.create_catalog(5)
+        pages, url = [], '/api/analytics/all/?page_size=2'
+        while url:
+            page = self.client.get(url).data
+            self.assertEqual(page['count'], 5)
+            self.assertEqual(page['previous'] is None, not pages)
+            pages.append(page['products_analytics'])
+            url = page['next']
+        self.assertEqual(
+            [[item['name'] for item in page] for page in pages],
+            [['Product 0', 'Product 1'], ['Product 2', 'Product 3'], ['Product 4']],
+        )
+
+        # ✅ قيم كل منتج في صفحته، لا عدد الاستعلامات فقط
+        for i, item in enumerate(item for page in pages for item in page):
+            product = Product.objects.get(pk=item['product_id'])
+            self.assertEqual(product.name, f'Product {i}')
+            extra = i % 3
+            self.assertEqual(item['rating_trend'], {
+                'average_rating': round((1 + 5 + 4 * extra) / (2 + extra), 2),
+                'total_reviews': 2 + extra,
+                'trend_days': 30,
+            })
+            words = Counter({'screen': 2, 'broken': 1, 'great': 1, 'good': extra, 'battery': extra})
+            self.assertEqual(
+                item['most_common_words'],
+                sorted(((word, count) for word, count in words.items() if count), key=lambda pair: (-pair[1], pair[0])),
+            )
+            broken = product.reviews.get(rating=1)
+            self.assertEqual(item['low_rating_reviews'], [
+                {'review_id': broken.id, 'user': 'reviewer', 'rating': 1, 'review_text': 'Broken screen'},
+            ])
+
+
+class WordFrequencyTests(TestCase):
+    """The streaming word counter gives the same answer as joining every review"""
+
+    TEXTS = [
+        'Great battery, great screen!', 'The screen cracked; battery fine',
+        'Screen SCREEN screen', 'meh', 'Delivery was slow but the battery lasts',
+    ]
+
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=owner)
+        for text in self.TEXTS * 3:
+            Review.objects.create(product=self.product, user=owner, rating=3, review_text=text)
+
+    def joined_count(self, texts, limit):
+        # التنفيذ السابق: نص واحد كبير ثم Counter
+        words = re.findall(r'\b\w{4,}\b', ' '.join(text.lower() for text in texts))
+        return Counter(words).most_common(limit)
+
+    def test_matches_previous_implementation(self):
+        texts = list(Review.objects.values_list('review_text', flat=True))
+        for limit in (1, 3, 50):
+            self.assertEqual(get_most_common_words_in_reviews(self.product.id, limit=limit, use_index=False),
+                             self.joined_count(texts, limit))
+        # من جدول عدد الكلمات: نفس الأعداد، والتساوي مرتب أبجديًا
+        self.assertEqual(
+            get_most_common_words_in_reviews(self.product.id, limit=50),
+            sorted(self.joined_count(texts, 50), key=lambda item: (-item[1], item[0])),
+        )
+        self.assertEqual(most_common_words(texts, 50, chunk_size=2), self.joined_count(texts, 50))
+
+    def test_process_pool_gives_same_result(self):
+        texts = self.TEXTS * 40
+        self.assertEqual(
+            most_common_words(texts, 50, processes=2, chunk_size=7),
+            most_common_words(texts, 50),
+        )
+
+    def test_stop_words(self):
+        counts = count_words(self.TEXTS, stop_words=['Screen', 'the'])
+        self.assertNotIn('screen', counts)
+        self.assertEqual(counts['battery'], 3)
+
+    def test_arabic_normalization(self):
+        texts = ['منتج مُمتاز جدا', 'منتج ممتاز', 'أفضل افضل']
+        self.assertEqual(count_words(texts)['ممتاز'], 1)  # التشكيل يقسم الكلمة
+        counts = count_words(texts, normalize_arabic=True)
+        self.assertEqual(counts['ممتاز'], 2)
+        self.assertEqual(counts['افضل'], 2)
+
+
+class SpaceSavingSketchTests(TestCase):
+    """The approximate word counter stays within its reported error bounds"""
+
+    def zipf_stream(self, size, seed=3):
+        rng = random.Random(seed)
+        vocabulary = [f'word{i}' for i in range(2000)]
+        weights = [1 / (rank + 1) ** 1.2 for rank in range(len(vocabulary))]
+        return rng.choices(vocabulary, weights=weights, k=size)
+
+    def assertWithinBounds(self, sketch, exact):
+        for word, count, error in sketch.most_common():
+            self.assertLessEqual(count - error, exact[word])
+            self.assertGreaterEqual(count, exact[word])
+        untracked = [exact[word] for word in exact if word not in sketch.counts]
+        self.assertLessEqual(max(untracked), sketch.floor)
+
+    def test_bounds_and_heavy_hitters(self):
+        stream = self.zipf_stream(50000)
+        exact = Counter(stream)
+        sketch = SpaceSaving(200)
+        for word in stream:
+            sketch.add(word)
+
+        self.assertEqual(len(sketch.counts), 200)
+        self.assertLessEqual(sketch.floor, sketch.total / sketch.capacity)
+        self.assertWithinBounds(sketch, exact)
+        self.assertEqual([word for word, _, _ in sketch.most_common(5)], [word for word, _ in exact.most_common(5)])
+
+    def test_merged_shards_keep_bounds(self):
+        stream = self.zipf_stream(60000)
+        shards = [SpaceSaving(200) for _ in range(3)]
+        for index, word in enumerate(stream):
+            shards[index % 3].add(word)
+        merged = shards[0].merge(shards[1]).merge(shards[2])
+
+        self.assertEqual(merged.total, len(stream))
+        self.assertWithinBounds(merged, Counter(stream))
+
+    def test_small_corpus_is_exact(self):
+        texts = ['Great battery, great screen!', 'The screen cracked; battery fine']
+        sketch = sketch_words(texts, capacity=100, chunk_size=1)
+        self.assertEqual(
+            [(word, count) for word, count, _ in sketch.most_common()],
+            sorted(count_words(texts).items(), key=lambda item: (-item[1], item[0])),
+        )
+        self.assertEqual(sketch.floor, 0)
+
+    def test_approximate_mode_of_analytics(self):
+        owner = User.objects.create_user(username='owner', password='pass123')
+        product = Product.objects.create(name='Phone', description='Desc', user=owner)
+        for text in ['Great screen', 'Great battery', 'Screen great']:
+            Review.objects.create(product=product, user=owner, rating=4, review_text=text)
+        # عدادان فقط: battery أخذت مكان screen (العدد 2) فعددها التقديري 3 بخطأ حتى 2
+        self.assertEqual(
+            get_most_common_words_in_reviews(limit=2, approximate=True, sketch_size=2),
+            [('battery', 3, 2), ('great', 3, 0)],
+        )
+
+
+class ReviewTermCountTests(TestCase):
+    """The per-product word counts follow review writes"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.other = Product.objects.create(name='Laptop', description='Desc', user=self.owner)
+
+    def terms(self):
+        return sorted(ReviewTermCount.objects.filter(count__gt=0).values_list('product_id', 'term', 'count', 'visible_count'))
+
+    def test_counts_follow_review_lifecycle(self):
+        review = Review.objects.create(product=self.product, user=self.owner, rating=4, review_text='Great screen great')
+        Review.objects.create(product=self.product, user=self.owner, rating=2, review_text='Screen broke', is_visible=True)
+        self.assertEqual(get_most_common_words_in_reviews(self.product.id), [('great', 2), ('screen', 2), ('broke', 1)])
+
+        review = Review.objects.get(pk=review.pk)
+        review.is_visible = True
+        review.save()
+        self.assertEqual(ReviewTermCount.objects.get(product=self.product, term='screen').visible_count, 2)
+
+        review.review_text = 'Battery drains fast'
+        review.save(update_fields=['review_text'])
+        self.assertFalse(ReviewTermCount.objects.filter(term='great').exists())
+        self.assertEqual(ReviewTermCount.objects.get(product=self.product, term='battery').visible_count, 1)
+
+        review.product = self.other
+        review.save()
+        Review.objects.filter(review_text='Screen broke').get().delete()
+        self.assertEqual(
+            self.terms(),
+            [(self.other.id, 'battery', 1, 1), (self.other.id, 'drains', 1, 1), (self.other.id, 'fast', 1, 1)],
+        )
+
+        incremental = self.terms()
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertEqual(self.terms(), incremental)
+
+    def test_queries_do_not_grow_with_text_length(self):
+        def create(words):
+            with CaptureQueriesContext(connection) as queries:
+                Review.objects.create(
+                    product=self.product, user=self.owner, rating=3, review_text=' '.join(f'word{i}' for i in range(words))
+                )
+            return len(queries)
+
+        create(1)  # صف الملخص اليومي يُنشأ مع أول مراجعة
+        self.assertEqual(create(5), create(150))  # (حتى حد المتغيرات في دفعة bulk_create على SQLite)
+        self.assertEqual(ReviewTermCount.objects.get(product=self.product, term='word4').count, 2)
+
+    def test_all_products_and_stop_words(self):
+        Review.objects.create(product=self.product, user=self.owner, rating=4, review_text='Good value good')
+        Review.objects.create(product=self.other, user=self.owner, rating=4, review_text='Good keyboard')
+        self.assertEqual(get_most_common_words_in_reviews(), [('good', 3), ('keyboard', 1), ('value', 1)])
+        self.assertEqual(get_most_common_words_in_reviews(stop_words=['GOOD']), [('keyboard', 1), ('value', 1)])
+
+
+class ReviewSearchTests(APITestCase):
+    """Keyword search through the FTS5 review index"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.other = Product.objects.create(name='Laptop', description='Desc', user=self.owner)
+        self.client.force_authenticate(user=self.owner)
+        self.battery = Review.objects.create(
+            product=self.product, user=self.owner, rating=5, review_text='Battery life is great, battery lasts days'
+        )
+        self.screen = Review.objects.create(
+            product=self.product, user=self.owner, rating=2, review_text='The screen is great but the battery is weak'
+        )
+        self.laptop = Review.objects.create(
+            product=self.other, user=self.owner, rating=4, review_text='Batteries included, life changing keyboard'
+        )
+
+    def ids(self, keyword, **kwargs):
+        return [review.id for review in search_reviews_by_keyword(keyword=keyword, **kwargs)]
+
+    def test_query_parsing(self):
+        self.assertEqual(fts_query('battery life'), '"battery" "life"')
+        self.assertEqual(fts_query('"battery life" batt*'), '"battery life" "batt" *')
+        self.assertEqual(fts_query('wi-fi NEAR(x) OR'), '"wi fi" "NEAR x" "OR"')
+        self.assertIsNone(fts_query('!! "" *'))
+
+    def test_words_phrases_prefixes_and_ranking(self):
+        # المراجعة التي تتكرر فيها الكلمة أولًا
+        self.assertEqual(self.ids('battery'), [self.battery.id, self.screen.id])
+        self.assertEqual(self.ids('"battery life"'), [self.battery.id])
+        self.assertEqual(sorted(self.ids('batter*')), [self.battery.id, self.screen.id, self.laptop.id])
+        self.assertEqual(self.ids('great weak'), [self.screen.id])
+        self.assertEqual(self.ids('batter*', product_id=self.other.id), [self.laptop.id])
+        self.assertEqual(self.ids('AND'), [])
+
+        review = search_reviews_by_keyword(keyword='"battery life"')[0]
+        self.assertEqual(review_snippet(review, '"battery life"'), '<mark>Battery life</mark> is great, battery lasts days')
+
+    def test_snippets_escape_review_markup(self):
+        Review.objects.create(
+            product=self.other, user=self.owner, rating=1,
+            review_text='<script>alert(1)</script> battery & "charger" <b>bad</b>',
+        )
+        snippets = [
+            self.client.get(reverse('keyword_search'), {'keyword': 'charger'}).data['reviews'][0]['snippet'],
+            review_snippet(search_reviews_by_keyword(keyword='charger', use_index=False)[0], 'charger'),
+        ]
+        for snippet in snippets:
+            self.assertNotIn('<script>', snippet)
+            self.assertNotIn('<b>', snippet)
+            self.assertIn('&lt;script&gt;', snippet)
+            self.assertIn('<mark>charger</mark>', snippet)
+        self.assertEqual(
+            highlight('<i>battery</i>', 'battery'), '&lt;i&gt;<mark>battery</mark>&lt;/i&gt;'
+        )
+
+    @override_settings(SEARCH_RANK_LIMIT=1)
+    def test_newest_first_above_rank_limit(self):
+        self.assertEqual(self.ids('battery'), [self.screen.id, self.battery.id])
+        self.assertEqual(self.ids('"battery life"'), [self.battery.id])
+
+    def test_index_follows_review_writes(self):
+        self.battery.review_text = 'Camera is sharp'
+        self.battery.save()
+        Review.objects.filter(pk=self.screen.pk).update(review_text='Speaker is loud')
+        self.laptop.delete()
+        self.assertEqual(self.ids('battery'), [])
+        self.assertEqual(self.ids('camera'), [self.battery.id])
+        self.assertEqual(self.ids('loud'), [self.screen.id])
+
+    def test_substring_fallback(self):
+        self.assertEqual(sorted(self.ids('batter', use_index=False)), [self.battery.id, self.screen.id, self.laptop.id])
+        self.assertEqual(self.ids('batter'), [])
+
+    def test_keyword_search_view_is_paginated(self):
+        url = reverse('keyword_search')
+        response = self.client.get(url, {'keyword': 'batter*', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results_count'], 3)
+        self.assertEqual(len(response.data['reviews']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIn('<mark>', response.data['reviews'][0]['snippet'])
+
+        response = self.client.get(url, {'keyword': 'batter*', 'product_id': self.other.id})
+        self.assertEqual([r['id'] for r in response.data['reviews']], [self.laptop.id])
+
+    def test_review_list_search_uses_index(self):
+        Review.objects.filter(product=self.product).update(is_visible=True)
+        url = reverse('review-list-create', args=[self.product.id])
+        response = self.client.get(url, {'search': '"screen is great"'})
+        self.assertEqual([r['id'] for r in response.data['results']], [self.screen.id])
+
+    def test_repair_recreates_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {FTS_TABLE}_au')
+        Review.objects.filter(pk=self.battery.pk).update(review_text='Camera is sharp')
+        self.assertTrue(repair_review_fts())
+        self.assertFalse(repair_review_fts())
+        self.assertEqual(self.ids('camera'), [self.battery.id])
+        self.assertEqual(self.ids('"battery life"'), [])
+
+    def test_searches_do_not_look_up_the_index_table(self):
+        # ✅ وجود جدول الفهرس يُقرأ من sqlite_master مرة واحدة، لا مع كل بحث
+        self.assertTrue(fts_available())
+        url = reverse('keyword_search')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'keyword': 'battery'})
+            self.client.get(reverse('review-list-create', args=[self.product.id]), {'search': 'battery'})
+        self.assertFalse([q['sql'] for q in queries.captured_queries if 'sqlite_master' in q['sql']])
+
+
+class ReviewCacheTests(APITestCase):
+    """Cached product / review responses and their signal-based invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        review_cache.reset_stats()
+        view_counts.flush()
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.reader = User.objects.create_user(username='reader', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.review = Review.objects.create(
+            product=self.product, user=self.owner, rating=4, review_text='Solid phone', is_visible=True
+        )
+        self.client.force_authenticate(user=self.reader)
+
+    def test_rating_info_is_cached_until_a_review_changes(self):
+        url = f'/api/products/{self.product.id}/ratings/'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['approved_reviews'], 1)
+
+        Review.objects.create(product=self.product, user=self.reader, rating=2, review_text='Meh', is_visible=True)
+        response = self.client.get(url)
+        self.assertEqual(response.data['approved_reviews'], 2)
+        self.assertEqual(review_cache.stats()['product_rating'], {'hits': 1, 'misses': 2, 'hit_ratio': 0.333})
+
+        self.assertEqual(self.client.get('/api/products/999999/ratings/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_product_retrieve_follows_product_updates(self):
+        url = f'/api/products/{self.product.id}/'
+        self.client.get(url)
+        self.product.refresh_from_db()
+        self.product.name = 'Phone 2'
+        self.product.save()
+        self.assertEqual(self.client.get(url).data['name'], 'Phone 2')
+
+        review_url = f'/api/products/{self.product.id}/reviews/{self.review.id}/'
+        self.assertEqual(self.client.get(review_url).status_code, status.HTTP_200_OK)
+        self.product.delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(review_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_top_review_follows_interactions(self):
+        other = Review.objects.create(product=self.product, user=self.reader, rating=5, review_text='Love it', is_visible=True)
+        url = f'/api/products/{self.product.id}/top-review/'
+        self.assertEqual(self.client.get(url).data['id'], other.id)
+
+        interaction = ReviewInteraction.objects.create(review=self.review, user=self.reader, liked=True, is_helpful=True)
+        self.assertEqual(self.client.get(url).data['id'], self.review.id)
+        interaction.delete()
+        self.assertEqual(self.client.get(url).data['id'], other.id)
+
+    def test_review_list_is_shared_but_user_flags_are_not(self):
+        ReviewInteraction.objects.create(review=self.review, user=self.reader, liked=True, is_helpful=False)
+        url = f'/api/products/{self.product.id}/reviews/'
+        self.assertTrue(self.client.get(url).data['results'][0]['user_liked'])
+
+        stranger = User.objects.create_user(username='stranger', password='pass123')
+        self.client.force_authenticate(user=stranger)
+        with self.assertNumQueries(1):
+            first = self.client.get(url).data['results'][0]
+        self.assertFalse(first['user_liked'])
+        self.assertEqual(first['likes_count'], 1)
+
+        AdminReport.objects.create(review=self.review, user=stranger)
+        self.assertTrue(self.client.get(url).data['results'][0]['reported'])
+        # البلاغ يُلغي صلاحية الصفحة (وإلا بقي ETag القديم صالحاً رغم تغير reported)
+        self.assertEqual(review_cache.stats()['review_list'], {'hits': 1, 'misses': 2, 'hit_ratio': 0.333})
+
+    def test_review_detail_follows_flushed_views(self):
+        url = f'/api/products/{self.product.id}/reviews/{self.review.id}/'
+        self.client.get(url)
+        self.assertEqual(self.client.get(url).data['views_count'], 2)
+        view_counts.flush()
+        self.assertEqual(self.client.get(url).data['views_count'], 3)
+        # كتابة المشاهدات لا تُلغي صلاحية المدخلات؛ العدد الجديد يُقرأ فوقها
+        self.assertEqual(review_cache.stats()['review'], {'hits': 2, 'misses': 1, 'hit_ratio': 0.667})
+
+    def test_flushed_views_keep_product_entries(self):
+        list_url = f'/api/products/{self.product.id}/reviews/'
+        self.client.get(list_url)
+        self.client.get(f'/api/products/{self.product.id}/top-review/')
+        self.client.get(f'/api/products/{self.product.id}/reviews/{self.review.id}/')
+        view_counts.flush()
+        self.assertEqual(self.client.get(list_url).data['results'][0]['views_count'], 1)
+        self.assertEqual(self.client.get(f'/api/products/{self.product.id}/top-review/').data['views_count'], 1)
+        self.assertEqual(review_cache.stats()['review_list']['misses'], 1)
+        self.assertEqual(review_cache.stats()['top_review']['misses'], 1)
+
+    def test_rebuild_command_invalidates_everything(self):
+        url = f'/api/products/{self.product.id}/ratings/'
+        self.client.get(url)
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')  # دون إشارات
+        self.assertEqual(self.client.get(url).data['product'], 'Phone')
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertEqual(self.client.get(url).data['product'], 'Renamed')
+
+    def test_file_based_backend(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backend = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+        with override_settings(CACHES=backend):
+            url = f'/api/products/{self.product.id}/reviews/'
+            self.client.get(url)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(url).data['results'][0]['id'], self.review.id)
+            self.review.rating = 1
+            self.review.save()
+            self.assertEqual(self.client.get(url).data['results'][0]['rating'], 1)
+            self.assertTrue(os.listdir(directory))
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get('/api/admin/cache-stats/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.get(f'/api/products/{self.product.id}/ratings/')
+        self.client.force_authenticate(user=User.objects.create_user(username='staff', password='x', is_staff=True))
+        response = self.client.get('/api/admin/cache-stats/')
+        self.assertEqual(response.data['endpoints']['product_rating']['misses'], 1)
+        self.assertEqual(response.data['backend'], 'LocMemCache')  # test_runner.TEST_CACHES
+
+
+class ConditionalGetTests(APITestCase):
+    """ETag / Last-Modified on product and review reads"""
+
+    def setUp(self):
+        cache.clear()
+        view_counts.flush()
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.reader = User.objects.create_user(username='reader', password='pass123')
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.review = Review.objects.create(
+            product=self.product, user=self.owner, rating=4, review_text='Solid phone', is_visible=True
+        )
+        self.client.force_authenticate(user=self.reader)
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_every_read_endpoint_revalidates(self):
+        for url in (
+            f'/api/products/{self.product.id}/',
+            f'/api/products/{self.product.id}/ratings/',
+            f'/api/products/{self.product.id}/reviews/',
+            f'/api/products/{self.product.id}/reviews/{self.review.id}/',
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response['ETag'].startswith('W/"'))
+                self.assertIn('Last-Modified', response)
+                self.assertNotModified(url, response['ETag'])
+
+    def test_review_change_changes_etag(self):
+        url = f'/api/products/{self.product.id}/ratings/'
+        etag = self.client.get(url)['ETag']
+        Review.objects.create(product=self.product, user=self.reader, rating=2, review_text='Meh', is_visible=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['approved_reviews'], 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_like_and_report_change_review_etag(self):
+        url = f'/api/products/{self.product.id}/reviews/{self.review.id}/'
+        etag = self.client.get(url)['ETag']
+        ReviewInteraction.objects.create(review=self.review, user=self.reader, liked=True, is_helpful=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['user_liked'])
+
+        etag = response['ETag']
+        AdminReport.objects.create(review=self.review, user=self.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['reported'])
+
+    def test_etag_of_review_reads_depends_on_user(self):
+        url = f'/api/products/{self.product.id}/reviews/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.owner)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        # بيانات المنتج لا تعتمد على المستخدم
+        url = f'/api/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.reader)
+        self.assertNotModified(url, etag)
+
+    def test_if_modified_since(self):
+        url = f'/api/products/{self.product.id}/reviews/{self.review.id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Review.objects.filter(pk=self.review.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        review_cache.invalidate('review', self.review.id)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, status.HTTP_200_OK)
+
+    def test_not_modified_is_not_counted_as_a_view(self):
+        url = f'/api/products/{self.product.id}/reviews/{self.review.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        view_counts.flush()
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views_count, 1)
+
+    def test_counted_views_keep_etags(self):
+        detail_url = f'/api/products/{self.product.id}/reviews/{self.review.id}/'
+        urls = (
+            f'/api/products/{self.product.id}/',
+            f'/api/products/{self.product.id}/ratings/',
+            f'/api/products/{self.product.id}/reviews/',
+            detail_url,
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        self.client.get(detail_url)
+        view_counts.flush()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotModified(url, etags[url])
+        self.assertEqual(self.client.get(f'/api/products/{self.product.id}/reviews/').data['results'][0]['views_count'], 2)
+
+    def test_process_local_cache_is_reported(self):
+        # نسخ ETag في LocMemCache لا تصلها تغييرات العمليات الأخرى
+        self.assertEqual([w.id for w in check_review_cache()], ['products.W001'])
+        self.assertIn('products.W001', [w.id for w in checks.run_checks(tags=[checks.Tags.caches])])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+        with override_settings(CACHES=shared):
+            self.assertEqual([w.id for w in check_review_cache()], [])
+
+
+class TopReviewRankingTests(APITestCase):
+    """Stored Wilson-score ranking behind ProductTopReviewView"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.voters = [User.objects.create_user(username=f'voter{i}', password='pass123') for i in range(10)]
+        self.product = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.url = f'/api/products/{self.product.id}/top-review/'
+
+    def review(self, votes=(), is_visible=True):
+        """Review with one interaction per (liked, is_helpful) pair in `votes`."""
+        review = Review.objects.create(
+            product=self.product, user=self.owner, rating=4, review_text='Text', is_visible=is_visible
+        )
+        for user, (liked, is_helpful) in zip(self.voters, votes):
+            ReviewInteraction.objects.create(review=review, user=user, liked=liked, is_helpful=is_helpful)
+        review.refresh_from_db()
+        return review
+
+    def test_score_follows_interactions(self):
+        review = self.review([(True, True), (True, False), (False, False)])
+        self.assertEqual(review.votes_count, 3)
+        self.assertAlmostEqual(review.rank_score, wilson_score(3, 6))
+
+        interaction = review.interactions.get(user=self.voters[2])
+        interaction.is_helpful = True
+        interaction.save()
+        review.refresh_from_db()
+        self.assertAlmostEqual(review.rank_score, wilson_score(4, 6))
+
+        review.interactions.all().delete()
+        review.refresh_from_db()
+        self.assertEqual((review.votes_count, review.rank_score), (0, 0))
+
+    def test_rebuild_matches_incremental_score(self):
+        review = self.review([(True, True), (False, True), (True, False)])
+        Review.objects.filter(pk=review.pk).update(votes_count=0, rank_score=0)
+        rebuild_review_counters([review.pk])
+        rebuilt = Review.objects.get(pk=review.pk)
+        self.assertEqual(rebuilt.votes_count, 3)
+        self.assertAlmostEqual(rebuilt.rank_score, review.rank_score)
+
+    def test_confidence_beats_a_perfect_single_vote(self):
+        self.review([(True, True)] * 8 + [(False, False)] * 2)
+        single = self.review([(True, True)])
+        popular = Review.objects.exclude(pk=single.pk).get()
+        self.assertGreater(popular.rank_score, single.rank_score)
+        self.assertEqual(self.client.get(self.url).data['id'], popular.id)
+
+    def test_only_visible_reviews_are_ranked(self):
+        visible = self.review()
+        self.review([(True, True)] * 5, is_visible=False)
+        self.assertEqual(self.client.get(self.url).data['id'], visible.id)
+
+    def test_top_n(self):
+        low = self.review([(True, False)])
+        high = self.review([(True, True)] * 3)
+        self.review(is_visible=False)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'top': 5})
+        self.assertEqual([review['id'] for review in response.data], [high.id, low.id])
+        self.assertEqual(self.client.get(self.url, {'top': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'top': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_product_and_empty_product(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.url, {'top': 3}).data, [])
+        response = self.client.get('/api/products/999999/top-review/', {'top': 3})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReviewImportTests(APITestCase):
+    """Bulk review import: import_reviews command and POST /api/reviews/import/"""
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='staff', password='pass123', is_staff=True)
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.phone = Product.objects.create(name='Phone', description='Desc', user=self.staff)
+        self.laptop = Product.objects.create(name='Laptop', description='Desc', user=self.staff)
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def feed(self, records, name='feed.jsonl'):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w', encoding='utf-8') as feed:
+            for record in records:
+                feed.write((record if isinstance(record, str) else json.dumps(record)) + '\n')
+        return path
+
+    def records(self, count):
+        return [
+            {'product': (self.phone, self.laptop)[i % 2].id, 'user': 'author', 'rating': i % 5 + 1,
+             'review_text': f'battery review {i}', 'is_visible': i % 3 != 0}
+            for i in range(count)
+        ]
+
+    def snapshot(self):
+        return (
+            list(Product.objects.order_by('pk').values_list('rating_count', 'rating_sum', *RATING_COUNT_FIELDS)),
+            sorted(ReviewDailyStats.objects.values_list('product_id', 'day', 'review_count', 'visible_rating_sum')),
+            sorted(ReviewTermCount.objects.values_list('product_id', 'term', 'count', 'visible_count')),
+        )
+
+    def test_import_matches_a_rebuild(self):
+        Review.objects.create(product=self.phone, user=self.author, rating=2, review_text='battery old', is_visible=True)
+        path = self.feed(self.records(25))
+        call_command('import_reviews', path, batch_size=10, stdout=StringIO())
+
+        self.assertEqual(Review.objects.count(), 26)
+        imported = self.snapshot()
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertEqual(imported, self.snapshot())
+        # الفهرس النصي ومحفزاته
+        self.assertEqual(search_reviews_by_keyword(keyword='battery').count(), 26)
+        self.assertFalse(repair_review_fts())  # المحفزات أعيدت
+        job = ReviewImport.objects.get()
+        self.assertEqual((job.status, job.position, job.created_count, job.error_count), ('done', 25, 25, 0))
+
+    def test_invalid_records_are_rejected_alone(self):
+        path = self.feed([
+            {'product': self.phone.id, 'user': 'author', 'rating': 5, 'review_text': 'badword1 here'},
+            {'product': self.phone.id, 'user': 'author', 'rating': 9, 'review_text': 'x'},
+            {'product': 999999, 'user': 'nobody', 'rating': 3, 'review_text': 'x'},
+            'not json',
+            {'product': self.phone.id, 'rating': 4, 'review_text': 'no author', 'is_visible': 'maybe'},
+        ])
+        stderr = StringIO()
+        call_command('import_reviews', path, stdout=StringIO(), stderr=stderr)
+        review = Review.objects.get()
+        self.assertTrue(review.is_offensive)
+        self.assertEqual(review.flagged_terms, ['badword1'])
+        self.assertFalse(review.is_visible)
+        errors = stderr.getvalue()
+        for expected in ('Record 1', 'rating', 'Product 999999', "User 'nobody'", 'Record 3', 'Invalid JSON', 'is_visible'):
+            self.assertIn(expected, errors)
+
+    def test_csv_and_default_user(self):
+        path = os.path.join(self.tmpdir, 'feed.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as feed:
+            writer = csv.writer(feed)
+            writer.writerow(['product', 'rating', 'review_text', 'is_visible'])
+            writer.writerow([self.phone.id, 4, 'Good, really', 'true'])
+            writer.writerow([self.laptop.id, 2, 'Meh', '0'])
+        call_command('import_reviews', path, user='author', stdout=StringIO())
+        self.assertEqual(
+            sorted(Review.objects.values_list('user__username', 'review_text', 'is_visible')),
+            [('author', 'Good, really', True), ('author', 'Meh', False)],
+        )
+        self.phone.refresh_from_db()
+        self.assertEqual((self.phone.rating_count, self.phone.average_rating), (1, 4))
+
+    def test_resume_after_failure(self):
+        path = self.feed(self.records(7))
+        checkpoint = ReviewImport.objects.create(source=path)
+
+        def crash(importer):
+            raise RuntimeError('disk full')
+
+        with open(path, encoding='utf-8') as stream:
+            with self.assertRaises(RuntimeError):
+                ReviewImporter(batch_size=3, checkpoint=checkpoint).run(read_records(stream, 'jsonl'), progress=crash)
+        finish_import(checkpoint, error='disk full')
+        self.assertEqual(Review.objects.count(), 3)
+
+        out = StringIO()
+        call_command('import_reviews', path, batch_size=3, resume=True, stdout=out)
+        self.assertIn('Resuming after record 3', out.getvalue())
+        self.assertEqual(
+            sorted(Review.objects.values_list('review_text', flat=True)), sorted(f'battery review {i}' for i in range(7))
+        )
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.status, checkpoint.created_count), ('done', 7))
+        with self.assertRaises(CommandError):
+            call_command('import_reviews', path, resume=True, stdout=StringIO())
+
+    def test_api_import(self):
+        url = '/api/reviews/import/'
+        ratings_url = f'/api/products/{self.phone.id}/ratings/'
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.client.post(url, [], format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.staff)
+        self.assertEqual(self.client.get(ratings_url).data['approved_reviews'], 0)
+        records = self.records(4) + ['oops']
+        response = self.client.post(url, {'reviews': records}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['rejected']), (4, 1))
+        self.assertEqual(response.data['errors'][0]['index'], 4)
+        # الكاش أُلغي للمنتجات المستوردة
+        self.assertEqual(self.client.get(ratings_url).data['approved_reviews'], 1)
+
+        response = self.client.post(url, [{'product': self.phone.id, 'rating': 4, 'review_text': 'mine'}], format='json')
+        self.assertEqual(Review.objects.get(review_text='mine').user, self.staff)
+        self.assertEqual(self.client.post(url, [{'rating': 0}], format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(REVIEW_IMPORT_MAX_RECORDS=2):
+            response = self.client.post(url, self.records(3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_insert_reviews_writes_what_bulk_create_writes(self):
+        # ✅ insert_reviews يكتب الأعمدة بنفسه: أي حقل جديد في Review يجب أن يُراجع هناك قبل تعديل هذه القائمة
+        self.assertEqual([field.attname for field in Review._meta.concrete_fields], [
+            'id', 'product_id', 'user_id', 'rating', 'review_text', 'is_visible', 'created_at', 'updated_at',
+            'views_count', 'likes_count', 'helpful_count', 'interactions_count', 'votes_count', 'rank_score',
+            'is_offensive', 'flagged_terms',
+        ])
+        row = {'product_id': self.phone.id, 'user_id': self.author.id, 'rating': 2, 'review_text': 'Bad battery',
+               'is_visible': False, 'flagged_terms': ['battery'], 'is_offensive': True}
+        now = timezone.now()
+        insert_reviews([row], now)
+        Review.objects.bulk_create([Review(**row)])
+
+        columns = [field.attname for field in Review._meta.concrete_fields
+                   if field.attname not in ('id', 'created_at', 'updated_at')]
+        raw, orm = Review.objects.order_by('pk').values(*columns)
+        self.assertEqual(raw, orm)
+        self.assertEqual(Review.objects.order_by('pk').values_list('created_at', 'updated_at').first(), (now, now))
+
+
+class BulkModerationTests(APITestCase):
+    """POST /api/admin/reviews/bulk/: approve / reject / flag many reviews in one transaction"""
+    url = '/api/admin/reviews/bulk/'
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pass123')
+        self.other = User.objects.create_user(username='other', password='pass123')
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.phone = Product.objects.create(name='Phone', description='Desc', user=self.owner)
+        self.laptop = Product.objects.create(name='Laptop', description='Desc', user=self.owner)
+        self.foreign = Product.objects.create(name='Foreign', description='Desc', user=self.other)
+        self.pending = [
+            Review.objects.create(product=self.phone, user=self.author, rating=rating, review_text=f'battery {rating}')
+            for rating in (1, 2, 2, 5)
+        ]
+        self.visible = Review.objects.create(
+            product=self.laptop, user=self.author, rating=4, review_text='screen', is_visible=True
+        )
+        self.foreign_review = Review.objects.create(product=self.foreign, user=self.author, rating=3, review_text='x')
+        self.client.force_authenticate(user=self.owner)
+
+    def snapshot(self):
+        return (
+            list(Product.objects.order_by('pk').values_list('rating_count', 'rating_sum', *RATING_COUNT_FIELDS)),
+            sorted(ReviewDailyStats.objects.values_list('product_id', 'day', 'review_count', 'visible_count', 'visible_rating_sum')),
+            sorted(ReviewTermCount.objects.values_list('product_id', 'term', 'count', 'visible_count')),
+        )
+
+    def results(self, response):
+        return {item['id']: item['result'] for item in response.data['results']}
+
+    def test_approve_by_ids_with_per_item_results(self):
+        ids = [self.pending[0].id, self.visible.id, self.foreign_review.id, 999999]
+        response = self.client.post(self.url, {'action': 'approve', 'review_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.results(response), {
+            self.pending[0].id: 'approved', self.visible.id: 'unchanged',
+            self.foreign_review.id: 'forbidden', 999999: 'not_found',
+        })
+        self.assertEqual(response.data['counts'], {'approved': 1, 'unchanged': 1, 'forbidden': 1, 'not_found': 1})
+        self.assertTrue(Review.objects.get(pk=self.pending[0].id).is_visible)
+        self.assertFalse(Review.objects.get(pk=self.foreign_review.id).is_visible)
+        self.assertEqual(
+            list(Notification.objects.filter(user=self.author).values_list('message', flat=True)),
+            ["Your review for 'Phone' has been approved and is now visible."],
+        )
+        # QuerySet.update لا يرسل إشارات؛ المجاميع تُحدَّث مع ذلك
+        self.phone.refresh_from_db()
+        self.assertEqual((self.phone.rating_count, self.phone.rating_sum), (1, 1))
+        bulk = self.snapshot()
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertEqual(bulk, self.snapshot())
+
+    def test_reject_pending_low_rated_by_filter(self):
+        payload = {'action': 'reject', 'filter': {'product': self.phone.id, 'status': 'pending', 'max_rating': 2}}
+        with self.assertNumQueries(6):
+            # savepoint، المراجعات ومالكوها، update، bulk_create مرتان، release
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(self.results(response)), [review.id for review in self.pending[:3]])
+        self.assertEqual(response.data['counts'], {'rejected': 3})
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(
+            sorted(AdminReport.objects.values_list('review_id', 'user_id', 'status')),
+            [(review.id, self.owner.id, 'rejected') for review in self.pending[:3]],
+        )
+        self.assertEqual(
+            sorted(Notification.objects.filter(user=self.author).values_list('related_review_id', flat=True)),
+            [review.id for review in self.pending[:3]],
+        )
+
+    def test_reject_visible_and_flag_keep_aggregates(self):
+        response = self.client.post(self.url, {'action': 'reject', 'review_ids': [self.visible.id]}, format='json')
+        self.assertEqual(self.results(response), {self.visible.id: 'rejected'})
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.rating_count, 0)
+        self.assertEqual(ReviewTermCount.objects.get(product=self.laptop, term='screen').visible_count, 0)
+
+        response = self.client.post(
+            self.url, {'action': 'flag', 'filter': {'min_rating': 5}}, format='json'
+        )
+        self.assertEqual(self.results(response), {self.pending[3].id: 'flagged'})
+        self.assertEqual(AdminReport.objects.get(review=self.pending[3]).status, 'pending')
+        bulk = self.snapshot()
+        call_command('rebuild_product_aggregates', stdout=StringIO())
+        self.assertEqual(bulk, self.snapshot())
+
+    def test_invalidates_cached_reads(self):
+        list_url = f'/api/products/{self.phone.id}/reviews/'
+        detail_url = f'{list_url}{self.pending[0].id}/'
+        self.assertEqual(len(self.client.get(list_url).data['results']), 0)
+        etag = self.client.get(detail_url)['ETag']
+        self.client.post(self.url, {'action': 'approve', 'review_ids': [self.pending[0].id]}, format='json')
+        self.assertEqual(len(self.client.get(list_url).data['results']), 1)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        view_counts.flush()
+
+    def test_validation_and_limits(self):
+        for payload in (
+            {'action': 'delete', 'review_ids': [1]},
+            {'action': 'approve'},
+            {'action': 'approve', 'review_ids': [1], 'filter': {}},
+            {'action': 'approve', 'filter': {'max_rating': 9}},
+        ):
+            response = self.client.post(self.url, payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
+        with override_settings(REVIEW_BULK_MODERATION_MAX_ITEMS=2):
+            ids = [review.id for review in self.pending]
+            response = self.client.post(self.url, {'action': 'approve', 'review_ids': ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.post(self.url, {'action': 'approve', 'filter': {'status': 'pending'}}, format='json')
+            self.assertEqual(len(response.data['results']), 2)
+            self.assertTrue(response.data['has_more'])
+        self.client.force_authenticate(user=None)
+        response = self.client.post(self.url, {'action': 'approve', 'review_ids': [1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
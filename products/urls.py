@@ -4,10 +4,11 @@ from .views import ProductViewSet, RegisterView, LogoutView, ReviewListCreateVie
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from products.views import   ProductAnalyticsView,TopRatedProductsView, TopReviewersView, KeywordSearchView, ExportAllReviewsAnalyticsToCSV,AllProductsAnalyticsView,ExportReviewsToExcel,NotificationListView
+from products.views import   ProductAnalyticsView,TopRatedProductsView, TopReviewersView, KeywordSearchView, ExportAllReviewsAnalyticsToCSV,AllProductsAnalyticsView,ExportReviewsToExcel,NotificationListView,ExportJobViewSet,CacheStatsView,ReviewImportView,AdminBulkReviewActionView
 router = DefaultRouter()
 router.register('products', ProductViewSet, basename='product')
 router.register(r'review-interactions', ReviewInteractionViewSet, basename='reviewinteraction')
+router.register(r'exports', ExportJobViewSet, basename='exportjob')
 
 urlpatterns = [
     # Auth URLs
@@ -20,14 +21,17 @@ urlpatterns = [
     path('products/<int:product_id>/reviews/', ReviewListCreateView.as_view(), name='review-list-create'),
     path('products/<int:product_id>/reviews/<int:review_id>/', ReviewDetailView.as_view(), name='review-detail-by-product'),
     path('reviews/<int:pk>/', ReviewDetailView.as_view(), name='review-detail'),
+    path('reviews/import/', ReviewImportView.as_view(), name='review-import'),
     path('admin/reviews/<int:pk>/approve/', ApproveReviewView.as_view(), name='admin-review-approve'),
     path('products/<int:pk>/ratings/', ProductRatingInfoView.as_view(), name='product-ratings'),
     path('products/<int:pk>/top-review/', ProductTopReviewView.as_view(), name='product-top-review'),
 
     # Admin Insights & Reports URLs
     path('admin/reports/', AdminReportView.as_view(), name='admin-reports'),
+    path('admin/reviews/bulk/', AdminBulkReviewActionView.as_view(), name='admin-review-bulk-action'),
     path('admin/reviews/<int:review_id>/<str:action>/', AdminReviewActionView.as_view(), name='admin-review-action'),
     path('admin/dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('admin/cache-stats/', CacheStatsView.as_view(), name='admin-cache-stats'),
 
     path('notifications/', NotificationListView.as_view(), name='notifications'),
    ####ProductAnalytics
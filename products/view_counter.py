@@ -0,0 +1,132 @@
+"""
+Write-behind buffer for `Review.views_count`.
+
+Reading a review only records the view in memory; a background thread flushes
+the buffered increments every `VIEW_COUNT_FLUSH_INTERVAL` seconds with one
+`UPDATE ... SET views_count = views_count + n` per batch of reviews, so the
+hot read path never waits on SQLite's write lock and concurrent views are
+never lost. Increments being flushed still count in `pending_for` until their
+UPDATE commits, so `views_count` plus the pending views never goes backwards.
+Saving a review never writes `views_count` (`Review.stored_fields`), so an
+edit or approval from a copy loaded before a flush keeps the flushed views.
+Whatever is still pending is flushed when the process exits.
+
+VIEW_COUNT_FLUSH_INTERVAL:
+    > 0   flush in the background every N seconds (default 5)
+    0     write-through: flush on every view
+    None  no automatic flush (call `view_counts.flush()` yourself)
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5
+
+
+class ViewCountBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._in_flight = Counter()  # أخرجها flush() ولم يُلتزم UPDATE الخاص بها بعد
+        self._flusher = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+    @property
+    def pending_count(self):
+        """Number of view increments not yet written to the database."""
+        with self._lock:
+            return sum(self._pending.values()) + sum(self._in_flight.values())
+
+    def pending_for(self, review_id):
+        with self._lock:
+            return self._pending.get(review_id, 0) + self._in_flight.get(review_id, 0)
+
+    def increment(self, review_id, count=1):
+        with self._lock:
+            self._pending[review_id] += count
+
+        interval = self.flush_interval
+        if interval == 0:
+            self.flush()
+        elif interval is not None:
+            self._ensure_flusher()
+
+    def flush(self):
+        """Write all pending increments. Returns the number of increments written."""
+        from .models import Review
+
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._in_flight.update(pending)
+        if not pending:
+            return 0
+
+        # المراجعات التي لها نفس عدد الزيادات تُحدَّث باستعلام واحد
+        by_increment = defaultdict(list)
+        for review_id, count in pending.items():
+            by_increment[count].append(review_id)
+        try:
+            with transaction.atomic():
+                for count, review_ids in by_increment.items():
+                    Review.objects.filter(pk__in=review_ids).update(views_count=F('views_count') + count)
+        except Exception:
+            # نعيد الزيادات إلى المخزن لتتم المحاولة في الدفعة التالية
+            with self._lock:
+                self._in_flight -= pending
+                self._pending.update(pending)
+            raise
+        # أصبحت الزيادات في قاعدة البيانات: لا تُحسب مرتين
+        with self._lock:
+            self._in_flight -= pending
+        self._publish_counts(pending)
+        return sum(pending.values())
+
+    @staticmethod
+    def _publish_counts(review_ids):
+        # العدد الجديد يُقرأ فوق المراجعات المخزنة في الكاش، دون إلغاء صلاحيتها أو تغيير ETag (products/cache.py)
+        from .cache import review_cache
+        from .models import Review
+
+        review_cache.set_view_counts(dict(Review.objects.filter(pk__in=review_ids).values_list('pk', 'views_count')))
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            interval = self.flush_interval
+            if not interval:
+                return
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush %s buffered review views", self.pending_count)
+
+
+view_counts = ViewCountBuffer()
+
+
+@atexit.register
+def _flush_on_shutdown():
+    try:
+        view_counts.flush()
+    except Exception:
+        logger.exception("Failed to flush %s buffered review views on shutdown", view_counts.pending_count)
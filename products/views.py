@@ -4,14 +4,20 @@ from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
-from .models import Product, Review, Notification, AdminReport
-from .serializers import ProductSerializer, ReviewSerializer, UserSerializer ,ReviewInteraction , ReviewInteractionSerializer
+from .models import Product, Review, ReviewDailyStats, Notification, AdminReport
+from .serializers import ProductSerializer, ReviewSerializer, UserSerializer ,ReviewInteraction , ReviewInteractionSerializer, ExportJobSerializer
 from .permissions import IsOwnerOrReadOnly, IsProductOwner
+from .pagination import ProductPagination, ReviewKeysetPagination, SearchResultsPagination
+from .cache import review_cache, with_user_flags, with_view_counts
+from .conditional import conditional_response, make_etag, precondition_response
+from .search import ReviewSearchFilter, review_snippet
+from .view_counter import view_counts
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import PermissionDenied, NotFound
-from django.db.models import Count, Q , F
+from django.db.models import Avg, Count, Q , F, ExpressionWrapper, FloatField, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
 ## F to bring from database not python mem
 # =============================
 #  Register View
@@ -65,9 +71,11 @@ class LogoutView(APIView):
 #  Product ViewSet
 # =============================
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    # average_rating / review_count مخزنة على المنتج، فالقائمة كلها استعلامان فقط (العدد + الصفحة)
+    queryset = Product.objects.order_by('-created_at', '-id')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ProductPagination
 
     def get_permissions(self):
         if self.action in ['update', 'partial_update', 'destroy']:
@@ -81,25 +89,51 @@ class ProductViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            product_id = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        key = review_cache.key('product', [('product', product_id)])
+        etag = make_etag(key)
+        not_modified = precondition_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        data, last_modified = review_cache.fetch('product', key, self.product_entry)
+        return conditional_response(request, Response(data), etag, last_modified)
+
+    def product_entry(self):
+        product = self.get_object()
+        return self.get_serializer(product).data, product.updated_at
+
 
 # =============================
 #  Product Rating Info View
 # =============================
 class ProductRatingInfoView(APIView):
     def get(self, request, pk):
-        try:
-            product = Product.objects.get(pk=pk)
-        except Product.DoesNotExist:
+        key = review_cache.key('product_rating', [('product', pk)])
+        etag = make_etag(key)
+        not_modified = precondition_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        entry = review_cache.fetch('product_rating', key, lambda: self.rating_info(pk))
+        if entry is None:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        visible_reviews = product.reviews.filter(is_visible=True)
-        avg_rating = round(sum(r.rating for r in visible_reviews) / visible_reviews.count(), 1) if visible_reviews.exists() else 0
-
-        return Response({
+        data, last_modified = entry
+        return conditional_response(request, Response(data, status=status.HTTP_200_OK), etag, last_modified)
+
+    @staticmethod
+    def rating_info(pk):
+        product = Product.objects.filter(pk=pk).first()
+        if product is None:
+            return None
+        return {
             'product': product.name,
-            'average_rating': avg_rating,
-            'approved_reviews': visible_reviews.count()
-        }, status=status.HTTP_200_OK)
+            'average_rating': product.average_rating,
+            'approved_reviews': product.rating_count,
+            'rating_distribution': product.rating_distribution,
+        }, product.updated_at
 
 
 # =============================
@@ -110,15 +144,19 @@ from django.db.models import F
 class ReviewListCreateView(generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # الترتيب (?ordering=) والتقسيم إلى صفحات يتمان في ReviewKeysetPagination
+    pagination_class = ReviewKeysetPagination
+
+    # ?search= يستخدم فهرس FTS5 عند توفره (كلمات كاملة، "عبارات"، بادئات*)
+    filter_backends = [DjangoFilterBackend, ReviewSearchFilter]
     filterset_fields = ['rating']
     search_fields = ['review_text']
-    ordering_fields = ['created_at', 'rating', 'likes_count', 'helpful_count']
 
     def get_queryset(self):
         product_id = self.kwargs['product_id']
-        queryset = Review.objects.filter(product_id=product_id, is_visible=True)
+        queryset = Review.objects.for_listing(self.request.user).filter(product_id=product_id, is_visible=True)
+        # لـ Last-Modified: حذف/إخفاء مراجعة يغيّر updated_at للمنتج (aggregates.py)
+        queryset = queryset.annotate(product_updated_at=F('product__updated_at'))
 
         # تصفية حسب التقييم
         rating = self.request.query_params.get('rating')
@@ -130,21 +168,36 @@ class ReviewListCreateView(generics.ListCreateAPIView):
             except ValueError:
                 pass
 
-        # ترتيب حسب نوع معين
-        order_by = self.request.query_params.get('ordering')
-        if order_by:
-            if order_by == 'most_interactions':
-                queryset = queryset.annotate(
-                    total_interactions=F('likes_count') + F('helpful_count')
-                ).order_by('-total_interactions')
-            else:
-                try:
-                    queryset = queryset.order_by(order_by)
-                except Exception:
-                    pass  # تجاهل القيم غير الصحيحة
-
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # الصفحة نفسها مشتركة بين المستخدمين؛ user_liked / reported تُضاف لكل طلب
+        product_id = self.kwargs['product_id']
+        params = (request.get_host(), sorted(request.query_params.lists()))
+        key = review_cache.key('review_list', [('product', product_id)], params)
+        etag = make_etag(key, request.user)
+        not_modified = precondition_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        entry = review_cache.get('review_list', key)
+        if entry is not None:
+            data, last_modified = entry
+            with_view_counts(data['results'])
+            with_user_flags(data['results'], request.user)
+            response = Response(data)
+        else:
+            response = super().list(request, *args, **kwargs)
+            last_modified = self.last_modified
+            review_cache.set(key, (response.data, last_modified))
+        return conditional_response(request, response, etag, last_modified)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        self.last_modified = max(
+            (max(review.updated_at, review.product_updated_at) for review in page or ()), default=None
+        )
+        return page
+
     def perform_create(self, serializer):
         product_id = self.kwargs['product_id']
         product = Product.objects.get(id=product_id)
@@ -175,31 +228,44 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsOwnerOrReadOnly]
     lookup_url_kwarg = 'review_id'
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-
-        # زيادة عدد المشاهدات
-        instance.views_count += 1
-        instance.save(update_fields=['views_count'])
-
-        # تحديد إذا كان المستخدم تفاعل أو أبلغ عن المراجعة
-        user = request.user
-        user_liked = False
-        reported = False
+    def get_queryset(self):
+        # user_liked / reported محسوبة في نفس الاستعلام
+        return Review.objects.for_listing(self.request.user)
 
-        if user.is_authenticated:
-            user_liked = instance.interactions.filter(user=user, liked=True).exists()
-            reported = AdminReport.objects.filter(review=instance, user=user).exists()
+    def retrieve(self, request, *args, **kwargs):
+        review_id = kwargs.get(self.lookup_url_kwarg)
+        if review_id is None:
+            instance = self.get_object()
+            return self.counted_view(instance.pk, self.get_serializer(instance).data)
+
+        key = review_cache.key('review', [('review', review_id)])
+        etag = make_etag(key, request.user)
+        not_modified = precondition_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        entry = review_cache.get('review', key)
+        if entry is None:
+            instance = self.get_object()
+            data, last_modified = self.get_serializer(instance).data, instance.updated_at
+            review_cache.set(key, (data, last_modified))
+        else:
+            data, last_modified = entry
+            with_view_counts([data])
+            with_user_flags([data], request.user)
+        response = conditional_response(request, Response(data), etag, last_modified)
+        # 304 لا تُحتسب كمشاهدة (التحقق من نسخة محفوظة لدى العميل)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        response.data = self.counted_view(review_id, data).data
+        return response
 
-        
-        serializer = self.get_serializer(instance)
-        data = serializer.data.copy()  # عمل نسخة لتجنب مشاكل القراءة فقط
+    @staticmethod
+    def counted_view(review_id, data):
+        # زيادة عدد المشاهدات: تُجمع في الذاكرة وتُكتب على دفعات (view_counter.py)
+        view_counts.increment(review_id)
 
-        data.update({
-            'views_count': instance.views_count,
-            'user_liked': user_liked,
-            'reported': reported
-        })
+        data = data.copy()  # عمل نسخة لتجنب مشاكل القراءة فقط
+        data['views_count'] += view_counts.pending_for(review_id)
 
         return Response(data)
 
@@ -297,41 +363,62 @@ class ReviewInteractionViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='review/(?P<review_id>[^/.]+)/stats')
     def review_stats(self, request, review_id=None):
-        # إحصائيات التفاعل على مراجعة معينة
-        likes = ReviewInteraction.objects.filter(review_id=review_id, liked=True).count()
-        helpfuls = ReviewInteraction.objects.filter(review_id=review_id, is_helpful=True).count()
+        # إحصائيات التفاعل على مراجعة معينة (عدادات مخزنة على المراجعة)
+        counters = Review.objects.filter(pk=review_id).values('likes_count', 'helpful_count').first()
+        counters = counters or {'likes_count': 0, 'helpful_count': 0}
         return Response({
             "review_id": review_id,
-            "likes_count": likes,
-            "helpful_count": helpfuls,
+            "likes_count": counters['likes_count'],
+            "helpful_count": counters['helpful_count'],
         }, status=status.HTTP_200_OK)
 
 
 
 
 class ProductTopReviewView(APIView):
+    """
+    أفضل مراجعة ظاهرة للمنتج حسب rank_score المخزن (حد Wilson الأدنى، انظر aggregates.py)،
+    أو قائمة بأفضل N مراجعة مع ?top=N.
+    """
+    MAX_TOP = 50
+
     def get(self, request, pk):
+        top = request.query_params.get('top')
+        if top is not None:
+            try:
+                top = int(top)
+            except ValueError:
+                top = 0
+            if not 1 <= top <= self.MAX_TOP:
+                return Response(
+                    {'error': f'top must be an integer between 1 and {self.MAX_TOP}'}, status=status.HTTP_400_BAD_REQUEST
+                )
         # تأكد المنتج موجود
         try:
-            product = Product.objects.get(pk=pk)
+            data = review_cache.get_or_set(
+                'top_review', [('product', pk)], lambda: self.top_reviews(pk, top or 1), params=top
+            )
         except Product.DoesNotExist:
             return Response({"detail": "المنتج غير موجود."}, status=status.HTTP_404_NOT_FOUND)
-
-        # جلب مراجعات المنتج مع حساب عدد الإعجابات وعدد التقييمات كمفيد
-        reviews = Review.objects.filter(product=product).annotate(
-            likes_count=Count('interactions', filter=Q(interactions__liked=True)),
-            helpful_count=Count('interactions', filter=Q(interactions__is_helpful=True))
-        )
-
-        # ترتيب المراجعات حسب مجموع التفاعلات (الإعجابات + المفيد) نزولاً
-        reviews = reviews.annotate(total_interactions=F('likes_count') + F('helpful_count')).order_by('-total_interactions')
-
-        if not reviews.exists():
+        with_view_counts(data)
+        if top is not None:
+            return Response(data)
+        if not data:
             return Response({"detail": "لا توجد مراجعات لهذا المنتج."}, status=status.HTTP_404_NOT_FOUND)
-
-        top_review = reviews.first()
-        serializer = ReviewSerializer(top_review)
-        return Response(serializer.data)
+        return Response(data[0])
+
+    @staticmethod
+    def top_reviews(pk, limit):
+        # قراءة أول limit صفوف من الفهرس review_visible_rank_idx مباشرة
+        reviews = list(
+            Review.objects.filter(product_id=pk, is_visible=True)
+            .select_related('user')
+            .order_by('-rank_score', '-id')[:limit]
+        )
+        # استعلام وجود المنتج فقط عندما لا توجد مراجعات
+        if not reviews and not Product.objects.filter(pk=pk).exists():
+            raise Product.DoesNotExist
+        return ReviewSerializer(reviews, many=True).data
 
 ###################
 #### Notification ####
@@ -377,26 +464,19 @@ class AdminReportView(APIView):
         try:
             # Get user's products
             user_products = Product.objects.filter(user=request.user)
-            product_ids = user_products.values_list('id', flat=True)
-            
+
             # Get all reviews for user's products
-            all_reviews = Review.objects.filter(product_id__in=product_ids)
-            
-            # 1. Unapproved reviews (pending approval)
-            unapproved_reviews = all_reviews.filter(is_visible=False)
-            unapproved_count = unapproved_reviews.count()
-            
-            # 2. Low-rated reviews (1-2 stars)
-            low_rated_reviews = all_reviews.filter(rating__in=[1, 2])
-            low_rated_count = low_rated_reviews.count()
-            
-            # 3. Reviews with offensive content
-            offensive_reviews = []
-            for review in all_reviews:
-                if review.contains_bad_words():
-                    offensive_reviews.append(review)
-            offensive_count = len(offensive_reviews)
-            
+            all_reviews = Review.objects.filter(product__user=request.user)
+
+            # 1-3. Summary (unapproved, low-rated, offensive...) in one aggregate query
+            summary = all_reviews.aggregate(
+                total_reviews=Count('id'),
+                unapproved_reviews=Count('id', filter=Q(is_visible=False)),
+                low_rated_reviews=Count('id', filter=Q(rating__in=[1, 2])),
+                offensive_reviews=Count('id', filter=Q(is_offensive=True)),
+                approved_reviews=Count('id', filter=Q(is_visible=True)),
+            )
+
             # 4. Get filter parameters from request
             filter_type = request.query_params.get('filter', 'all')
             product_id = request.query_params.get('product_id')
@@ -425,44 +505,41 @@ class AdminReportView(APIView):
             elif filter_type == 'low_rated':
                 filtered_reviews = filtered_reviews.filter(rating__in=[1, 2])
             elif filter_type == 'offensive':
-                offensive_review_ids = [r.id for r in all_reviews if r.contains_bad_words()]
-                filtered_reviews = filtered_reviews.filter(id__in=offensive_review_ids)
-            
+                filtered_reviews = filtered_reviews.filter(is_offensive=True)
+
+            # 5. One page of the filtered reviews (cursor pagination, see ReviewKeysetPagination)
+            paginator = ReviewKeysetPagination()
+            page = paginator.paginate_queryset(filtered_reviews.for_listing(request.user), request, view=self)
+
+            # 6. Per-product table in one annotated query
+            products = user_products.annotate(total_reviews=Count('reviews')).order_by('id')
+
             # Prepare response data
             response_data = {
-                'summary': {
-                    'total_reviews': all_reviews.count(),
-                    'unapproved_reviews': unapproved_count,
-                    'low_rated_reviews': low_rated_count,
-                    'offensive_reviews': offensive_count,
-                    'approved_reviews': all_reviews.filter(is_visible=True).count(),
-                },
-                'filtered_reviews': ReviewSerializer(filtered_reviews, many=True).data,
+                'summary': summary,
+                'filtered_reviews': ReviewSerializer(page, many=True, context={'request': request}).data,
+                'next': paginator.get_next_link(),
                 'filter_applied': filter_type,
                 'products': [
                     {
                         'id': product.id,
                         'name': product.name,
-                        'review_count': product.reviews.count(),
-                        'avg_rating': self._calculate_avg_rating(product.reviews.filter(is_visible=True))
+                        'review_count': product.total_reviews,
+                        'avg_rating': product.average_rating
                     }
-                    for product in user_products
+                    for product in products
                 ]
             }
             
             return Response(response_data, status=status.HTTP_200_OK)
-            
+
+        except NotFound:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'Error generating admin report: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-    
-    def _calculate_avg_rating(self, reviews):
-        """Calculate average rating for a set of reviews"""
-        if not reviews.exists():
-            return 0
-        return round(sum(review.rating for review in reviews) / reviews.count(), 1)
 
 
 class AdminReviewActionView(APIView):
@@ -508,6 +585,7 @@ class AdminReviewActionView(APIView):
                 # Create admin report
                 AdminReport.objects.create(
                     review=review,
+                    user=request.user,
                     status='rejected'
                 )
                 
@@ -526,6 +604,7 @@ class AdminReviewActionView(APIView):
                 # Create admin report for offensive content
                 AdminReport.objects.create(
                     review=review,
+                    user=request.user,
                     status='pending'
                 )
                 
@@ -555,6 +634,7 @@ class AdminReviewActionView(APIView):
 class AdminDashboardView(APIView):
     """Admin dashboard with comprehensive insights and charts data"""
     permission_classes = [IsAuthenticated, IsProductOwner]
+    months = 6
 
     def get(self, request):
         """
@@ -563,75 +643,63 @@ class AdminDashboardView(APIView):
         - Rating distribution
         - Product performance metrics
         - Recent activity
+
+        Built from a fixed set of aggregate queries, whatever the number of
+        products and reviews.
         """
         try:
             # Get user's products
             user_products = Product.objects.filter(user=request.user)
-            product_ids = user_products.values_list('id', flat=True)
-            
+
             # Get all reviews for user's products
-            all_reviews = Review.objects.filter(product_id__in=product_ids)
-            
-            # Calculate rating distribution
-            rating_distribution = {}
-            for rating in range(1, 6):
-                count = all_reviews.filter(rating=rating).count()
-                rating_distribution[f'{rating}_stars'] = count
-            
-            # Get reviews by month (last 6 months)
-            from datetime import datetime, timedelta
-            from django.utils import timezone
-            
-            monthly_stats = []
-            for i in range(6):
-                date = timezone.now() - timedelta(days=30*i)
-                month_start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
-                
-                month_reviews = all_reviews.filter(created_at__range=[month_start, month_end])
-                monthly_stats.append({
-                    'month': month_start.strftime('%Y-%m'),
-                    'total_reviews': month_reviews.count(),
-                    'approved_reviews': month_reviews.filter(is_visible=True).count(),
-                    'avg_rating': self._calculate_avg_rating(month_reviews.filter(is_visible=True))
-                })
-            
-            # Get top performing products
-            top_products = []
-            for product in user_products:
-                product_reviews = product.reviews.filter(is_visible=True)
-                if product_reviews.exists():
-                    avg_rating = self._calculate_avg_rating(product_reviews)
-                    top_products.append({
-                        'id': product.id,
-                        'name': product.name,
-                        'avg_rating': avg_rating,
-                        'review_count': product_reviews.count(),
-                        'recent_reviews': product_reviews.order_by('-created_at')[:5].count()
-                    })
-            
-            # Sort by average rating
-            top_products.sort(key=lambda x: x['avg_rating'], reverse=True)
-            
+            all_reviews = Review.objects.filter(product__user=request.user)
+
+            # Overview, rating distribution and alerts in one pass
+            visible = Q(is_visible=True)
+            totals = all_reviews.aggregate(
+                total=Count('id'),
+                approved=Count('id', filter=visible),
+                pending=Count('id', filter=Q(is_visible=False)),
+                low_rated=Count('id', filter=Q(rating__in=[1, 2])),
+                offensive=Count('id', filter=Q(is_offensive=True)),
+                avg_rating=Avg('rating', filter=visible),
+                **{f'{rating}_stars': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)}
+            )
+            rating_distribution = {f'{rating}_stars': totals[f'{rating}_stars'] for rating in range(1, 6)}
+
+            # Top performing products, from the stored product aggregates
+            top_products = [
+                {
+                    'id': product.id,
+                    'name': product.name,
+                    'avg_rating': product.average_rating,
+                    'review_count': product.rating_count,
+                    'recent_reviews': min(product.rating_count, 5)
+                }
+                for product in user_products.filter(rating_count__gt=0).annotate(
+                    avg=ExpressionWrapper(F('rating_sum') * 1.0 / F('rating_count'), output_field=FloatField())
+                ).order_by('-avg', 'id')[:5]
+            ]
+
             # Get recent activity
-            recent_reviews = all_reviews.order_by('-created_at')[:10]
-            
+            recent_reviews = all_reviews.for_listing(request.user).order_by('-created_at')[:10]
+
             response_data = {
                 'overview': {
                     'total_products': user_products.count(),
-                    'total_reviews': all_reviews.count(),
-                    'approved_reviews': all_reviews.filter(is_visible=True).count(),
-                    'pending_reviews': all_reviews.filter(is_visible=False).count(),
-                    'overall_avg_rating': self._calculate_avg_rating(all_reviews.filter(is_visible=True))
+                    'total_reviews': totals['total'],
+                    'approved_reviews': totals['approved'],
+                    'pending_reviews': totals['pending'],
+                    'overall_avg_rating': self._round_avg(totals['avg_rating'])
                 },
                 'rating_distribution': rating_distribution,
-                'monthly_stats': monthly_stats,
-                'top_products': top_products[:5],  # Top 5 products
-                'recent_activity': ReviewSerializer(recent_reviews, many=True).data,
+                'monthly_stats': self._monthly_stats(request.user),
+                'top_products': top_products,  # Top 5 products
+                'recent_activity': ReviewSerializer(recent_reviews, many=True, context={'request': request}).data,
                 'alerts': {
-                    'unapproved_count': all_reviews.filter(is_visible=False).count(),
-                    'low_rated_count': all_reviews.filter(rating__in=[1, 2]).count(),
-                    'offensive_count': len([r for r in all_reviews if r.contains_bad_words()])
+                    'unapproved_count': totals['pending'],
+                    'low_rated_count': totals['low_rated'],
+                    'offensive_count': totals['offensive']
                 }
             }
             
@@ -642,12 +710,40 @@ class AdminDashboardView(APIView):
                 {'error': f'Error generating dashboard: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-    
-    def _calculate_avg_rating(self, reviews):
-        """Calculate average rating for a set of reviews"""
-        if not reviews.exists():
-            return 0
-        return round(sum(review.rating for review in reviews) / reviews.count(), 1)
+
+    def _monthly_stats(self, user):
+        """Review counts and average rating for the last months (current month first), from the daily rollup"""
+        today = timezone.localdate()
+        months = []
+        for i in range(self.months):
+            year, month = divmod(today.year * 12 + today.month - 1 - i, 12)
+            months.append((year, month + 1))
+        oldest_year, oldest_month = months[-1]
+        window_start = today.replace(year=oldest_year, month=oldest_month, day=1)
+
+        rows = (
+            ReviewDailyStats.objects.filter(product__user=user, day__gte=window_start)
+            .annotate(month=TruncMonth('day'))
+            .values('month')
+            .annotate(total=Sum('review_count'), approved=Sum('visible_count'), rating_sum=Sum('visible_rating_sum'))
+            .order_by()
+        )
+        by_month = {(row['month'].year, row['month'].month): row for row in rows}
+
+        monthly_stats = []
+        for year, month in months:
+            row = by_month.get((year, month), {})
+            approved = row.get('approved') or 0
+            monthly_stats.append({
+                'month': f'{year:04d}-{month:02d}',
+                'total_reviews': row.get('total') or 0,
+                'approved_reviews': approved,
+                'avg_rating': self._round_avg(row['rating_sum'] / approved if approved else None)
+            })
+        return monthly_stats
+
+    def _round_avg(self, value):
+        return round(value, 1) if value else 0
 
 
    
@@ -663,34 +759,39 @@ from products.analytics import (
     get_most_common_words_in_reviews,
     get_top_reviewers,
     search_reviews_by_keyword,
-    export_reviews_to_csv,
     get_top_rated_products,
     get_low_rating_reviews,
     get_pending_reviews_count,
+    get_products_analytics,
     filter_inappropriate_reviews
 )
 
-##جميع المنتجات
+##جميع المنتجات (صفحة من المنتجات، وتحليلاتها محسوبة دفعة واحدة)
 class AllProductsAnalyticsView(APIView):
     def get(self, request):
+        paginator = ProductPagination()
+        products = paginator.paginate_queryset(Product.objects.order_by('id').only('id', 'name'), request, view=self)
+        analytics = get_products_analytics([product.id for product in products])
         all_products_data = [
             {
                 "product_id": product.id,
                 "name": product.name,
-                "rating_trend": get_product_rating_trend(product.id),
-                "most_common_words": get_most_common_words_in_reviews(product.id),
-                "low_rating_reviews": get_low_rating_reviews(product.id),
-                
+                **analytics[product.id],
             }
-            for product in Product.objects.all()
+            for product in products
         ]
-        return Response({"products_analytics": all_products_data})
+        return Response({
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "products_analytics": all_products_data,
+        })
    #تحليل منتج
 class ProductAnalyticsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, product_id=None):
-        rating_data = get_product_rating_trend(product_id)
+        rating_data = get_product_rating_trend(product_id, use_rollup=True)
         common_words = get_most_common_words_in_reviews(product_id)
         low_rating_reviews = get_low_rating_reviews(product_id)
         inappropriate_reviews = filter_inappropriate_reviews(
@@ -713,7 +814,7 @@ class TopRatedProductsView(APIView):
 
     def get(self, request):
         days = int(request.GET.get('days', 30))  # عدد الأيام لتحليل التقييمات (افتراضي 30)
-        top_products = get_top_rated_products(days=days)
+        top_products = get_top_rated_products(days=days, use_rollup=True)
         return Response({"top_rated_products": top_products})
 
 # تحليل أكثر المستخدمين كتابةً للمراجعات
@@ -736,108 +837,184 @@ class KeywordSearchView(APIView):
                 {"error": "الرجاء إدخال كلمة مفتاحية باستخدام المعامل 'keyword'."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        reviews = search_reviews_by_keyword(product_id, keyword)
+        product_id = product_id or request.GET.get('product_id') or None
+        paginator = SearchResultsPagination()
+        reviews = paginator.paginate_queryset(search_reviews_by_keyword(product_id, keyword), request, view=self)
         results = [
-            {"id": r.id, "user": r.user.username, "rating": r.rating, "review_text": r.review_text}
+            {
+                "id": r.id,
+                "user": r.user.username,
+                "rating": r.rating,
+                "review_text": r.review_text,
+                "snippet": review_snippet(r, keyword),
+            }
             for r in reviews
         ]
         return Response({
             "product_id": product_id,
             "keyword": keyword,
-            "results_count": len(results),
+            "results_count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
             "reviews": results
         })
 
-# تصدير المراجعات إلى CSV
-from django.http import HttpResponse
-import csv
+# تصدير المراجعات إلى CSV (استجابة متدفقة: استعلام واحد مجمّع وذاكرة ثابتة)
+# للكتالوجات الكبيرة: /api/exports/ ينفذ نفس التصدير في الخلفية (ExportJobViewSet)
+from products.exports import (
+    PRODUCT_ANALYTICS_HEADER,
+    PRODUCT_RATINGS_HEADER,
+    product_analytics_rows,
+    product_rating_rows,
+    streaming_csv_response,
+    xlsx_file_response,
+)
 class ExportAllReviewsAnalyticsToCSV(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # إعداد استجابة CSV
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="all_reviews_analytics.csv"'
-
-       
-        writer = csv.writer(response, delimiter=',')  
-        
-        writer.writerow(['Product ID', 'Product Name', 'Average Rating', 'Total Reviews'])
-
-       
-        products = Product.objects.all()
-        for product in products:
-            reviews = product.reviews.all()
-            total_reviews = reviews.count()
-            avg_rating = (
-                round(sum(review.rating for review in reviews) / total_reviews, 1)
-                if total_reviews > 0
-                else 0
-            )
-            writer.writerow([product.id  , product.name , avg_rating  , total_reviews])
-
-        return response
+        return streaming_csv_response(
+            'all_reviews_analytics.csv', PRODUCT_RATINGS_HEADER, product_rating_rows(Product.objects.all())
+        )
   
 ######excel
-from openpyxl import Workbook
-
-from products.analytics import (
-    get_product_rating_trend,
-    get_most_common_words_in_reviews,
-    get_low_rating_reviews,
-    get_pending_reviews_count,
-)
-
 class ExportReviewsToExcel(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # إنشاء ملف Excel جديد
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Products Analytics"
-
-        # كتابة رؤوس الأعمدة
-        ws.append([
-            'Product ID', 'Product Name', 'Average Rating', 'Total Reviews',
-            'Most Common Words', 'Low Rating Reviews', 'Pending Reviews Count'
-        ])
-
-        # جلب المنتجات وتحليل كل منتج
-        products = Product.objects.all()
-        for product in products:
-            # التحليلات الخاصة بكل منتج
-            rating_trend = get_product_rating_trend(product.id)
-            most_common_words = get_most_common_words_in_reviews(product.id, limit=5)
-            low_rating_reviews = get_low_rating_reviews(product.id, limit=5)
-            pending_reviews_count = get_pending_reviews_count()
+        # ملف Excel بوضع الكتابة فقط، من تحليلات محسوبة دفعة واحدة لكل المنتجات
+        return xlsx_file_response(
+            'products_analytics.xlsx',
+            'Products Analytics',
+            PRODUCT_ANALYTICS_HEADER,
+            product_analytics_rows(Product.objects.all()),
+        )
 
-            
-            most_common_words_str = ', '.join([f"{word}({count})" for word, count in most_common_words])
-            low_rating_reviews_str = '; '.join([f"{review['review_text']}({review['rating']})" for review in low_rating_reviews])
-
-           
-            ws.append([
-                product.id,
-                product.name,
-                rating_trend['average_rating'],
-                rating_trend['total_reviews'],
-                most_common_words_str,
-                low_rating_reviews_str,
-                pending_reviews_count['pending_reviews'],
-            ])
-
-        
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+
+# =============================
+#  Background export jobs (انظر export_jobs.py)
+# =============================
+from django.http import FileResponse
+from django.urls import reverse
+from rest_framework import mixins
+from products import export_jobs
+from products.models import ExportJob
+
+class ExportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                       mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    POST يُنشئ مهمة تصدير تُنفذ في الخلفية، GET لمتابعة التقدم،
+    و download/ لتحميل الملف عند اكتمال المهمة.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = export_jobs.create_export_job(request.user, serializer.validated_data['kind'])
+        if job is None:
+            limit = export_jobs.max_jobs_per_user()
+            return Response(
+                {'error': f'You already have {limit} export(s) in progress. Try again when one finishes.'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        data = self.get_serializer(job).data
+        url = request.build_absolute_uri(reverse('exportjob-detail', args=[job.pk]))
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+
+    def perform_destroy(self, instance):
+        export_jobs.delete_export_file(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'done':
+            return Response(
+                {'error': f'Export is not ready (status: {job.status}).'}, status=status.HTTP_409_CONFLICT
+            )
+        try:
+            fileobj = open(job.file_path, 'rb')
+        except OSError:
+            raise NotFound('Export file is no longer available.')
+        return FileResponse(
+            fileobj, as_attachment=True,
+            filename=export_jobs.download_name(job), content_type=export_jobs.content_type(job)
         )
-        response['Content-Disposition'] = 'attachment; filename=products_analytics.xlsx'
 
-       
-        wb.save(response)
-        return response
+
+# =============================
+#  Cache stats (staff only)
+# =============================
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # العدادات لكل عملية (process) منذ بدء تشغيلها
+        return Response({
+            "backend": type(review_cache.backend).__name__,
+            "ttl": review_cache.ttl,
+            "endpoints": review_cache.stats(),
+        })
 
 
+# =============================
+#  Bulk review import (staff only)
+# =============================
+from products.importer import ReviewImporter, as_record, max_api_records
 
 
+class ReviewImportView(APIView):
+    """
+    POST قائمة مراجعات JSON (أو {"reviews": [...]}) تُستورد على دفعات (importer.py).
+    السجلات غير الصالحة تُرفض وحدها وتُعاد أخطاؤها مع رقم السجل.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
+    def post(self, request):
+        records = request.data.get('reviews') if isinstance(request.data, dict) else request.data
+        if not isinstance(records, list) or not records:
+            return Response(
+                {'error': 'Expected a non-empty JSON list of reviews.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max_api_records()
+        if len(records) > limit:
+            return Response(
+                {'error': f'At most {limit} reviews per request; use manage.py import_reviews for larger feeds.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        records = [as_record(record) for record in records]
+        importer = ReviewImporter(default_user=request.user, max_errors=len(records)).run(records)
+        return Response(
+            {'created': importer.created, 'rejected': importer.error_count, 'errors': importer.errors},
+            status=status.HTTP_201_CREATED if importer.created else status.HTTP_400_BAD_REQUEST
+        )
+
+
+# =============================
+#  Bulk moderation (product owners)
+# =============================
+from products.bulk_moderation import moderate_reviews
+from products.serializers import BulkModerationSerializer
+
+
+class AdminBulkReviewActionView(APIView):
+    """
+    POST {"action": "approve" | "reject" | "flag", "review_ids": [...]}
+    أو {"action": ..., "filter": {"product": 1, "status": "pending", "max_rating": 2}}
+    كل المراجعات في معاملة واحدة (bulk_moderation.py)، مع نتيجة لكل مراجعة.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkModerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        summary = moderate_reviews(
+            request.user, data['action'], review_ids=data.get('review_ids'), filters=data.get('filter')
+        )
+        return Response(summary, status=status.HTTP_200_OK)
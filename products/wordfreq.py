@@ -0,0 +1,186 @@
+"""
+Word frequencies over review text.
+
+Texts are consumed as a stream (typically `values_list('review_text').iterator()`)
+and counted chunk by chunk, so memory holds one chunk of text plus the counts,
+never the whole corpus. Counting can be spread over a process pool; chunks are
+merged in order, so the result (ties included) is the same as counting serially.
+
+A word is a run of at least four word characters in the lowercased text, as
+before. With `normalize_arabic=True` the text goes through
+`moderation.normalize_text` first, so diacritics and tatweel no longer split
+Arabic words and the alef variants count as one word.
+
+For very large corpora `sketch_words` keeps a fixed number of counters
+(`SpaceSaving`) instead of one per distinct word, and reports how far each
+count may be off.
+"""
+import heapq
+import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from .moderation import normalize_text
+
+WORD_PATTERN = re.compile(r'\b\w{4,}\b')
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_SKETCH_SIZE = 10_000
+
+
+def tokenize(text, stop_words=None, normalize_arabic=False):
+    text = normalize_text(text) if normalize_arabic else text.lower()
+    words = WORD_PATTERN.findall(text)
+    if stop_words:
+        return [word for word in words if word not in stop_words]
+    return words
+
+
+def _normalized_stop_words(stop_words, normalize_arabic):
+    if not stop_words:
+        return None
+    normalize = normalize_text if normalize_arabic else str.lower
+    return frozenset(normalize(word) for word in stop_words)
+
+
+def _count_chunk(texts, stop_words=None, normalize_arabic=False):
+    counts = Counter()
+    for text in texts:
+        if text:
+            counts.update(tokenize(text, stop_words, normalize_arabic))
+    return counts
+
+
+def _chunks(texts, size):
+    texts = iter(texts)
+    while True:
+        chunk = list(islice(texts, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _chunk_counts(texts, stop_words, normalize_arabic, processes, chunk_size):
+    """Counter of each chunk of `texts`, in order (counted in a process pool when processes > 1)."""
+    if not processes or processes < 2:
+        for chunk in _chunks(texts, chunk_size):
+            yield _count_chunk(chunk, stop_words, normalize_arabic)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = deque()
+        for chunk in _chunks(texts, chunk_size):
+            pending.append(pool.submit(_count_chunk, chunk, stop_words, normalize_arabic))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def count_words(texts, stop_words=None, normalize_arabic=False, processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Counter of the words in `texts` (an iterable of strings).
+
+    processes > 1 counts the chunks in a process pool, keeping at most two
+    chunks per process in flight so a large stream is never read ahead.
+    """
+    stop_words = _normalized_stop_words(stop_words, normalize_arabic)
+    counts = Counter()
+    for chunk_counts in _chunk_counts(texts, stop_words, normalize_arabic, processes, chunk_size):
+        counts.update(chunk_counts)
+    return counts
+
+
+def most_common_words(texts, limit=10, **options):
+    """The `limit` most frequent words of `texts` as (word, count) pairs."""
+    return count_words(texts, **options).most_common(limit)
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters summary with a fixed number of counters.
+
+    Every tracked word has an estimated count that is never below its true
+    count and at most `error` above it. A word that is not tracked occurred at
+    most `floor` times (for a single stream, at most total / capacity). Two
+    summaries (from different workers or shards) can be merged into one with
+    the same per-word guarantees.
+    """
+
+    def __init__(self, capacity=DEFAULT_SKETCH_SIZE):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        self.floor = 0
+        self._heap = []  # (count, word); بعض العناصر قديمة وتُتجاهل عند السحب
+
+    def add(self, word, count=1):
+        self.total += count
+        if word in self.counts:
+            self.counts[word] += count
+            return
+        if len(self.counts) < self.capacity:
+            # floor > 0 بعد الدمج: الكلمة ربما ظهرت حتى floor مرة في جزء لم يعد متتبعًا
+            self.counts[word] = self.floor + count
+            self.errors[word] = self.floor
+            heapq.heappush(self._heap, (self.counts[word], word))
+            return
+        # استبدال الكلمة ذات العدد الأصغر: الكلمة الجديدة ترث عددها كخطأ محتمل
+        evicted, minimum = self._pop_min()
+        del self.counts[evicted]
+        del self.errors[evicted]
+        self.floor = max(self.floor, minimum)
+        self.counts[word] = minimum + count
+        self.errors[word] = minimum
+        heapq.heappush(self._heap, (self.counts[word], word))
+
+    def update(self, counts):
+        """Add a mapping of word -> occurrences (e.g. the Counter of one chunk)."""
+        for word, count in counts.items():
+            self.add(word, count)
+
+    def _pop_min(self):
+        while True:
+            count, word = heapq.heappop(self._heap)
+            current = self.counts.get(word)
+            if current == count:
+                return word, count
+            if current is not None:
+                heapq.heappush(self._heap, (current, word))
+
+    def merge(self, other):
+        """A new summary covering the words of both summaries."""
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        merged.total = self.total + other.total
+        candidates = []
+        for word in self.counts.keys() | other.counts.keys():
+            count = self.counts.get(word, self.floor) + other.counts.get(word, other.floor)
+            error = self.errors.get(word, self.floor) + other.errors.get(word, other.floor)
+            candidates.append((count, error, word))
+        candidates.sort(key=lambda item: (-item[0], item[2]))
+        kept, dropped = candidates[:merged.capacity], candidates[merged.capacity:]
+        merged.floor = max([self.floor + other.floor] + [count for count, _, _ in dropped[:1]])
+        for count, error, word in kept:
+            merged.counts[word] = count
+            merged.errors[word] = error
+        merged._heap = [(count, word) for word, count in merged.counts.items()]
+        heapq.heapify(merged._heap)
+        return merged
+
+    def most_common(self, limit=None):
+        """(word, estimated count, error) pairs, most frequent first."""
+        items = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(word, count, self.errors[word]) for word, count in items[:limit]]
+
+
+def sketch_words(texts, capacity=DEFAULT_SKETCH_SIZE, stop_words=None, normalize_arabic=False, processes=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+    """`SpaceSaving` summary of the words in `texts`, in memory bounded by `capacity` and one chunk."""
+    stop_words = _normalized_stop_words(stop_words, normalize_arabic)
+    sketch = SpaceSaving(capacity)
+    for chunk_counts in _chunk_counts(texts, stop_words, normalize_arabic, processes, chunk_size):
+        sketch.update(chunk_counts)
+    return sketch